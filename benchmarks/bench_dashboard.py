@@ -0,0 +1,168 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+Dashboard query time with the license_summary table, against the correlated
+license_view subqueries it replaced.
+
+The old dashboard reads license_view four times per firewall, and takes minutes to
+hours for a full fleet, so only its first --baseline-rows rows are read and the
+full query time is extrapolated from them. License writes are timed with and without
+the license_summary triggers, which only recompute a firewall when a license changed.
+
+Run from the repository root:
+    python -m benchmarks.bench_dashboard --firewalls 10000 50000
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sfos.base import GroundControlDB
+
+# inventory_dashboard before license_summary
+BASELINE_DASHBOARD = """
+CREATE VIEW IF NOT EXISTS baseline_dashboard AS
+SELECT serial_number, status, address, model, version, company, error, last_online,
+    days_ago, fails,
+    (SELECT IIF(l.bundle IN ('Base Firewall', 'a-la-carte'), l.name, l.bundle)
+        FROM license_view l
+        WHERE l.serial_number = i.serial_number AND l.remaining_days > -30
+        ORDER BY l.remaining_days ASC LIMIT 1) AS 'next_license_expiring',
+    (SELECT l.expiry_date FROM license_view l
+        WHERE l.serial_number = i.serial_number AND l.remaining_days > -30
+        ORDER BY l.remaining_days ASC LIMIT 1) AS 'expiry_date',
+    (SELECT l.status_description FROM license_view l
+        WHERE l.serial_number = i.serial_number AND l.remaining_days > -30
+        ORDER BY l.remaining_days ASC LIMIT 1) AS 'license_status',
+    (SELECT l.status FROM license_view l
+        WHERE l.serial_number = i.serial_number AND l.name LIKE '%support%'
+        AND l.remaining_days > -30
+        ORDER BY l.remaining_days ASC LIMIT 1) AS 'support'
+FROM inventory_view i;
+"""
+
+NAMES = ["Base Firewall", "Network Protection", "Web Protection", "Enhanced Support"]
+
+
+def make_fleet(
+    firewalls: int, entitlements: int, session_id: str
+) -> tuple[list[dict], list[dict]]:
+    """Inventory and license rows, with expiry dates spread around today"""
+    rng = random.Random(firewalls)
+    now = datetime.now()
+    inventory, licenses = [], []
+    for fw in range(firewalls):
+        serial = f"C01{fw:09d}"
+        inventory.append(
+            {
+                "address": f"fw{fw:06d}.test",
+                "serial_number": serial,
+                "model": "XGS2100",
+                "last_result": "ONLINE",
+                "session_id": session_id,
+                "last_seen": now.isoformat(),
+            }
+        )
+        for sub in range(entitlements):
+            name = f"{NAMES[sub % len(NAMES)]} {sub:02d}"
+            # mid-day, so no expiry is near a whole day from now
+            expiry = now + timedelta(days=rng.randint(-60, 700), hours=12)
+            licenses.append(
+                {
+                    "uid": serial + name,
+                    "serial_number": serial,
+                    "name": name,
+                    "start_date": expiry - timedelta(days=365),
+                    "expiry_date": expiry,
+                    "bundle": "a-la-carte",
+                    "status": "Subscribed",
+                    "deactivation_reason": "",
+                    "type": "term",
+                    "updated": now,
+                }
+            )
+    return inventory, licenses
+
+
+def timed(func, *args) -> tuple[float, object]:
+    tstart = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - tstart, result
+
+
+def bench_dashboard(
+    db: GroundControlDB, firewalls: int, entitlements: int, baseline_rows: int
+) -> list[tuple[str, float]]:
+    """Named timings in seconds of one fleet size"""
+    inventory, licenses = make_fleet(firewalls, entitlements, db.session_id)
+
+    def upsert(rows: list[dict]) -> None:
+        with db.transaction():
+            db.insert_or_update_many(
+                insert_into="licenses", rows=rows, on_conflict=["uid"]
+            )
+
+    def select(sql: str) -> int:
+        return len(db.execute(sql)[0])
+
+    db.insert_or_update_many("inventory", inventory, on_conflict=["address"])
+    results = [("licenses insert, with summary triggers", timed(upsert, licenses)[0])]
+    results.append(("licenses rewrite, unchanged", timed(upsert, licenses)[0]))
+    for row in licenses:
+        row["expiry_date"] += timedelta(days=1)
+    results.append(("licenses update, every expiry", timed(upsert, licenses)[0]))
+
+    for name, sql in [
+        ("inventory_dashboard", "SELECT * FROM inventory_dashboard;"),
+        ("session_csv_result.sql", db.load_sql_from_file("session_csv_result.sql")),
+    ]:
+        elapsed, count = timed(select, sql)
+        assert count == firewalls, f"{name} returned {count} rows"
+        results.append((name, elapsed))
+
+    # the tree before license_summary: no triggers, no licenses index
+    for trigger in ("insert", "update", "delete"):
+        db.execute(f"DROP TRIGGER license_summary_{trigger};")
+    db.execute("DROP INDEX licenses_serial_number;")
+    for row in licenses:
+        row["expiry_date"] -= timedelta(days=1)
+    results.append(("licenses update, no triggers", timed(upsert, licenses)[0]))
+    db.execute(BASELINE_DASHBOARD)
+    sample = f"SELECT * FROM baseline_dashboard LIMIT {baseline_rows};"
+    elapsed, count = timed(select, sample)
+    results.append(
+        (f"baseline dashboard (from {count} rows)", elapsed * firewalls / count)
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dashboard query time")
+    parser.add_argument("--firewalls", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--entitlements", type=int, default=15)
+    parser.add_argument("--baseline-rows", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for firewalls in args.firewalls:
+            db = GroundControlDB(str(Path(tmp, f"dash{firewalls}.sqlite3")), True)
+            results = bench_dashboard(
+                db, firewalls, args.entitlements, args.baseline_rows
+            )
+            db.close_connection()
+            for name, elapsed in results:
+                print(f"{firewalls:>6} firewalls  {name:<42} {elapsed:10.3f}s")
+
+
+if __name__ == "__main__":
+    main()
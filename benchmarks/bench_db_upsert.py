@@ -0,0 +1,96 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+License upsert throughput: insert_or_update per row vs insert_or_update_many.
+
+Run from the repository root:
+    python -m benchmarks.bench_db_upsert --firewalls 10000 --entitlements 15
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sfos.base import GroundControlDB
+
+
+def make_license_rows(firewalls: int, entitlements: int) -> list[dict]:
+    """License rows shaped like GroundControlDB._prep_resp_for_license_update"""
+    start = datetime(2024, 1, 1)
+    rows = []
+    for fw in range(firewalls):
+        serial = f"C01{fw:09d}"
+        for sub in range(entitlements):
+            name = f"Subscription {sub:02d}"
+            rows.append(
+                {
+                    "serial_number": serial,
+                    "name": name,
+                    "start_date": start,
+                    "expiry_date": start + timedelta(days=365 + sub),
+                    "bundle": "Xstream Protection",
+                    "status": "Subscribed",
+                    "deactivation_reason": "",
+                    "type": "term",
+                    "uid": serial + name,
+                    "updated": datetime.now(),
+                }
+            )
+    return rows
+
+
+def bench_loop(db: GroundControlDB, rows: list[dict]) -> float:
+    tstart = time.perf_counter()
+    with db.transaction():
+        for row in rows:
+            db.insert_or_update(insert_into="licenses", data=row, on_conflict=["uid"])
+    return time.perf_counter() - tstart
+
+
+def bench_many(db: GroundControlDB, rows: list[dict]) -> float:
+    tstart = time.perf_counter()
+    db.insert_or_update_many(insert_into="licenses", rows=rows, on_conflict=["uid"])
+    return time.perf_counter() - tstart
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="License upsert throughput")
+    parser.add_argument("--firewalls", type=int, default=10000)
+    parser.add_argument("--entitlements", type=int, default=15)
+    parser.add_argument(
+        "--loop-firewalls",
+        type=int,
+        default=1000,
+        help="firewalls written with the per-row loop (it is much slower)",
+    )
+    args = parser.parse_args()
+
+    rows = make_license_rows(args.firewalls, args.entitlements)
+    loop_rows = rows[: args.loop_firewalls * args.entitlements]
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, bench, data in [
+            ("insert_or_update (loop)", bench_loop, loop_rows),
+            ("insert_or_update_many", bench_many, rows),
+        ]:
+            db = GroundControlDB(str(Path(tmp, f"{bench.__name__}.sqlite3")), True)
+            inserted = bench(db, data)
+            updated = bench(db, data)
+            db.close_connection()
+            for phase, elapsed in [("insert", inserted), ("update", updated)]:
+                print(
+                    f"{label:<26} {phase:<7} {len(data):>8} rows "
+                    f"{elapsed:8.2f}s {len(data) / elapsed:>10.0f} rows/sec"
+                )
+
+
+if __name__ == "__main__":
+    main()
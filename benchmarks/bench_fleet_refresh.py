@@ -0,0 +1,144 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+End-to-end refresh of a fleet of virtual firewalls served by test.mock_webadmin.
+
+The mock server runs in a separate process so that peak RSS and cpu time are the
+agent's own. cpu_ms_per_fw is the agent cpu time spent per firewall: the overhead
+outside the network. With --workers, it includes the cpu time of the refresh worker
+processes, and worker_peak_rss_mib is the peak RSS of the largest worker. Peak RSS
+and worker cpu time need the resource module, so they are left out on Windows.
+
+Run from the repository root (more than --ports firewalls needs Linux, where every
+127.x.y.z address reaches the server):
+    python -m benchmarks.bench_fleet_refresh --firewalls 1000 --concurrency 32
+    python -m benchmarks.bench_fleet_refresh --firewalls 1000 --concurrency 8 \
+        --workers 4
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS, and no cpu time of worker processes
+    resource = None
+
+from urllib3.exceptions import InsecureRequestWarning
+
+from sfos.agent.actions.refresh import RefreshStats, run_refresh, run_refresh_sharded
+from sfos.base import GroundControlDB
+from test.mock_webadmin import virtual_firewalls
+
+
+def start_mock_webadmin(ports: int, latency: float) -> tuple[subprocess.Popen, list]:
+    """Start 'python -m test.mock_webadmin' and wait for its listening ports"""
+    host = "127.0.0.1" if ports == 1 else "0.0.0.0"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "test.mock_webadmin", "--host", host]
+        + ["--ports", str(ports), "--latency", str(latency)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    line = process.stdout.readline()  # type: ignore
+    if " ports " not in line:
+        process.kill()
+        raise RuntimeError(f"mock webadmin did not start: {line!r}")
+    return process, json.loads(line.split(" ports ", 1)[1])
+
+
+def bench_fleet_refresh(
+    firewalls: int, concurrency: int, ports: int, latency: float, workers: int = 1
+) -> dict[str, float]:
+    """Refresh 'firewalls' virtual firewalls into a new database
+
+    Returns:
+        dict[str, float]: Named results of the run
+    """
+    warnings.simplefilter("ignore", InsecureRequestWarning)
+    process, listening = start_mock_webadmin(min(ports, firewalls), latency)
+    try:
+        connectors = virtual_firewalls(listening, firewalls)
+        with tempfile.TemporaryDirectory() as tmp:
+            db = GroundControlDB(str(Path(tmp, "fleet.sqlite3")), persistent=True)
+            stats = RefreshStats()
+            cpu_start = time.process_time() + _children_cpu()
+            if workers > 1:
+                run_refresh_sharded(
+                    connectors, db, workers, concurrency=concurrency, stats=stats
+                )
+            else:
+                run_refresh(connectors, db, concurrency=concurrency, stats=stats)
+            # the worker processes have exited, the mock server is still running
+            cpu = time.process_time() + _children_cpu() - cpu_start
+            worker_rss = _peak_rss_kib(children=True)
+            db.close_connection()
+    finally:
+        process.terminate()
+        process.wait()
+
+    results = {
+        "firewalls": firewalls,
+        "failures": stats.failures,
+        "wall_s": stats.elapsed,
+        "firewalls_per_sec": stats.rate,
+        "cpu_ms_per_fw": cpu * 1000 / firewalls,
+        "db_write_ms_per_fw": stats.db_elapsed * 1000 / firewalls,
+    }
+    peak_rss = _peak_rss_kib()
+    if peak_rss is not None:
+        results["peak_rss_mib"] = peak_rss / 1024
+    if workers > 1 and worker_rss is not None:
+        results["worker_peak_rss_mib"] = worker_rss / 1024
+    return results
+
+
+def _peak_rss_kib(children: bool = False) -> int | None:
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss
+
+
+def _children_cpu() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end fleet refresh")
+    parser.add_argument("--firewalls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--ports", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print results as json")
+    args = parser.parse_args()
+
+    results = bench_fleet_refresh(
+        args.firewalls, args.concurrency, args.ports, args.latency, args.workers
+    )
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, value in results.items():
+        print(f"{name:<20} {value:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+Memory held by Connector.info across a fleet, with and without index.jsp source.
+
+Run from the repository root:
+    python -m benchmarks.bench_fwinfo_memory --connectors 5000
+"""
+
+import argparse
+import gc
+import tracemalloc
+from pathlib import Path
+
+from sfos.objects.firewall_info import IndexParser
+from sfos.webadmin import Connector
+
+SAMPLE = Path(__file__).parent.parent / "test" / "samples" / "test_v20_ga_index.jsp"
+
+
+def retained(connectors: list[Connector], raw_text: str, keep_source: bool) -> int:
+    """Bytes still allocated after attaching a parsed FirewallInfo to each connector"""
+    parse = IndexParser(keep_source=keep_source)
+    gc.collect()
+    tracemalloc.start()
+    for fw in connectors:
+        fw.info = parse(raw_text)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    for fw in connectors:
+        fw.info = None
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="FirewallInfo memory per fleet")
+    parser.add_argument("--connectors", type=int, default=5000)
+    parser.add_argument("--sample", default=str(SAMPLE))
+    args = parser.parse_args()
+
+    raw_text = Path(args.sample).read_text(encoding="utf-8")
+    connectors = [
+        Connector(hostname=f"fw{i}.test", username="admin", password="pw")
+        for i in range(args.connectors)
+    ]
+    for label, keep_source in [("keep_source=True", True), ("compact", False)]:
+        total = retained(connectors, raw_text, keep_source)
+        print(
+            f"{label:<17} {args.connectors:>6} connectors "
+            f"{total / 2**20:8.1f} MiB {total / args.connectors / 1024:8.1f} KiB each"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+index.jsp parse cost: the previous multi-pass parser vs IndexParser's single scan.
+
+Run from the repository root:
+    python -m benchmarks.bench_index_parser --iterations 2000
+"""
+
+import argparse
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from sfos.objects.firewall_info import IndexParser
+from sfos.static import patterns as _p
+
+SAMPLE = Path(__file__).parent.parent / "test" / "samples" / "test_v20_ga_index.jsp"
+LEGACY_FIND_SCRIPTS = re.compile(r"<script.*?>(?P<script>.*?)<\/script>", flags=re.S)
+
+
+def legacy_trim(text: str) -> str:
+    text = text.replace("\t", " ")
+    text = text.replace("\r\n", "\n")
+    text = re.sub("\n+", "\n", text, flags=re.S)
+    return re.sub(" +", " ", text)
+
+
+def legacy_parse(raw_text: str) -> dict:
+    """The parse performed by IndexParser before the single-scan rewrite"""
+    source = ""
+    for script in LEGACY_FIND_SCRIPTS.findall(raw_text):
+        source += legacy_trim(str(script))
+    found = dict(_p.RE_TO_FIND_JSP_VARS.findall(raw_text))
+    key = _p.RE_TO_FIND_CSRF_KEY.search(raw_text)[_p.GROUP_CSRF_KEY_NAME]
+    value = re.compile(f"{re.escape(key)}{_p.PATTERN_PART_FIND_CSRF_VALUE}")
+    found["csrf_token"] = value.search(raw_text)[_p.GROUP_CSRF_KEY_VALUE]
+    found["_source_data"] = source
+    found["subscriptions"] = _p.RE_TO_FIND_SUBSCRIPTIONS.search(raw_text)[
+        _p.GROUP_SUBSCRIPTIONS
+    ]
+    return found
+
+
+def measure(parse: Callable[[str], object], raw_text: str, iterations: int):
+    """Returns (seconds per parse, peak bytes allocated by one parse)"""
+    parse(raw_text)
+    tstart = time.perf_counter()
+    for _ in range(iterations):
+        parse(raw_text)
+    elapsed = (time.perf_counter() - tstart) / iterations
+
+    tracemalloc.start()
+    parse(raw_text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="index.jsp parse cost")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--sample", default=str(SAMPLE))
+    args = parser.parse_args()
+
+    raw_text = Path(args.sample).read_text(encoding="utf-8")
+    results = {}
+    for label, parse in [
+        ("legacy multi-pass", legacy_parse),
+        ("IndexParser", IndexParser()),
+    ]:
+        elapsed, peak = measure(parse, raw_text, args.iterations)
+        results[label] = (elapsed, peak)
+        print(
+            f"{label:<18} {elapsed * 1e6:10.1f} us/parse "
+            f"{peak / 1024:10.1f} KiB peak"
+        )
+    (old_time, old_peak), (new_time, new_peak) = results.values()
+    print(f"speedup x{old_time / new_time:.2f}, peak memory x{new_peak / old_peak:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+Cost of log calls made below the configured log level, and of caller_name().
+
+Run from the repository root:
+    python -m benchmarks.bench_logging --calls 1000000
+Compare with GC_LOG_QUEUE_SIZE=0 to time file writes on the calling thread.
+"""
+
+import argparse
+import tempfile
+import time
+
+from sfos.logging import caller_name, loginfo, logtrace
+from sfos.logging.logging import (
+    dropped_log_records,
+    init_logging,
+    logstate,
+    stop_log_listener,
+)
+from sfos.static import Level
+
+
+def bench_logtrace(calls: int) -> float:
+    tstart = time.perf_counter()
+    for i in range(calls):
+        logtrace("refresh complete", host="fw.test", port=4444, attempt=i)
+    return time.perf_counter() - tstart
+
+
+def bench_loginfo(calls: int) -> float:
+    tstart = time.perf_counter()
+    for i in range(calls):
+        loginfo("refresh complete", host="fw.test", port=4444, attempt=i)
+    return time.perf_counter() - tstart
+
+
+def bench_caller_name(calls: int) -> float:
+    tstart = time.perf_counter()
+    for _ in range(calls):
+        caller_name(1)
+    return time.perf_counter() - tstart
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Disabled log call cost")
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--enabled-calls", type=int, default=100_000)
+    parser.add_argument("--caller-name-calls", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logstate.PATH = tmp
+        init_logging(Level.INFO)
+        for label, bench, calls in [
+            ("logtrace (disabled)", bench_logtrace, args.calls),
+            ("loginfo (enabled)", bench_loginfo, args.enabled_calls),
+            ("caller_name", bench_caller_name, args.caller_name_calls),
+        ]:
+            elapsed = bench(calls)
+            print(
+                f"{label:<20} {calls:>9} calls {elapsed:8.2f}s "
+                f"{elapsed / calls * 1e6:8.2f} us/call"
+            )
+        stop_log_listener()
+        print(f"dropped log records: {dropped_log_records()}")
+
+
+if __name__ == "__main__":
+    main()
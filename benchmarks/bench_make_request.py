@@ -0,0 +1,53 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+SfosRequest build cost, for one firewall and spread over a fleet of addresses.
+
+Run from the repository root:
+    python -m benchmarks.bench_make_request --calls 100000
+"""
+
+import argparse
+import time
+
+from sfos.objects.service_address import ServiceAddress
+from sfos.webadmin.methods import load_definition, make_sfos_request
+
+COMMAND = "HEARTBEAT_STATUS"
+DATA = '{"hbStatus": 1}'
+
+
+def bench_make_request(calls: int, addresses: int) -> float:
+    """Returns seconds per make_sfos_request call, cycling over 'addresses'"""
+    definition = load_definition(COMMAND)
+    targets = [ServiceAddress(f"fw{i}.test", 4444) for i in range(addresses)]
+    make_sfos_request(definition, targets[0], DATA)  # type: ignore
+    tstart = time.perf_counter()
+    for i in range(calls):
+        make_sfos_request(definition, targets[i % addresses], DATA)  # type: ignore
+    return (time.perf_counter() - tstart) / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SfosRequest build cost")
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--addresses", type=int, default=10_000)
+    args = parser.parse_args()
+
+    for label, addresses in [("one firewall", 1), ("fleet", args.addresses)]:
+        elapsed = bench_make_request(args.calls, addresses)
+        print(
+            f"{label:<13} {addresses:>6} addresses {args.calls:>8} calls "
+            f"{elapsed * 1e6:8.2f} us/call"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+Run the benchmark suite, save the results and compare them with a baseline.
+
+Micro benchmarks run in this process. Each fleet size runs bench_fleet_refresh in
+its own process, so its peak RSS is not shared with other runs.
+
+Results are named by unit. '_per_sec' results regress when they fall, all others
+when they rise. The exit status is 1 if any result regressed by more than
+--tolerance compared with --compare.
+
+Run from the repository root:
+    python -m benchmarks.run_all --save results.json
+    python -m benchmarks.run_all --compare results.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks import (
+    bench_dashboard,
+    bench_db_upsert,
+    bench_index_parser,
+    bench_logging,
+)
+from benchmarks.bench_make_request import bench_make_request
+from sfos.base import GroundControlDB
+from sfos.logging.logging import init_logging, logstate, stop_log_listener
+from sfos.objects.firewall_info import IndexParser
+from sfos.static import Level
+
+FLEET_SIZES = [100, 1000, 10000]
+# results that describe a run rather than measure it
+NOT_COMPARED = ("_firewalls", "_failures")
+
+
+def micro_benchmarks(scale: float) -> dict[str, float]:
+    """Run the micro benchmarks with iteration counts multiplied by 'scale'"""
+    results = {}
+    raw_text = bench_index_parser.SAMPLE.read_text(encoding="utf-8")
+    elapsed, peak = bench_index_parser.measure(
+        IndexParser(), raw_text, int(2000 * scale)
+    )
+    results["index_parser_us"] = elapsed * 1e6
+    results["index_parser_peak_kib"] = peak / 1024
+
+    for name, addresses in [("one", 1), ("fleet", 10_000)]:
+        elapsed = bench_make_request(int(100_000 * scale), addresses)
+        results[f"make_request_{name}_us"] = elapsed * 1e6
+
+    rows = bench_db_upsert.make_license_rows(int(1000 * scale) or 1, 15)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GroundControlDB(str(Path(tmp, "upsert.sqlite3")), True)
+        bench_db_upsert.bench_loop(db, rows)  # insert, then time the update
+        elapsed = bench_db_upsert.bench_loop(db, rows)
+        results["insert_or_update_per_sec"] = len(rows) / elapsed
+        elapsed = bench_db_upsert.bench_many(db, rows)
+        results["insert_or_update_many_per_sec"] = len(rows) / elapsed
+        db.close_connection()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GroundControlDB(str(Path(tmp, "dashboard.sqlite3")), True)
+        timings = dict(
+            bench_dashboard.bench_dashboard(db, int(2000 * scale) or 1, 15, 5)
+        )
+        results["dashboard_query_ms"] = timings["inventory_dashboard"] * 1000
+        db.close_connection()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logstate.PATH = tmp
+        init_logging(Level.INFO)
+        for name, bench, calls in [
+            ("logtrace_disabled_us", bench_logging.bench_logtrace, 1_000_000),
+            ("loginfo_enabled_us", bench_logging.bench_loginfo, 100_000),
+        ]:
+            calls = int(calls * scale) or 1
+            results[name] = bench(calls) / calls * 1e6
+        stop_log_listener()
+    return results
+
+
+def fleet_benchmark(firewalls: int, concurrency: int) -> dict[str, float]:
+    """Run bench_fleet_refresh for one fleet size in a new process"""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_fleet_refresh", "--json"]
+        + ["--firewalls", str(firewalls), "--concurrency", str(concurrency)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    results = json.loads(output.strip().splitlines()[-1])
+    return {f"fleet_{firewalls}_{name}": value for name, value in results.items()}
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], tolerance: float
+) -> list[str]:
+    """Describe every result that is worse than baseline by more than tolerance"""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if name.endswith(NOT_COMPARED) or not old:
+            continue
+        change = value / old - 1
+        worse = -change if name.endswith("_per_sec") else change
+        if worse > tolerance:
+            regressions.append(f"{name}: {old:.2f} -> {value:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark suite")
+    parser.add_argument(
+        "--sizes", type=int, nargs="*", default=FLEET_SIZES, help="fleet sizes"
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="micro benchmark iterations factor"
+    )
+    parser.add_argument("--save", help="write results to this json file")
+    parser.add_argument("--compare", help="baseline json file written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = micro_benchmarks(args.scale)
+    for size in args.sizes:
+        results.update(fleet_benchmark(size, args.concurrency))
+    for name, value in results.items():
+        print(f"{name:<40} {value:14.2f}")
+
+    if args.save:
+        report = {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "results": results,
+        }
+        Path(args.save).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,11 @@ the License for the specific language governing permissions and limitations unde
 License.
 """
 
+import multiprocessing
 import sys
 import dotenv
 
 from sfos import __version__ as _WorkerVersion
-from sfos import agent as _agent
 from sfos.logging import agent_loginfo, logerror
 
 dotenv.load_dotenv()
@@ -24,6 +24,10 @@ def is_running_as_exe():
 
 
 def main() -> None:
+    # imported here: spawned refresh worker processes import this module, and must
+    # not open the agent database
+    from sfos import agent as _agent
+
     exectype = "exe" if is_running_as_exe() else "py"
     message = f"SFOS Ground Control Agent ( {exectype} version '{_agent.__version__}', worker version '{_WorkerVersion}') starting"
     agent_loginfo(message)
@@ -49,4 +53,5 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     sys.exit(main())
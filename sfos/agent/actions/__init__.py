@@ -11,13 +11,24 @@ License.
 
 __all__ = [
     "run_cli_command",
+    "run_cli_command_async",
     "run_query",
     "run_scripts",
+    "run_refresh",
+    "run_refresh_async",
+    "run_refresh_sharded",
+    "RefreshStats",
 ]
 
-from sfos.agent.actions.command import run_cli_command
+from sfos.agent.actions.command import run_cli_command, run_cli_command_async
 from sfos.agent.actions.query import run_query
 from sfos.agent.actions.script import run_scripts
+from sfos.agent.actions.refresh import (
+    run_refresh,
+    run_refresh_async,
+    run_refresh_sharded,
+    RefreshStats,
+)
 
 
 def run_noop() -> None:
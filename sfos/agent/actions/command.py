@@ -10,10 +10,25 @@ License.
 """
 
 import argparse as _args
-from sfos.agent.script_objs import ScriptItem, execute_script_item
+import asyncio
+from sfos.agent.actions.device_health import plan_refresh, select_stale
+from sfos.agent.actions.refresh import (
+    RefreshStats,
+    fetch_refresh_info,
+    run_refresh,
+    run_refresh_async,
+    run_refresh_sharded,
+    save_refresh_result,
+)
+from sfos.agent.script_objs import (
+    ScriptItem,
+    execute_script_item,
+    execute_script_item_async,
+)
 from sfos.base import GroundControlDB as _db
 from sfos.static import exceptions as _ex
 from sfos.logging.logging import loginfo, logerror, agent_loginfo
+from sfos.webadmin.async_connector import AsyncConnector as _aconn
 from sfos.webadmin.connector import Connector as _conn, SfosResponse as _sresp
 
 
@@ -22,6 +37,7 @@ def run_cli_command(
     args: _args.Namespace,
     state: dict | None = None,
     db: _db | None = None,
+    stats: RefreshStats | None = None,
 ) -> list[_sresp]:
     """Run a command passed via the cli
 
@@ -30,14 +46,21 @@ def run_cli_command(
         args (_args.Namespace): _description_
         state (dict | None, optional): _description_. Defaults to None.
         db (_db | None, optional): _description_. Defaults to None.
-        print_results (bool, optional): _description_. Defaults to True.
+        stats (RefreshStats | None, optional): Filled with refresh run totals.
 
     Returns:
         list[_sresp]: _description_
     """
     if args.command == "refresh":
-        results = [run_command_refresh(fw, db) for fw in firewalls]
-        return results
+        concurrency = getattr(args, "concurrency", None) or 1
+        stats = stats if stats is not None else RefreshStats()
+        firewalls = _planned_refresh(firewalls, db, stats, args)
+        workers = getattr(args, "workers", None) or 1
+        if workers > 1:
+            return run_refresh_sharded(
+                firewalls, db, workers=workers, concurrency=concurrency, stats=stats
+            )
+        return run_refresh(firewalls, db, concurrency=concurrency, stats=stats)
     else:
         loginfo("run_command_def args=", args=args)  # type: ignore
         results = []
@@ -57,6 +80,82 @@ def run_cli_command(
         return results
 
 
+async def run_cli_command_async(
+    firewalls: list[_conn],
+    args: _args.Namespace,
+    state: dict | None = None,
+    db: _db | None = None,
+    stats: RefreshStats | None = None,
+) -> list[_sresp]:
+    """Run a command passed via the cli on the running event loop
+
+    Connectors that are not already AsyncConnectors are converted, and their http
+    clients are closed when the command completes.
+
+    Args:
+        firewalls (list[_conn]): _description_
+        args (_args.Namespace): _description_
+        state (dict | None, optional): _description_. Defaults to None.
+        db (_db | None, optional): _description_. Defaults to None.
+        stats (RefreshStats | None, optional): Filled with refresh run totals.
+
+    Returns:
+        list[_sresp]: _description_
+    """
+    concurrency = getattr(args, "concurrency", None) or 1
+    if args.command == "refresh":
+        stats = stats if stats is not None else RefreshStats()
+        firewalls = _planned_refresh(firewalls, db, stats, args)
+    async_fws = [_aconn.from_connector(fw) for fw in firewalls]
+    try:
+        if args.command == "refresh":
+            return await run_refresh_async(
+                async_fws, db, concurrency=concurrency, stats=stats
+            )
+
+        loginfo("run_command_def args=", args=args)  # type: ignore
+        limit = asyncio.Semaphore(concurrency)
+
+        async def run_one(fw: _aconn) -> list[_sresp]:
+            async with limit:
+                try:
+                    return await run_command_def_async(
+                        fw, args.command, args.object, args.data, state
+                    )
+                except Exception as e:
+                    logerror(e)
+                    return []
+
+        results = []
+        for fw_results in await asyncio.gather(*[run_one(fw) for fw in async_fws]):
+            results.extend(fw_results)
+        return results
+    finally:
+        for fw, async_fw in zip(firewalls, async_fws):
+            if fw is not async_fw:
+                await async_fw.aclose()
+
+
+def _planned_refresh(
+    firewalls: list[_conn],
+    db: _db | None,
+    stats: RefreshStats,
+    args: _args.Namespace | None = None,
+) -> list[_conn]:
+    """Apply --max-age, adaptive timeouts and the circuit breaker to a refresh"""
+    if not db:
+        return firewalls
+    db.maintenance()
+    max_age = getattr(args, "max_age", None)
+    if max_age is not None:
+        firewalls, fresh = select_stale(firewalls, db, max_age)
+        stats.fresh = len(fresh)
+    plan = plan_refresh(firewalls, db)
+    stats.skipped = len(plan.skipped)
+    stats.probes = plan.probes
+    return plan.firewalls
+
+
 def run_command_refresh(fw: _conn, db: _db | None = None) -> _sresp:
     """Run a refresh command against the selected firewal"""
     if not db:
@@ -69,15 +168,9 @@ def run_command_refresh(fw: _conn, db: _db | None = None) -> _sresp:
     agent_loginfo(msg)
 
     loginfo(msg, end="\r")
-    sfos_resp = fw.get_info()
+    sfos_resp = fetch_refresh_info(fw)
     loginfo(" " * len(msg), end="\r")
-    msgdata = db._prep_resp_for_inventory_update(sfos_resp)
-    agent_loginfo(f"refresh check complete for {fw.address.address}", **msgdata)
-
-    db.insert_or_update_fwinfo(sfos_resp)
-    agent_loginfo()
-    sfos_resp.trace = "101"
-    return sfos_resp
+    return save_refresh_result(db, sfos_resp)
 
 
 def run_command_def(
@@ -104,3 +197,18 @@ def run_command_def(
 
     cmd = ScriptItem(command, request_object, data)
     return execute_script_item(fw, cmd)
+
+
+async def run_command_def_async(
+    fw: _aconn,
+    command: str,
+    request_object: str | None = None,
+    data: str | None = None,
+    state: dict | None = None,
+) -> list[_sresp]:
+    """Coroutine variant of run_command_def for an AsyncConnector"""
+    if state:
+        pass  # not implemented yet
+
+    cmd = ScriptItem(command, request_object, data)
+    return await execute_script_item_async(fw, cmd)
@@ -0,0 +1,371 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+# pylint: disable=broad-exception-caught
+from __future__ import annotations
+
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sfos.agent.actions.device_health import (
+    BREAKER_THRESHOLD,
+    _parse_time,
+    breaker_backoff,
+    plan_refresh,
+    probe_timeouts,
+)
+from sfos.agent.actions.refresh import _bind_firewall, save_refresh_result
+from sfos.agent.metrics import DaemonMetrics, write_metrics
+from sfos.agent.script_objs import ScriptItem, execute_script_item
+from sfos.base import GroundControlDB as _db
+from sfos.base.db import DBWriter
+from sfos.logging.logging import agent_loginfo, bind_log_context, loginfo, logerror
+from sfos.static import constants as _c, exceptions as _ex
+from sfos.webadmin.connector import Connector as _conn, SfosResponse as _sresp
+
+DAEMON_HEARTBEAT_INTERVAL = float(os.getenv("GC_DAEMON_HEARTBEAT_INTERVAL", "60"))
+DAEMON_REFRESH_INTERVAL = float(os.getenv("GC_DAEMON_REFRESH_INTERVAL", "21600"))
+DAEMON_LICENSE_INTERVAL = float(os.getenv("GC_DAEMON_LICENSE_INTERVAL", "86400"))
+DAEMON_JITTER = float(os.getenv("GC_DAEMON_JITTER", "0.1"))
+# seconds between checks of the stop event while idle
+IDLE_WAIT = 1.0
+# seconds between runs of GroundControlDB.maintenance()
+MAINTENANCE_INTERVAL = 3600.0
+# seconds between writes of the GC_METRICS_FILE textfile
+METRICS_INTERVAL = 60.0
+
+HEARTBEAT = "heartbeat"
+REFRESH = "refresh"
+LICENSES = "licenses"
+
+
+def default_intervals() -> dict[str, float]:
+    """Poll intervals in seconds of each job, from the environment"""
+    return {
+        HEARTBEAT: DAEMON_HEARTBEAT_INTERVAL,
+        REFRESH: DAEMON_REFRESH_INTERVAL,
+        LICENSES: DAEMON_LICENSE_INTERVAL,
+    }
+
+
+@dataclass(order=True)
+class ScheduledJob:
+    """A poll of one firewall, due at a time.monotonic() value"""
+
+    due: float
+    seq: int
+    kind: str = field(compare=False)
+    fw: _conn = field(compare=False)
+
+
+class Scheduler:
+    """Due times of the polls of every firewall
+
+    Every firewall has its own heartbeat, refresh and licenses jobs. Each job is
+    rescheduled 'interval' seconds after it completes, give or take 'jitter' times
+    the interval, so firewalls polled together drift apart instead of
+    stampeding. First polls are spread over the shortest interval.
+
+    Args:
+        intervals (dict[str, float]): Seconds between polls of each job kind.
+                                      0 disables a job.
+        jitter (float): Fraction of the interval added or removed at random
+        rng (random.Random | None): Source of jitter. Defaults to random.
+    """
+
+    def __init__(
+        self,
+        intervals: dict[str, float],
+        jitter: float = DAEMON_JITTER,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.intervals = {kind: secs for kind, secs in intervals.items() if secs > 0}
+        self.jitter = jitter
+        self._random = rng or random.Random()
+        self._queue: list[ScheduledJob] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def start(self, firewalls: list[_conn], now: float) -> None:
+        """Schedule the first poll of every job of every firewall"""
+        spread = min(self.intervals.values(), default=0)
+        for fw in firewalls:
+            for kind in self.intervals:
+                self.push(kind, fw, now + self._random.uniform(0, spread))
+
+    def push(self, kind: str, fw: _conn, due: float) -> None:
+        heapq.heappush(self._queue, ScheduledJob(due, next(self._seq), kind, fw))
+
+    def reschedule(self, job: ScheduledJob, now: float, not_before: float = 0) -> None:
+        """Schedule the next poll after job has completed, no sooner than
+        'not_before'"""
+        interval = self.intervals[job.kind]
+        offset = self._random.uniform(-self.jitter, self.jitter) * interval
+        self.push(job.kind, job.fw, max(now + interval + offset, not_before))
+
+    def next_due(self) -> float | None:
+        return self._queue[0].due if self._queue else None
+
+    def pop_due(self, now: float) -> list[ScheduledJob]:
+        """Remove and return every job due at 'now'"""
+        due = []
+        while self._queue and self._queue[0].due <= now:
+            due.append(heapq.heappop(self._queue))
+        return due
+
+
+class Breaker:
+    """Circuit breakers of the firewalls polled by the daemon
+
+    Counts the failed polls in a row of each firewall, of any job kind, starting
+    from the consecutive_fails of its inventory row. From GC_BREAKER_THRESHOLD
+    failures on, no job of the firewall runs until breaker_backoff() seconds after
+    its last failed poll. That poll is a probe with the shortest connect timeout.
+
+    Args:
+        failing (dict[str, tuple[int, str]]): (consecutive_fails, updated) of
+            failing firewalls, from GroundControlDB.get_failing_devices()
+        now (float): time.monotonic() value of 'wall'
+        wall (datetime | None, optional): Defaults to datetime.now().
+    """
+
+    def __init__(
+        self,
+        failing: dict[str, tuple[int, str]],
+        now: float,
+        wall: datetime | None = None,
+    ) -> None:
+        wall = wall or datetime.now()
+        self.fails: dict[str, int] = {}
+        self._retry_at: dict[str, float] = {}
+        for hostname, (fails, updated) in failing.items():
+            self.fails[hostname] = fails
+            waited = (wall - _parse_time(updated)).total_seconds() if updated else 0
+            self._retry_at[hostname] = now + breaker_backoff(fails) - waited
+
+    def retry_at(self, fw: _conn, now: float) -> float | None:
+        """time.monotonic() value when the open breaker of fw lets a probe through.
+        None if its breaker is closed, or due a probe."""
+        retry_at = self._retry_at.get(_hostname(fw))
+        return retry_at if retry_at is not None and retry_at > now else None
+
+    def record(self, fw: _conn, success: bool, now: float) -> None:
+        """Count the result of a poll of fw"""
+        hostname = _hostname(fw)
+        if success:
+            if self.fails.pop(hostname, 0) >= BREAKER_THRESHOLD and fw.address:
+                fw.address.adaptive_timeout = None
+            self._retry_at.pop(hostname, None)
+            return
+        fails = self.fails[hostname] = self.fails.get(hostname, 0) + 1
+        if BREAKER_THRESHOLD and fails >= BREAKER_THRESHOLD:
+            self._retry_at[hostname] = now + breaker_backoff(fails)
+            if fw.address:
+                fw.address.adaptive_timeout = probe_timeouts(fw.address)
+
+
+def _hostname(fw: _conn) -> str:
+    return fw.address.hostname if fw.address else ""
+
+
+@dataclass
+class DaemonStats:
+    """Counters collected while the daemon runs"""
+
+    jobs: Counter[str] = field(default_factory=Counter)
+    failures: Counter[str] = field(default_factory=Counter)
+    # due jobs held back by an open circuit breaker
+    held: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        counts = ", ".join(
+            f"{kind} {count} ({self.failures[kind]} failed)"
+            for kind, count in sorted(self.jobs.items())
+        )
+        return f"Daemon ran {self.elapsed:.0f}s: {counts or 'no polls'}"
+
+
+def run_job(job: ScheduledJob) -> _sresp:
+    """Poll a firewall. Safe to call from a worker thread."""
+    fw = job.fw
+    try:
+        with _bind_firewall(fw):
+            if job.kind != HEARTBEAT:
+                return fw.refresh_info()
+            (result,) = execute_script_item(fw, ScriptItem("HEARTBEAT_STATUS"))
+            if result.text and _c.SESSION_EXPIRED_MSG in result.text:
+                # log in again on the next poll
+                fw.drop_session()
+            return result
+    except Exception as e:
+        logerror(e)
+        return _sresp(fw=fw, error=_ex.AgentError(str(e)), trace="dmn-01")
+
+
+def save_job_result(
+    db: _db | DBWriter, job: ScheduledJob, result: _sresp, stats: DaemonStats
+) -> None:
+    """Write the result of a poll to the database. Must only be called by the
+    thread that owns the database connection, unless db is a DBWriter.
+    """
+    stats.jobs[job.kind] += 1
+    if not result.success:
+        stats.failures[job.kind] += 1
+    try:
+        if job.kind == HEARTBEAT:
+            # no request timings: a row per firewall a minute would outgrow the
+            # database, and refreshes sample the same connections
+            db.update_fw_status(result)
+        else:
+            save_refresh_result(db, result, licenses=job.kind == LICENSES)
+    except Exception as e:
+        logerror(e)
+    result.release()
+
+
+def run_daemon(
+    firewalls: list[_conn],
+    db: _db,
+    concurrency: int = 1,
+    intervals: dict[str, float] | None = None,
+    stop: threading.Event | None = None,
+    stats: DaemonStats | None = None,
+) -> DaemonStats:
+    """Poll firewalls on their intervals until 'stop' is set
+
+    Connectors, and with them their webadmin sessions and keep-alive connections,
+    are kept between polls. Polls run on up to 'concurrency' worker threads, never
+    more than one at a time per firewall. Results are written to the database by
+    a DBWriter, in batches, so polls are never held up by the disk. Database
+    maintenance runs at startup and every MAINTENANCE_INTERVAL seconds. If
+    GC_METRICS_FILE is set, the metrics of the polls are written to it every
+    METRICS_INTERVAL seconds, and when the daemon stops.
+
+    Firewalls that fail GC_BREAKER_THRESHOLD polls in a row are only probed with
+    backoff, like in plan_refresh(): see Breaker.
+
+    Args:
+        firewalls (list[_conn]): Firewalls to poll
+        db (_db): Database to store results in
+        concurrency (int, optional): Number of worker threads. Defaults to 1.
+        intervals (dict[str, float] | None, optional): Seconds between polls by
+            job kind. Defaults to GC_DAEMON_HEARTBEAT_INTERVAL,
+            GC_DAEMON_REFRESH_INTERVAL and GC_DAEMON_LICENSE_INTERVAL.
+        stop (threading.Event | None, optional): Set to stop the daemon. Polls
+            already running are completed and saved.
+        stats (DaemonStats | None, optional): Updated while the daemon runs.
+
+    Returns:
+        DaemonStats: Polls run and failed, by job kind
+    """
+    stop = stop or threading.Event()
+    stats = stats if stats is not None else DaemonStats()
+    scheduler = Scheduler(intervals or default_intervals())
+    db.maintenance()
+    # adaptive timeouts, from the reply history of earlier runs
+    plan_refresh(firewalls, db)
+    tstart = time.monotonic()
+    failing = db.get_failing_devices(BREAKER_THRESHOLD) if BREAKER_THRESHOLD else {}
+    breaker = Breaker(failing, tstart)
+    next_maintenance = tstart + MAINTENANCE_INTERVAL
+    metrics = DaemonMetrics()
+    next_metrics = tstart + METRICS_INTERVAL
+    # how long a job waits for the running poll of the same firewall
+    busy_wait = min(IDLE_WAIT, min(scheduler.intervals.values(), default=1) / 10)
+    scheduler.start(firewalls, tstart)
+    running: dict[Future, ScheduledJob] = {}
+    busy: set[int] = set()
+    loginfo(action="daemon", firewalls=len(firewalls), **scheduler.intervals)
+    agent_loginfo(f"Daemon polling {len(firewalls)} firewalls")
+
+    writer = DBWriter(db)
+
+    def finish(done) -> None:
+        for future in done:
+            job = running.pop(future)
+            busy.discard(id(job.fw))
+            result = future.result()
+            now = time.monotonic()
+            breaker.record(job.fw, bool(result.success), now)
+            metrics.add(job.kind, result)
+            save_job_result(writer, job, result, stats)
+            retry_at = breaker.retry_at(job.fw, now)
+            scheduler.reschedule(job, now, not_before=retry_at or 0)
+
+    with (
+        writer,
+        ThreadPoolExecutor(max(1, concurrency), thread_name_prefix="daemon") as pool,
+        bind_log_context(session_id=db.session_id),
+    ):
+        while not stop.is_set():
+            now = time.monotonic()
+            if now >= next_maintenance:
+                writer.put(lambda db: db.maintenance())
+                next_maintenance = now + MAINTENANCE_INTERVAL
+            if now >= next_metrics:
+                _write_metrics(metrics)
+                next_metrics = now + METRICS_INTERVAL
+            for job in scheduler.pop_due(now):
+                retry_at = breaker.retry_at(job.fw, now)
+                if retry_at is not None:
+                    # held until the breaker lets a probe through
+                    stats.held += 1
+                    scheduler.push(job.kind, job.fw, retry_at)
+                    continue
+                if id(job.fw) in busy:
+                    # the previous poll of this firewall is still running
+                    scheduler.push(job.kind, job.fw, now + busy_wait)
+                    continue
+                busy.add(id(job.fw))
+                context = contextvars.copy_context()
+                running[pool.submit(context.run, run_job, job)] = job
+
+            next_due = scheduler.next_due()
+            timeout = IDLE_WAIT if next_due is None else next_due - time.monotonic()
+            timeout = min(max(timeout, 0), IDLE_WAIT)
+            if running:
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                finish(done)
+            else:
+                stop.wait(timeout)
+
+        finish(wait(running).done)
+    _write_metrics(metrics)
+
+    stats.elapsed = time.monotonic() - tstart
+    loginfo(
+        action="daemon",
+        jobs=dict(stats.jobs),
+        failures=dict(stats.failures),
+        held=stats.held,
+    )
+    agent_loginfo(stats.summary())
+    return stats
+
+
+def _write_metrics(metrics: DaemonMetrics) -> None:
+    try:
+        write_metrics(metrics)
+    except Exception as e:
+        logerror(e)
+    metrics.reset()
@@ -0,0 +1,209 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sfos.base import GroundControlDB as _db
+from sfos.logging.logging import loginfo, logtrace
+from sfos.objects import ServiceAddress as _sa
+from sfos.webadmin.connector import Connector as _conn
+
+ADAPTIVE_TIMEOUT_PERCENTILE = float(os.getenv("GC_ADAPTIVE_TIMEOUT_PERCENTILE", "95"))
+ADAPTIVE_TIMEOUT_FACTOR = float(os.getenv("GC_ADAPTIVE_TIMEOUT_FACTOR", "3"))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("GC_ADAPTIVE_TIMEOUT_MIN", "2"))
+ADAPTIVE_TIMEOUT_SAMPLES = int(os.getenv("GC_ADAPTIVE_TIMEOUT_SAMPLES", "50"))
+BREAKER_THRESHOLD = int(os.getenv("GC_BREAKER_THRESHOLD", "5"))
+BREAKER_BACKOFF = float(os.getenv("GC_BREAKER_BACKOFF", "3600"))
+BREAKER_MAX_BACKOFF = float(os.getenv("GC_BREAKER_MAX_BACKOFF", "604800"))
+REFRESH_LICENSE_DAYS = int(os.getenv("GC_REFRESH_LICENSE_DAYS", "30"))
+REFRESH_URGENT_MAX_AGE = float(os.getenv("GC_REFRESH_URGENT_MAX_AGE", "14400"))
+# fewer samples than this say too little about a firewall to shorten its timeout
+MIN_SAMPLES = 5
+
+
+@dataclass
+class RefreshPlan:
+    """Firewalls to contact in a refresh, in order
+
+    Firewalls whose circuit breaker is open and due a probe come last, after all
+    firewalls that are expected to answer. Firewalls still backing off are skipped.
+    """
+
+    firewalls: list[_conn] = field(default_factory=list)
+    skipped: list[_conn] = field(default_factory=list)
+    probes: int = 0
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def adaptive_timeout(samples_ms: list[float], default: float) -> float:
+    """Timeout for a request phase, from the phase times seen on earlier requests
+
+    Returns:
+        float: GC_ADAPTIVE_TIMEOUT_FACTOR times the GC_ADAPTIVE_TIMEOUT_PERCENTILE
+               of samples_ms, in seconds, between GC_ADAPTIVE_TIMEOUT_MIN and
+               default. default if there are too few samples.
+    """
+    if len(samples_ms) < MIN_SAMPLES:
+        return default
+    timeout = ADAPTIVE_TIMEOUT_FACTOR * percentile(
+        samples_ms, ADAPTIVE_TIMEOUT_PERCENTILE
+    )
+    return min(max(timeout / 1000, ADAPTIVE_TIMEOUT_MIN), default)
+
+
+def breaker_backoff(consecutive_fails: int) -> float:
+    """Seconds to wait before probing a firewall with an open circuit breaker.
+    Doubles with every failed probe, up to GC_BREAKER_MAX_BACKOFF.
+    """
+    doublings = min(max(consecutive_fails - BREAKER_THRESHOLD, 0), 32)
+    return min(BREAKER_BACKOFF * 2**doublings, BREAKER_MAX_BACKOFF)
+
+
+def probe_timeouts(address: _sa) -> tuple[float, float]:
+    """(connect, read) timeouts of a probe of an offline firewall"""
+    default = float(address.timeout)
+    return (min(ADAPTIVE_TIMEOUT_MIN, default), default)
+
+
+def plan_refresh(
+    firewalls: list[_conn], db: _db, now: datetime | None = None
+) -> RefreshPlan:
+    """Set adaptive timeouts on firewalls and order them for a refresh
+
+    Each firewall's (connect, read) timeouts are derived from its latest
+    GC_ADAPTIVE_TIMEOUT_SAMPLES answered requests. Firewalls that failed
+    GC_BREAKER_THRESHOLD refreshes in a row are only probed once their backoff has
+    passed since their last attempt, with the shortest connect timeout.
+
+    Args:
+        firewalls (list[_conn]): Firewalls to refresh
+        db (_db): Database holding the inventory and request_timings history
+        now (datetime | None, optional): Defaults to datetime.now().
+
+    Returns:
+        RefreshPlan: Firewalls to contact, and firewalls skipped
+    """
+    now = now or datetime.now()
+    history = {}
+    if ADAPTIVE_TIMEOUT_PERCENTILE > 0:
+        history = db.get_reply_history(ADAPTIVE_TIMEOUT_SAMPLES)
+    failing = db.get_failing_devices(BREAKER_THRESHOLD) if BREAKER_THRESHOLD else {}
+
+    plan = RefreshPlan()
+    probes = []
+    for fw in firewalls:
+        address = fw.address
+        if address is None:
+            plan.firewalls.append(fw)
+            continue
+
+        address.adaptive_timeout = None
+        default = float(address.timeout)
+        if address.hostname in failing:
+            fails, updated = failing[address.hostname]
+            wait = breaker_backoff(fails)
+            if updated and (now - _parse_time(updated)).total_seconds() < wait:
+                logtrace(host=address.hostname, fails=fails, msg="breaker open")
+                plan.skipped.append(fw)
+                continue
+            address.adaptive_timeout = probe_timeouts(address)
+            probes.append(fw)
+            continue
+
+        replies = history.get(address.address, [])
+        handshakes = [ms for reused, ms, _ in replies if not reused]
+        requests = [ms for _, _, ms in replies if ms is not None]
+        timeouts = (
+            adaptive_timeout(handshakes, default),
+            adaptive_timeout(requests, default),
+        )
+        if timeouts != (default, default):
+            address.adaptive_timeout = timeouts
+        plan.firewalls.append(fw)
+
+    plan.firewalls.extend(probes)
+    plan.probes = len(probes)
+    if plan.skipped or plan.probes:
+        loginfo(
+            action="refresh_plan",
+            firewalls=len(plan.firewalls),
+            probes=plan.probes,
+            skipped=len(plan.skipped),
+        )
+    return plan
+
+
+def select_stale(
+    firewalls: list[_conn], db: _db, max_age: float, now: datetime | None = None
+) -> tuple[list[_conn], list[_conn]]:
+    """Pick the firewalls an incremental refresh must contact
+
+    Firewalls not refreshed within max_age seconds are stale, oldest first.
+    Firewalls whose last result was ERROR, or with a license that expires or
+    expired within GC_REFRESH_LICENSE_DAYS days, are urgent: stale after
+    GC_REFRESH_URGENT_MAX_AGE seconds, or max_age if shorter, and refreshed ahead
+    of all others. The inventory is read with a single query.
+
+    Args:
+        firewalls (list[_conn]): Firewalls in the inventory
+        db (_db): Database holding the inventory
+        max_age (float): Seconds after which a refresh is stale
+        now (datetime | None, optional): Defaults to datetime.now().
+
+    Returns:
+        tuple[list[_conn], list[_conn]]: Firewalls to refresh, in order, and
+                                         firewalls that are fresh
+    """
+    now = now or datetime.now()
+    state = db.get_refresh_state()
+    urgent_max_age = min(max_age, REFRESH_URGENT_MAX_AGE)
+    urgent, stale, fresh = [], [], []
+    for fw in firewalls:
+        updated, last_result, license_days = state.get(
+            fw.address.hostname if fw.address else "", (None, None, None)
+        )
+        is_urgent = last_result == "ERROR" or (
+            license_days is not None and license_days <= REFRESH_LICENSE_DAYS
+        )
+        age = (now - _parse_time(updated)).total_seconds() if updated else math.inf
+        if age < (urgent_max_age if is_urgent else max_age):
+            fresh.append(fw)
+        elif is_urgent:
+            urgent.append((license_days if license_days is not None else -1, fw))
+        else:
+            stale.append((-age, fw))
+
+    ordered = [fw for _, fw in sorted(urgent, key=lambda item: item[0])]
+    ordered += [fw for _, fw in sorted(stale, key=lambda item: item[0])]
+    loginfo(
+        action="select_stale",
+        max_age=max_age,
+        urgent=len(urgent),
+        stale=len(stale),
+        fresh=len(fresh),
+    )
+    return ordered, fresh
+
+
+def _parse_time(value: str) -> datetime:
+    # inventory.updated holds local isoformat times written by the agent
+    return datetime.fromisoformat(value).replace(tzinfo=None)
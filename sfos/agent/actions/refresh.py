@@ -0,0 +1,355 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+# pylint: disable=broad-exception-caught
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from sfos.base import GroundControlDB as _db
+from sfos.base.db import DBWriter
+from sfos.base.db.ground_control_db import inventory_row
+from sfos.base.refresh_worker import RefreshRecord, refresh_sharded
+from sfos.logging.logging import agent_loginfo, bind_log_context, loginfo, logerror
+from sfos.static import exceptions as _ex
+from sfos.webadmin.async_connector import AsyncConnector as _aconn
+from sfos.webadmin.connector import Connector as _conn, SfosResponse as _sresp
+
+
+@dataclass
+class RefreshStats:
+    """Aggregate counters collected during a refresh run"""
+
+    count: int = 0
+    failures: int = 0
+    concurrency: int = 1
+    workers: int = 1
+    elapsed: float = 0.0
+    db_elapsed: float = 0.0
+    skipped: int = 0
+    probes: int = 0
+    retries: int = 0
+    fresh: int = 0
+
+    @property
+    def rate(self) -> float:
+        """Firewalls refreshed per second"""
+        return self.count / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        workers = f"workers={self.workers}, " if self.workers > 1 else ""
+        summary = (
+            f"Refreshed {self.count} firewalls in {self.elapsed:.2f}s "
+            f"({self.rate:.2f} firewalls/sec, {workers}"
+            f"concurrency={self.concurrency}, db={self.db_elapsed:.2f}s)"
+        )
+        if self.fresh:
+            summary += f". {self.fresh} firewalls still fresh, not refreshed"
+        if self.skipped or self.probes:
+            summary += (
+                f". Offline firewalls: {self.probes} probed, "
+                f"{self.skipped} skipped until their next probe"
+            )
+        return summary
+
+
+def fetch_refresh_info(fw: _conn) -> _sresp:
+    """Collect login info from a firewall. Safe to call from a worker thread.
+
+    Args:
+        fw (_conn): Firewall connection to refresh
+
+    Returns:
+        _sresp: Response from Connector.get_info(), or a failed response if
+                get_info raised unexpectedly
+    """
+    try:
+        with _bind_firewall(fw):
+            return fw.get_info()
+    except Exception as e:
+        logerror(e)
+        return _sresp(fw=fw, error=_ex.AgentError(str(e)), trace="rcr-02")
+
+
+async def fetch_refresh_info_async(fw: _aconn) -> _sresp:
+    """Coroutine variant of fetch_refresh_info for an AsyncConnector"""
+    try:
+        with _bind_firewall(fw):
+            return await fw.get_info()
+    except Exception as e:
+        logerror(e)
+        return _sresp(fw=fw, error=_ex.AgentError(str(e)), trace="rcr-02")
+
+
+def save_refresh_result(
+    db: _db | DBWriter, sfos_resp: _sresp, licenses: bool = True
+) -> _sresp:
+    """Write a refresh result to the database. Must only be called by the thread
+    that owns the database connection, or with a DBWriter from any thread. The
+    license records are skipped if 'licenses' is False.
+    """
+    msgdata = {**inventory_row(sfos_resp), "session_id": db.session_id}
+    agent_loginfo(
+        f"refresh check complete for {sfos_resp.fw.address.address}",  # type: ignore
+        **msgdata,
+    )
+    db.insert_or_update_fwinfo(sfos_resp, licenses=licenses)
+    agent_loginfo()
+    sfos_resp.trace = "101"
+    return sfos_resp
+
+
+def run_refresh(
+    firewalls: list[_conn],
+    db: _db | None = None,
+    concurrency: int = 1,
+    stats: RefreshStats | None = None,
+) -> list[_sresp]:
+    """Refresh info for all firewalls and store the results
+
+    Firewalls are contacted by up to 'concurrency' worker threads. Sequential
+    refreshes are committed once. Concurrent ones hand their results to a DBWriter,
+    so the database connection is only used by its thread, and workers never wait
+    for the disk unless its queue is full.
+
+    Args:
+        firewalls (list[_conn]): Firewalls to refresh
+        db (_db | None, optional): Database to store results in. Defaults to None.
+        concurrency (int, optional): Number of worker threads. Defaults to 1.
+        stats (RefreshStats | None, optional): Updated with run totals if provided.
+
+    Returns:
+        list[_sresp]: One response per firewall, in completion order
+    """
+    if not db:
+        return [_sresp(error=_ex.DatabaseError(("No database")), trace="rcr-01")]
+
+    stats = stats if stats is not None else RefreshStats()
+    stats.concurrency = max(1, min(concurrency or 1, len(firewalls) or 1))
+    results = []
+    tstart = time.perf_counter()
+
+    with bind_log_context(session_id=db.session_id):
+        if stats.concurrency == 1:
+            with _timed_transaction(db, stats):
+                for fw in firewalls:
+                    msg = f"fetching info from {fw.address.address}.."  # type: ignore
+                    agent_loginfo(msg)
+                    sfos_resp = fetch_refresh_info(fw)
+                    results.append(_timed_save(db, sfos_resp, stats))
+        else:
+            with (
+                DBWriter(db) as writer,
+                ThreadPoolExecutor(
+                    max_workers=stats.concurrency, thread_name_prefix="refresh"
+                ) as pool,
+            ):
+                # each worker task runs in a copy of this thread's log context
+                futures = [
+                    pool.submit(
+                        contextvars.copy_context().run, _fetch_and_queue, fw, writer
+                    )
+                    for fw in firewalls
+                ]
+                for future in as_completed(futures):
+                    results.append(future.result())
+            stats.db_elapsed += writer.stats.elapsed
+
+    _finish_stats(stats, results, tstart)
+    return results
+
+
+def run_refresh_sharded(
+    firewalls: list[_conn],
+    db: _db | None = None,
+    workers: int = 2,
+    concurrency: int = 1,
+    stats: RefreshStats | None = None,
+) -> list[_sresp]:
+    """Refresh info for all firewalls from a pool of worker processes
+
+    Firewalls are split across 'workers' processes, each contacting up to
+    'concurrency' firewalls at once. Workers send back the parsed database rows
+    only. They are written by the calling thread, as they arrive, and the whole
+    batch is committed once.
+
+    Args:
+        firewalls (list[_conn]): Firewalls to refresh
+        db (_db | None, optional): Database to store results in. Defaults to None.
+        workers (int, optional): Number of worker processes. Defaults to 2.
+        concurrency (int, optional): Threads per worker process. Defaults to 1.
+        stats (RefreshStats | None, optional): Updated with run totals if provided.
+
+    Returns:
+        list[_sresp]: One response per firewall, in completion order. The
+                      responses carry the result and timings, but no page data.
+    """
+    if not db:
+        return [_sresp(error=_ex.DatabaseError(("No database")), trace="rcr-01")]
+
+    stats = stats if stats is not None else RefreshStats()
+    stats.workers = max(1, min(workers or 1, len(firewalls) or 1))
+    per_worker = -(-len(firewalls) // stats.workers) or 1
+    stats.concurrency = max(1, min(concurrency or 1, per_worker))
+    results = []
+    tstart = time.perf_counter()
+
+    with _timed_transaction(db, stats), bind_log_context(session_id=db.session_id):
+        for fw, record in refresh_sharded(
+            firewalls, stats.workers, stats.concurrency, db.session_id
+        ):
+            results.append(_timed_save_record(db, fw, record, stats))
+
+    _finish_stats(stats, results, tstart)
+    return results
+
+
+async def run_refresh_async(
+    firewalls: list[_aconn],
+    db: _db | None = None,
+    concurrency: int = 1,
+    stats: RefreshStats | None = None,
+) -> list[_sresp]:
+    """Refresh info for all firewalls from the running event loop
+
+    Up to 'concurrency' firewalls are contacted at once. Results are handed to a
+    DBWriter from a worker thread as they arrive, so neither database writes nor
+    a full writer queue hold up the event loop.
+
+    Args:
+        firewalls (list[_aconn]): Firewalls to refresh
+        db (_db | None, optional): Database to store results in. Defaults to None.
+        concurrency (int, optional): Maximum open requests. Defaults to 1.
+        stats (RefreshStats | None, optional): Updated with run totals if provided.
+
+    Returns:
+        list[_sresp]: One response per firewall, in completion order
+    """
+    if not db:
+        return [_sresp(error=_ex.DatabaseError(("No database")), trace="rcr-01")]
+
+    stats = stats if stats is not None else RefreshStats()
+    stats.concurrency = max(1, min(concurrency or 1, len(firewalls) or 1))
+    limit = asyncio.Semaphore(stats.concurrency)
+    results = []
+    tstart = time.perf_counter()
+
+    async def fetch(fw: _aconn) -> _sresp:
+        async with limit:
+            return await fetch_refresh_info_async(fw)
+
+    with DBWriter(db) as writer, bind_log_context(session_id=db.session_id):
+        for task in asyncio.as_completed([fetch(fw) for fw in firewalls]):
+            sfos_resp = await task
+            results.append(await asyncio.to_thread(_queue_result, writer, sfos_resp))
+    stats.db_elapsed += writer.stats.elapsed
+
+    _finish_stats(stats, results, tstart)
+    return results
+
+
+def _finish_stats(stats: RefreshStats, results: list[_sresp], tstart: float) -> None:
+    stats.elapsed = time.perf_counter() - tstart
+    stats.count = len(results)
+    stats.failures = len([r for r in results if not r.success])
+    stats.retries = sum(r.retries for r in results)
+    loginfo(
+        action="refresh",
+        count=stats.count,
+        failures=stats.failures,
+        concurrency=stats.concurrency,
+        workers=stats.workers,
+        skipped=stats.skipped,
+        probes=stats.probes,
+        retries=stats.retries,
+        fresh=stats.fresh,
+        elapsed=f"{stats.elapsed:.3f}",
+        db_elapsed=f"{stats.db_elapsed:.3f}",
+        rate=f"{stats.rate:.2f}",
+    )
+    agent_loginfo(stats.summary())
+
+
+def _bind_firewall(fw: _conn | _aconn):
+    address = fw.address
+    if address is None:
+        return bind_log_context()
+    return bind_log_context(host=address.hostname, port=address.port)
+
+
+@contextmanager
+def _timed_transaction(db: _db, stats: RefreshStats):
+    with db.transaction():
+        yield
+        tcommit = time.perf_counter()
+    stats.db_elapsed += time.perf_counter() - tcommit
+
+
+def _fetch_and_queue(fw: _conn, writer: DBWriter) -> _sresp:
+    return _queue_result(writer, fetch_refresh_info(fw))
+
+
+def _queue_result(writer: DBWriter, sfos_resp: _sresp) -> _sresp:
+    try:
+        result = save_refresh_result(writer, sfos_resp)
+    except Exception as e:
+        logerror(e)
+        result = sfos_resp
+    result.release()
+    return result
+
+
+def _timed_save(db: _db, sfos_resp: _sresp, stats: RefreshStats) -> _sresp:
+    tstart = time.perf_counter()
+    try:
+        result = save_refresh_result(db, sfos_resp)
+    finally:
+        stats.db_elapsed += time.perf_counter() - tstart
+    # a batch keeps every result until it completes, so drop the page text now
+    result.release()
+    return result
+
+
+def _timed_save_record(
+    db: _db, fw: _conn, record: RefreshRecord, stats: RefreshStats
+) -> _sresp:
+    agent_loginfo(
+        f"refresh check complete for {fw.address.address}",  # type: ignore
+        **record.inventory,
+    )
+    tstart = time.perf_counter()
+    try:
+        db.save_refresh_rows(
+            fw.address.address,  # type: ignore
+            record.inventory,
+            record.licenses,
+            record.timings,
+            success=record.success,
+        )
+    finally:
+        stats.db_elapsed += time.perf_counter() - tstart
+    if record.session and fw.session_cache is not None and fw.credentials:
+        fw.session_cache.put(fw.target(), *record.session)
+    return _sresp(
+        fw=fw,
+        error=record.error,
+        success=record.success or None,
+        data=record.inventory if record.success else None,
+        timer=record.timer,
+        timings=record.timings,
+        retries=record.retries,
+        trace="101",
+    )
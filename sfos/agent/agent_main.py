@@ -11,15 +11,26 @@ License.
 
 # pylint: disable=broad-exception-caught
 
+import asyncio
 import csv
 import os
+import signal
+import threading
 from pathlib import Path
 import prettytable
 from datetime import datetime
 from sfos import __version__ as _agent_version
 from sfos.base.db import init_db
 from sfos.agent.cli_args import read_root_args
-from sfos.agent.actions import run_cli_command, run_query, run_scripts
+from sfos.agent.actions import (
+    RefreshStats,
+    run_cli_command,
+    run_cli_command_async,
+    run_query,
+    run_scripts,
+)
+from sfos.agent.actions.daemon import run_daemon
+from sfos.agent.metrics import write_refresh_metrics
 from sfos.logging import (
     Level,
     log,
@@ -34,7 +45,7 @@ from sfos.logging import (
 
 init_logging(level=Level.INFO)
 loginfo(action="Starting", task="init_db")
-db = init_db()
+db = init_db(persistent=True)
 
 
 def write_csv(query: str, filename: str = "output.csv"):
@@ -57,6 +68,18 @@ def print_table(query: str):
     print(table)
 
 
+def start_daemon(firewalls: list, args) -> None:
+    """Poll firewalls until the process receives SIGINT or SIGTERM"""
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    print(f"Polling {len(firewalls)} firewalls. Stop with Ctrl+C or SIGTERM")
+    stats = run_daemon(
+        firewalls, db, concurrency=getattr(args, "concurrency", None) or 1, stop=stop
+    )
+    print(stats.summary())
+
+
 def start_agent() -> None:
     """Starts an agent run"""
     # log_callstart(verbose=True)
@@ -79,12 +102,22 @@ def start_agent() -> None:
                 rest=str(args),
                 target_count=len(firewalls),
             )
-            results = run_cli_command(firewalls, args, rest, db)
+            if args.command == "refresh" and getattr(args, "daemon", False):
+                start_daemon(firewalls, args)
+                return db.session_id
+            stats = RefreshStats()
+            if getattr(args, "use_async", False):
+                results = asyncio.run(
+                    run_cli_command_async(firewalls, args, rest, db, stats=stats)
+                )
+            else:
+                results = run_cli_command(firewalls, args, rest, db, stats=stats)
             command_summary = [
                 (r.fw.address.address, r.success, r.error) for r in results
             ]
             loginfo(action="command", results=command_summary)
             if args.command == "refresh":
+                print(stats.summary())
                 cli_query = db.load_sql_from_file("session_cli_result.sql")
                 csv_query = db.load_sql_from_file("session_csv_result.sql")
                 try:
@@ -110,6 +143,13 @@ def start_agent() -> None:
                     logerror(e)
                     print(f"Actions complete - error displaying summary. {e}")
 
+                try:
+                    metrics_file = write_refresh_metrics(results, stats)
+                    if metrics_file:
+                        logdebug(f"Refresh metrics written to '{metrics_file}'")
+                except OSError as e:
+                    logerror(e)
+
             # cleanup fail counting and fixed a bug stopping it from counting more than one fail
             failures = [fail for fail in results if not fail.success]
             for fail in failures:
@@ -9,7 +9,26 @@ the License for the specific language governing permissions and limitations unde
 License.
 """
 
-from argparse import ArgumentParser as _ap
+from argparse import (
+    ArgumentParser as _ap,
+    ArgumentTypeError as _ate,
+    Namespace as _ns,
+)
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def duration(value: str) -> float:
+    """Seconds in a duration like '90s', '30m', '6h' or '1d'. Minutes if no unit."""
+    unit = value[-1:].lower()
+    number = value[:-1] if unit in DURATION_UNITS else value
+    try:
+        seconds = float(number) * DURATION_UNITS.get(unit, 60)
+    except ValueError:
+        raise _ate(f"invalid duration '{value}'") from None
+    if seconds < 0:
+        raise _ate(f"invalid duration '{value}'")
+    return seconds
 
 
 def setup_command_arguments(parser: _ap) -> _ap:
@@ -45,4 +64,55 @@ def setup_command_arguments(parser: _ap) -> _ap:
     help = "Print response to STDOUT"
     parser.add_argument("-p", "--print", action="store_true", help=help)
 
+    help = "Default: 1, Number of firewalls to refresh in parallel"
+    parser.add_argument(
+        "--concurrency", type=int, default=1, dest="concurrency", help=help
+    )
+
+    help = (
+        "Default: 1, Number of processes to refresh from. Each contacts up to "
+        "--concurrency firewalls at once"
+    )
+    parser.add_argument("--workers", type=int, default=1, dest="workers", help=help)
+
+    help = (
+        "Contact firewalls from one asyncio event loop instead of threads, up to "
+        "--concurrency at once. Not used with --workers or --daemon"
+    )
+    parser.add_argument("--async", action="store_true", dest="use_async", help=help)
+
+    help = (
+        "Keep running and poll each firewall on its own interval, "
+        "set by the GC_DAEMON_* environment variables. Only used with refresh, "
+        "and not with --workers or --max-age"
+    )
+    parser.add_argument("--daemon", action="store_true", help=help)
+
+    help = (
+        "Incremental refresh: skip firewalls refreshed within this duration "
+        "(e.g. 90s, 30m, 6h, 1d; minutes if no unit). Firewalls with errors or "
+        "licenses close to expiry go first, and are stale after "
+        "GC_REFRESH_URGENT_MAX_AGE seconds if that is shorter"
+    )
+    parser.add_argument("--max-age", type=duration, dest="max_age", help=help)
+
     return parser
+
+
+def check_command_arguments(parser: _ap, args: _ns) -> _ns:
+    """Reject options that do not apply together. Exits with a usage error."""
+    if args.use_async and (args.workers != 1 or args.daemon):
+        parser.error(
+            "--async runs in one thread: --workers and --daemon cannot be used"
+        )
+    if not args.daemon:
+        return args
+    if args.command != "refresh":
+        parser.error("--daemon can only be used with refresh")
+    if args.workers != 1:
+        parser.error("--daemon polls from one process: --workers cannot be used")
+    if args.max_age is not None:
+        parser.error(
+            "--daemon polls on the GC_DAEMON_* intervals: --max-age cannot be used"
+        )
+    return args
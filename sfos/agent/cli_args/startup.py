@@ -17,7 +17,10 @@ from sfos.agent.methods import (
     read_cred_args,
     read_firewall_inventory,
 )
-from sfos.agent.cli_args.command_args import setup_command_arguments as _setup_cmd
+from sfos.agent.cli_args.command_args import (
+    check_command_arguments as _check_cmd,
+    setup_command_arguments as _setup_cmd,
+)
 from sfos.agent.cli_args.query_args import setup_query_arguments as _setup_query
 from sfos.agent.cli_args.report_args import setup_report_arguments as _setup_report
 from sfos.agent.cli_args.script_args import setup_script_arguments as _setup_script
@@ -164,8 +167,9 @@ def read_root_args(
     elif firewalls:
         logtrace("Firewall inventory found. Defaulting to action = 'command' 'refresh'")
         # Default choice if host or inventory was provided
+        # Keep any remaining args so refresh options like --concurrency apply
         action = "command"
-        action_args = ["refresh"]
+        action_args = ["refresh", *action_args]
     else:
         logtrace("No action argument or inventory. Defaulting to action = 'Help'")
         # Show root help if no other arguments given
@@ -182,4 +186,6 @@ def read_root_args(
     action_args, remaining_args = (
         parser.parse_known_args(action_args) if parser else ([], [])
     )
+    if action == "command":
+        _check_cmd(p_cmd, action_args)
     return firewalls, action_args, action, remaining_args
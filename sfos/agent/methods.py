@@ -33,7 +33,7 @@ from sfos.base import (
 from sfos.logging import logdebug, logerror, loginfo
 from sfos.objects import FirewallInfo as _Fwi
 from sfos.objects import ServiceAddress as _Sa
-from sfos.webadmin import Connector
+from sfos.webadmin import Connector, get_session_cache
 
 GC_DEFAULT_TIMEOUT = 10
 
@@ -210,6 +210,7 @@ def read_cred_args(args: _args.Namespace) -> dict:
 
 def _convert_inventory_to_connectors(inventory: list) -> list[Connector]:
     firewalls = []
+    session_cache = get_session_cache()
     for fw in inventory:
         try:
             # if "verify_tls" in fw:
@@ -219,7 +220,7 @@ def _convert_inventory_to_connectors(inventory: list) -> list[Connector]:
             # else:
             #     verify_tls = True
             firewalls.append(
-                Connector(**fw)
+                Connector(**fw, session_cache=session_cache)
                 #     hostname=fw["hostname"],
                 #     port=fw["port"],
                 #     verify_tls=verify_tls,
@@ -0,0 +1,339 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+Prometheus metrics for agent runs, written in node_exporter textfile format.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+
+from sfos.agent.actions.refresh import RefreshStats
+from sfos.logging.logging import dropped_log_records
+from sfos.objects.sfos_response import SfosResponse as _sresp
+
+METRICS_FILE = os.getenv("GC_METRICS_FILE", "")
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Metrics:
+    """Reply latency and failures by error class of the results counted so far
+
+    Counters and histograms continue from the samples of the file they replace,
+    'previous', so they keep increasing across runs like Prometheus expects.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.latency: dict[str, list[float]] = {}
+        self.errors: Counter[tuple[str, ...]] = Counter()
+        self.previous: dict[str, float] = {}
+        # log records dropped since the file was last written
+        self.dropped_records = 0
+        self.timestamp = time.time()
+
+    def add_latency(self, result: _sresp) -> None:
+        address = getattr(getattr(result.fw, "address", None), "address", None)
+        if address is not None:
+            replies = [t.total_ms for t in result.timings if t.total_ms is not None]
+            if not replies and result.timer is not None:
+                replies = [result.timer]
+            self.latency.setdefault(address, []).extend(ms / 1000 for ms in replies)
+
+    def render(self) -> str:
+        """Format all metrics as a node_exporter textfile"""
+        samples: dict[str, float] = {}
+        for address, latency in sorted(self.latency.items()):
+            samples.update(self._histogram(address, latency))
+        lines = self._cumulative(
+            "gc_firewall_reply_latency_seconds",
+            "histogram",
+            "Time taken by each webadmin request",
+            samples,
+        )
+        lines += self._metrics()
+        lines += self._cumulative(
+            "gc_log_records_dropped_total",
+            "counter",
+            "Log records dropped",
+            {"gc_log_records_dropped_total": self.dropped_records},
+        )
+        return "\n".join(lines) + "\n"
+
+    def _metrics(self) -> list[str]:
+        return []
+
+    def _cumulative(
+        self, name: str, metric_type: str, help_text: str, samples: dict[str, float]
+    ) -> list[str]:
+        """Lines of a counter or histogram, added to its previous samples"""
+        names = {name, f"{name}_bucket", f"{name}_sum", f"{name}_count"}
+        for key, value in self.previous.items():
+            if key.split("{", 1)[0] in names:
+                samples[key] = samples.get(key, 0) + value
+        lines = _header(name, metric_type, help_text)
+        lines.extend(f"{key} {value}" for key, value in samples.items())
+        return lines
+
+    def _histogram(self, address: str, samples: list[float]) -> dict[str, float]:
+        name = "gc_firewall_reply_latency_seconds"
+        counts = [0] * len(self.buckets)
+        for sample in samples:
+            index = bisect_left(self.buckets, sample)
+            if index < len(counts):
+                counts[index] += 1
+        histogram = {}
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            histogram[_key(f"{name}_bucket", firewall=address, le=f"{bound}")] = (
+                cumulative
+            )
+        histogram[_key(f"{name}_bucket", firewall=address, le="+Inf")] = len(samples)
+        histogram[_key(f"{name}_sum", firewall=address)] = sum(samples)
+        histogram[_key(f"{name}_count", firewall=address)] = len(samples)
+        return histogram
+
+
+class RefreshMetrics(_Metrics):
+    """Metrics collected from the results of one refresh run
+
+    Args:
+        results (list[_sresp]): Responses returned by run_refresh
+        stats (RefreshStats): Totals of the same run
+        buckets (tuple[float, ...]): Upper bounds in seconds of the reply latency
+                                     histogram buckets
+    """
+
+    def __init__(
+        self,
+        results: list[_sresp],
+        stats: RefreshStats,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(buckets)
+        self.stats = stats
+        self.logins: Counter[str] = Counter()
+        for result in results:
+            self.add(result)
+
+    def add(self, result: _sresp) -> None:
+        """Count the outcome of one firewall's refresh"""
+        self.add_latency(result)
+        if result.success:
+            self.logins["success"] += 1
+        else:
+            self.logins["failure"] += 1
+            self.errors[(type(result.error).__name__,)] += 1
+
+    def _metrics(self) -> list[str]:
+        lines = self._cumulative(
+            "gc_logins_total",
+            "counter",
+            "Firewall logins attempted, by result",
+            {
+                _key("gc_logins_total", result=result): self.logins[result]
+                for result in ("success", "failure")
+            },
+        )
+        lines += self._cumulative(
+            "gc_login_failures_total",
+            "counter",
+            "Failed logins, by error class",
+            {
+                _key("gc_login_failures_total", error=error): count
+                for (error,), count in sorted(self.errors.items())
+            },
+        )
+
+        stats = self.stats
+        for name, value, help_text in (
+            ("gc_refresh_firewalls", stats.count, "Firewalls refreshed"),
+            ("gc_refresh_failures", stats.failures, "Firewalls that failed"),
+            ("gc_refresh_skipped", stats.skipped, "Offline firewalls not contacted"),
+            ("gc_refresh_fresh", stats.fresh, "Fresh firewalls not refreshed"),
+            ("gc_refresh_probes", stats.probes, "Offline firewalls probed"),
+            ("gc_refresh_retries", stats.retries, "Requests sent again after errors"),
+            ("gc_refresh_concurrency", stats.concurrency, "Refresh worker count"),
+            ("gc_refresh_workers", stats.workers, "Refresh worker processes"),
+            ("gc_refresh_duration_seconds", stats.elapsed, "Refresh duration"),
+            ("gc_refresh_db_write_seconds", stats.db_elapsed, "Database write time"),
+            ("gc_refresh_firewalls_per_second", stats.rate, "Refresh throughput"),
+            ("gc_refresh_last_run_timestamp_seconds", self.timestamp, "Run end time"),
+        ):
+            lines += _header(name, "gauge", help_text)
+            lines.append(_sample(name, value))
+        return lines
+
+
+class DaemonMetrics(_Metrics):
+    """Metrics of the polls run by the daemon since the textfile was last written
+
+    The daemon keeps its webadmin sessions, so polls are counted by job kind and
+    result instead of as logins.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        super().__init__(buckets)
+        self.started = self.timestamp
+        self.polls: Counter[tuple[str, str]] = Counter()
+
+    def add(self, kind: str, result: _sresp) -> None:
+        """Count the outcome of one poll"""
+        self.add_latency(result)
+        if result.success:
+            self.polls[(kind, "success")] += 1
+        else:
+            self.polls[(kind, "failure")] += 1
+            self.errors[(kind, type(result.error).__name__)] += 1
+
+    def reset(self) -> None:
+        """Start counting again after the textfile has been written"""
+        self.latency.clear()
+        self.errors.clear()
+        self.polls.clear()
+
+    def _metrics(self) -> list[str]:
+        lines = self._cumulative(
+            "gc_daemon_polls_total",
+            "counter",
+            "Polls run by the daemon, by job kind and result",
+            {
+                _key("gc_daemon_polls_total", kind=kind, result=result): count
+                for (kind, result), count in sorted(self.polls.items())
+            },
+        )
+        lines += self._cumulative(
+            "gc_daemon_poll_failures_total",
+            "counter",
+            "Failed polls, by job kind and error class",
+            {
+                _key("gc_daemon_poll_failures_total", kind=kind, error=error): count
+                for (kind, error), count in sorted(self.errors.items())
+            },
+        )
+        for name, value, help_text in (
+            (
+                "gc_daemon_uptime_seconds",
+                self.timestamp - self.started,
+                "Time since the daemon started",
+            ),
+            (
+                "gc_daemon_last_write_timestamp_seconds",
+                self.timestamp,
+                "Time the daemon last wrote its metrics",
+            ),
+        ):
+            lines += _header(name, "gauge", help_text)
+            lines.append(_sample(name, value))
+        return lines
+
+
+_dropped_written = 0
+_write_lock = threading.Lock()
+
+
+def write_metrics(metrics: _Metrics, filename: str | None = None) -> Path | None:
+    """Write metrics to a node_exporter textfile
+
+    Counters and histograms are added to the samples of the file being replaced.
+    The file is replaced atomically so the textfile collector never reads a
+    partial file.
+
+    Args:
+        metrics (_Metrics): RefreshMetrics or DaemonMetrics
+        filename (str | None, optional): Defaults to GC_METRICS_FILE.
+
+    Returns:
+        Path | None: The file written, or None if no metrics file is configured
+    """
+    global _dropped_written
+    filename = filename or METRICS_FILE
+    if not filename:
+        return None
+    path = Path(filename)
+    with _write_lock:
+        dropped = dropped_log_records()
+        metrics.dropped_records = dropped - _dropped_written
+        metrics.previous = _read_cumulative(path)
+        metrics.timestamp = time.time()
+        tmpfile = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmpfile.write_text(metrics.render(), encoding="utf-8")
+        os.replace(tmpfile, path)
+        _dropped_written = dropped
+    return path
+
+
+def write_refresh_metrics(
+    results: list[_sresp], stats: RefreshStats, filename: str | None = None
+) -> Path | None:
+    """Write the metrics of a refresh run to a node_exporter textfile
+
+    Args:
+        results (list[_sresp]): Responses returned by run_refresh
+        stats (RefreshStats): Totals of the same run
+        filename (str | None, optional): Defaults to GC_METRICS_FILE.
+
+    Returns:
+        Path | None: The file written, or None if no metrics file is configured
+    """
+    return write_metrics(RefreshMetrics(results, stats), filename)
+
+
+def _read_cumulative(path: Path) -> dict[str, float]:
+    """Samples of the counters and histograms of a textfile written earlier"""
+    try:
+        text = path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return {}
+    families = set()
+    samples: dict[str, float] = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split()
+            if metric_type in ("counter", "histogram"):
+                families.add(name)
+        elif line and not line.startswith("#"):
+            key, _, value = line.rpartition(" ")
+            name = key.split("{", 1)[0]
+            if name in families or name.rsplit("_", 1)[0] in families:
+                samples[key] = _number(value)
+    return samples
+
+
+def _number(text: str) -> float:
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _header(name: str, metric_type: str, help_text: str) -> list[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+
+
+def _key(name: str, **labels: str) -> str:
+    if labels:
+        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        name = f"{name}{{{label_text}}}"
+    return name
+
+
+def _sample(name: str, value: float, **labels: str) -> str:
+    return f"{_key(name, **labels)} {value}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -15,6 +15,7 @@ from sfos.agent.methods import (
 from sfos.objects import CustomDict as _cdict
 from sfos.static import SfosMode as _req_mode
 from sfos.webadmin import (
+    AsyncConnector,
     Connector,
     SfosResponse as _sresp,
     make_sfos_request_from_template,
@@ -80,6 +81,26 @@ def execute_script_item(
     return fw.send_requests(*script_items)
 
 
+async def execute_script_item_async(
+    fw: AsyncConnector,
+    item: ScriptItem,
+    state: dict | None = None,
+) -> list[_sresp]:
+    """Coroutine variant of execute_script_item for an AsyncConnector"""
+    cmd = item["command"]
+    req_obj = item["request_object"]
+    req_object_def = load_request_object_data(cmd, req_obj) if req_obj else None
+    data = apply_state_vars(item["data"], state)
+
+    script_items = make_sfos_request_from_template(
+        command=cmd,
+        request_object=req_object_def,
+        address=fw.address,
+        data=data,
+    )
+    return await fw.send_requests(*script_items)
+
+
 def apply_state_vars(data: dict, state: dict | None = None) -> dict:
     if state is None:
         return data
@@ -1,4 +1,5 @@
-__all__ = ["GroundControlDB", "init_db"]
+__all__ = ["GroundControlDB", "DBWriter", "init_db"]
 
 from sfos.base.db.ground_control_db import GroundControlDB
+from sfos.base.db.db_writer import DBWriter
 from sfos.base.db.init_db import init_db
@@ -0,0 +1,213 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+# pylint: disable=broad-exception-caught
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from sfos.base.db.ground_control_db import (
+    GroundControlDB as _db,
+    inventory_row,
+    license_rows,
+    status_row,
+)
+from sfos.logging import db_logerror as logerror, db_logtrace as logtrace
+from sfos.static import exceptions as _ex
+from sfos.webadmin.connector import SfosResponse as _sresp
+
+DB_WRITER_QUEUE_SIZE = int(os.getenv("GC_DB_WRITER_QUEUE_SIZE", "256"))
+DB_WRITER_BATCH_ROWS = int(os.getenv("GC_DB_WRITER_BATCH_ROWS", "100"))
+DB_WRITER_BATCH_MS = float(os.getenv("GC_DB_WRITER_BATCH_MS", "200"))
+
+Job = Callable[[_db], Any]
+_STOP = object()
+
+
+@dataclass
+class DBWriterStats:
+    """Counters of a DBWriter"""
+
+    jobs: int = 0
+    batches: int = 0
+    failed: int = 0
+    # puts that waited for room in the queue
+    waits: int = 0
+    wait_elapsed: float = 0.0
+    # time spent writing and committing
+    elapsed: float = 0.0
+
+
+class DBWriter:
+    """Write to a database from a thread of its own
+
+    Producers put jobs in a bounded queue, and return as soon as there is room for
+    them. The writer thread runs them in transactions of up to 'batch_rows' jobs,
+    committed once the batch is full or 'batch_ms' after its first job. When the
+    queue is full, producers wait: the disk sets the pace, and memory stays bounded.
+
+    The writer takes over the database connection: nothing else may use 'db'
+    between start() and close().
+
+    Args:
+        db (_db): Database to write to. The connection is opened by the writer
+                  thread, and closed when it stops.
+        queue_size (int): Jobs waiting to be written before producers wait.
+                          Defaults to GC_DB_WRITER_QUEUE_SIZE or 256.
+        batch_rows (int): Most jobs per transaction.
+                          Defaults to GC_DB_WRITER_BATCH_ROWS or 100.
+        batch_ms (float): Longest wait in milliseconds for a batch to fill up.
+                          Defaults to GC_DB_WRITER_BATCH_MS or 200.
+    """
+
+    def __init__(
+        self,
+        db: _db,
+        queue_size: int = DB_WRITER_QUEUE_SIZE,
+        batch_rows: int = DB_WRITER_BATCH_ROWS,
+        batch_ms: float = DB_WRITER_BATCH_MS,
+    ) -> None:
+        self.db = db
+        self.batch_rows = max(1, batch_rows)
+        self.batch_ms = batch_ms
+        self.stats = DBWriterStats()
+        self._queue: queue.Queue = queue.Queue(max(1, queue_size))
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def session_id(self) -> str:
+        return self.db.session_id
+
+    def __enter__(self) -> DBWriter:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def start(self) -> DBWriter:
+        if self._thread is not None:
+            return self
+        if self.db._tx_depth:
+            raise _ex.DatabaseError("DBWriter can not start inside a transaction")
+        # sqlite3 connections belong to the thread that opened them
+        self.db.close_connection()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> DBWriterStats:
+        """Write every queued job, then stop the writer thread"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        return self.stats
+
+    def put(self, job: Job) -> None:
+        """Queue a job for the writer thread. Waits while the queue is full.
+
+        Args:
+            job (Job): Called with the database, inside a transaction
+        """
+        if self._thread is None:
+            raise _ex.DatabaseError("DBWriter is not running")
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            tstart = time.perf_counter()
+            self._queue.put(job)
+            with self._lock:
+                self.stats.waits += 1
+                self.stats.wait_elapsed += time.perf_counter() - tstart
+
+    def flush(self) -> None:
+        """Wait until every job queued so far has been committed"""
+        self._queue.join()
+
+    def insert_or_update_fwinfo(self, response: _sresp, licenses: bool = True):
+        """Queue the inventory, license and timing rows of a refresh response.
+        The rows are extracted by the calling thread.
+        """
+        inventory = inventory_row(response)
+        lic_rows = license_rows(response) if response.success and licenses else []
+        address = getattr(getattr(response.fw, "address", None), "address", None)
+        timings = response.timings
+        success = bool(response.success)
+        self.put(
+            lambda db: db.save_refresh_rows(
+                address, inventory, lic_rows, timings, success=success
+            )
+        )
+
+    def update_fw_status(self, response: _sresp) -> None:
+        """Queue the inventory status of a heartbeat response"""
+        status = status_row(response)
+        success = bool(response.success)
+        self.put(lambda db: db.save_status_row(status, success=success))
+
+    def insert_request_timings(self, response: _sresp) -> None:
+        """Queue the request timings of a response"""
+        address = getattr(getattr(response.fw, "address", None), "address", None)
+        timings = response.timings
+        self.put(lambda db: db.insert_timings(address, timings))
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_ms / 1000
+            while batch[-1] is not _STOP and len(batch) < self.batch_rows:
+                timeout = max(deadline - time.monotonic(), 0)
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch[-1] is _STOP:
+                stopping = True
+                batch.pop()
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + stopping):
+                self._queue.task_done()
+        self.db.close_connection()
+
+    def _write(self, batch: list[Job]) -> None:
+        tstart = time.perf_counter()
+        try:
+            with self.db.transaction():
+                for job in batch:
+                    job(self.db)
+        except Exception as e:
+            logerror(e)
+            self._add_elapsed(tstart)
+            if len(batch) == 1:
+                with self._lock:
+                    self.stats.failed += 1
+                return
+            # the batch was rolled back: keep the jobs that succeed on their own
+            for job in batch:
+                self._write([job])
+            return
+        self._add_elapsed(tstart)
+        with self._lock:
+            self.stats.jobs += len(batch)
+            self.stats.batches += 1
+        logtrace(action="db_writer", jobs=len(batch))
+
+    def _add_elapsed(self, tstart: float) -> None:
+        with self._lock:
+            self.stats.elapsed += time.perf_counter() - tstart
@@ -10,8 +10,7 @@ License.
 """
 
 import os
-from datetime import datetime
-import sqlite3
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 import dotenv
 
@@ -19,12 +18,12 @@ from random import choice
 from string import ascii_uppercase
 
 from sfos.objects.firewall_info import FirewallInfo
+from sfos.objects.request_timings import RequestTimings
 from sfos.static import exceptions as _ex
 from sfos.db import Database
 from sfos.webadmin.connector import Connector as _conn, SfosResponse as _sresp
 from sfos.logging import (
     db_logtrace as logtrace,
-    db_logerror as logerror,
     db_loginfo as loginfo,
     caller_name,
 )
@@ -34,6 +33,7 @@ dotenv.load_dotenv()
 # Moved getenv logic to to to make __init__ logic easier to read
 DEFAULT_DATABASE_FILE = os.getenv("GC_DATABASE_FILE", "./ground_control.sqlite3")
 DEFAULT_SQL_INIT_PATH = os.getenv("GC_SQL_INIT_PATH", "./sfos/base/db/init")
+TIMINGS_RETENTION_DAYS = float(os.getenv("GC_TIMINGS_RETENTION_DAYS", "14"))
 
 
 class GroundControlDB(Database):
@@ -43,7 +43,7 @@ class GroundControlDB(Database):
         Database (_type_): _description_
     """
 
-    def __init__(self, filename: str | None = None):
+    def __init__(self, filename: str | None = None, persistent: bool = False):
         if not filename:
             filename = DEFAULT_DATABASE_FILE
         loginfo(f"Initializing database file '{filename}'")
@@ -54,7 +54,7 @@ class GroundControlDB(Database):
         logtrace(f"found {len(init_scripts)} sql init scripts: {init_scripts}")
         sql_init_scripts = [str(Path(SQL_INIT_PATH, file)) for file in init_scripts]
         self.session_id = "".join(choice(ascii_uppercase) for i in range(5))
-        super().__init__(filename, sql_init_scripts)
+        super().__init__(filename, sql_init_scripts, persistent=persistent)
         # Save the current session ID for reference
         self.save_setting("current_session_id", self.session_id)
         assert self.get_setting("current_session_id", "NOT FOUND") == self.session_id
@@ -81,37 +81,7 @@ class GroundControlDB(Database):
     def _prep_resp_for_inventory_update(self, sresp: _sresp) -> dict:
         """Format a dictionary with the firewall inventory info
         extracted from a SfosResponse"""
-
-        success = sresp.success
-        resp = getattr(sresp.data, "base_info", {})
-        if success:
-            last_result = "ONLINE"
-        else:
-            match type(sresp.error):
-                case _ex.ConnectionTimeoutError:
-                    last_result = "OFFLINE"
-                case _ex.NameResolutionError:
-                    last_result = "OFFLINE"
-                case _:
-                    last_result = "ERROR"
-        data = {
-            "address": sresp.fw.address.hostname,  # type: ignore
-            "model": resp["Model"] if success else None,
-            "displayVersion": resp["displayVersion"] if success else None,
-            "version": resp["version"] if success else None,
-            "serial_number": resp["serial_number"] if success else None,
-            "companyName": resp["companyName"] if success else None,
-            "username": resp["username"] if success else None,
-            "verify_tls": sresp.fw.address.verify_tls,  # type: ignore
-            "message": "" if success else sresp.text,
-            "last_result": last_result,
-            "consecutive_fails": 0,
-            "reply_ms": sresp.timer if success else None,
-            "updated": datetime.now().isoformat(),
-            "last_seen": datetime.now().isoformat() if success else None,
-            "session_id": self.session_id,
-        }
-        return data
+        return {**inventory_row(sresp), "session_id": self.session_id}
 
     def _prep_resp_for_license_update(self, sresp: _sresp) -> list[dict]:
         """Add a new license record to the database or updte an existing one
@@ -119,19 +89,7 @@ class GroundControlDB(Database):
         Args:
             sresponse (_sresp): _description_
         """
-        if not sresp.success:
-            raise _ex.ResponseContentError("No license data in response")
-
-        fwi = sresp.data
-        assert isinstance(fwi, FirewallInfo)
-        fw_license = fwi.get_license()
-        entitlements = fw_license.__dict__()
-
-        for sub in entitlements:
-            sub["uid"] = sub["serial_number"] + sub["name"]
-            sub["updated"] = datetime.now()
-
-        return entitlements
+        return license_rows(sresp)
 
     def load_sql_from_file(
         self, filename: str, path: str = "sfos/base/db/sql/"
@@ -151,12 +109,14 @@ class GroundControlDB(Database):
         """
         return super().load_sql_from_file(filename=filename, path=path)
 
-    def insert_or_update_fwinfo(self, response: _sresp):
+    def insert_or_update_fwinfo(self, response: _sresp, licenses: bool = True):
         """Attempt to insert an inventory record, and update the inventory if it
 
         Args:
             data (dict): _description_
             success (bool, optional): _description_. Defaults to True.
+            licenses (bool, optional): Also save the license records.
+                                       Defaults to True.
         """
 
         hostname = "NONE"
@@ -171,29 +131,190 @@ class GroundControlDB(Database):
                 response_error=response.error,  # type: ignore
                 status_code=response.status_code,
             )
-        inv_data = self._prep_resp_for_inventory_update(response)
+        inv_data = inventory_row(response)
+        lic_subs_data = []
+        if response.success and licenses:
+            lic_subs_data = license_rows(response)
+        else:
+            logtrace("Skipping license import for ")
+        self.save_refresh_rows(
+            _timings_address(response),
+            inv_data,
+            lic_subs_data,
+            response.timings,
+            success=bool(response.success),
+        )
+
+    def save_refresh_rows(
+        self,
+        address: str | None,
+        inventory: dict,
+        licenses: list[dict],
+        timings: list[RequestTimings],
+        success: bool,
+    ) -> None:
+        """Write the inventory, license and request timing rows of one refreshed
+        firewall in a single transaction
+
+        Args:
+            address (str | None): '{hostname}:{port}' the requests were sent to
+            inventory (dict): Row from inventory_row(), without session_id
+            licenses (list[dict]): Rows from license_rows()
+            timings (list[RequestTimings]): Timings of the requests sent
+            success (bool): False counts a consecutive failure
+        """
+        with self.transaction():
+            self.insert_or_update(
+                insert_into="inventory",
+                data={**inventory, "session_id": self.session_id},
+                on_conflict=["address"],
+                increment=None if success else ["consecutive_fails"],
+            )
+            self.insert_timings(address, timings)
+            if licenses:
+                self.insert_or_update_many(
+                    insert_into="licenses", rows=licenses, on_conflict=["uid"]
+                )
+
+    def update_fw_status(self, response: _sresp) -> None:
+        """Save the result of a heartbeat to the firewall's inventory row"""
+        self.save_status_row(status_row(response), success=bool(response.success))
+
+    def save_status_row(self, status: dict, success: bool) -> None:
+        """Update the status columns of a firewall's inventory row
+
+        Args:
+            status (dict): Row from status_row(), without session_id
+            success (bool): False counts a consecutive failure
+        """
         self.insert_or_update(
             insert_into="inventory",
-            data=inv_data,
+            data={**status, "session_id": self.session_id},
             on_conflict=["address"],
-            increment=None if response.success else ["consecutive_fails"],
+            increment=None if success else ["consecutive_fails"],
         )
-        if response.success:
-            lic_subs_data = self._prep_resp_for_license_update(response)
-            for lic_data in lic_subs_data:
-                try:
-                    self.insert_or_update(
-                        insert_into="licenses", data=lic_data, on_conflict=["uid"]
-                    )
-                except sqlite3.OperationalError as e:
-                    logerror(error=str(e))
-                except sqlite3.ProgrammingError as e:
-                    logerror(error=str(e))
 
-        else:
-            logtrace("Skipping license import for ")
+    def insert_request_timings(self, response: _sresp) -> int:
+        """Store the latency phases of the requests behind a response
+
+        Returns:
+            int: Number of request_timings rows written
+        """
+        return self.insert_timings(_timings_address(response), response.timings)
+
+    def insert_timings(self, address: str | None, timings: list[RequestTimings]) -> int:
+        """Store the latency phases of requests sent to address
+
+        Returns:
+            int: Number of request_timings rows written
+        """
+        rows = [
+            {"session_id": self.session_id, "address": address, **timing.as_row()}
+            for timing in timings
+        ]
+        return self.insert_many("request_timings", rows)
 
-        return
+    def prune_request_timings(self, days: float = TIMINGS_RETENTION_DAYS) -> int:
+        """Delete request timings started more than 'days' ago. 0 keeps them all.
+
+        Returns:
+            int: Number of request_timings rows deleted
+        """
+        if days <= 0:
+            return 0
+        # started holds UTC isoformat times, which sort as text
+        cutoff = (datetime.now(tz=UTC) - timedelta(days=days)).isoformat()
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM request_timings WHERE started < ?;", [cutoff])
+            deleted = cursor.rowcount
+        logtrace(action="prune_request_timings", days=days, deleted=deleted)
+        return deleted
+
+    def refresh_license_summary(self) -> int:
+        """Work out the license summaries in license_summary_stale again. They hold
+        a license that expired over 30 days ago, and no license of the firewall has
+        been written since.
+
+        Returns:
+            int: Number of stale summaries
+        """
+        columns = (
+            "serial_number, next_license_expiring, start_date, expiry_date, "
+            "support_start_date, support_expiry_date"
+        )
+        stale = "SELECT serial_number FROM license_summary_stale"
+        with self.transaction() as cursor:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO license_summary ({columns}) "
+                "SELECT * FROM license_summary_source "
+                f"WHERE serial_number IN ({stale});"
+            )
+            replaced = cursor.rowcount
+            # firewalls without a license that expired less than 30 days ago
+            cursor.execute(
+                f"DELETE FROM license_summary WHERE serial_number IN ({stale});"
+            )
+            deleted = cursor.rowcount
+        logtrace(action="refresh_license_summary", replaced=replaced, deleted=deleted)
+        return replaced + deleted
+
+    def maintenance(self) -> None:
+        """Housekeeping run before every refresh, and periodically by the daemon.
+        Deletes request timings older than GC_TIMINGS_RETENTION_DAYS, and works out
+        stale license summaries again.
+        """
+        self.prune_request_timings()
+        self.refresh_license_summary()
+
+    def get_reply_history(self, samples: int) -> dict[str, list[tuple]]:
+        """Get the latest answered requests sent to each firewall
+
+        Args:
+            samples (int): Maximum number of requests per firewall
+
+        Returns:
+            dict[str, list[tuple]]: (reused, handshake_ms, request_ms) of each
+                                    request, keyed by '{hostname}:{port}'
+        """
+        sql = (
+            "SELECT address, reused, "
+            "COALESCE(dns_ms, 0) + COALESCE(connect_ms, 0) + COALESCE(tls_ms, 0), "
+            "request_ms FROM ("
+            "SELECT *, ROW_NUMBER() OVER (PARTITION BY address ORDER BY id DESC) AS n "
+            "FROM request_timings WHERE status_code IS NOT NULL"
+            ") WHERE n <= ?;"
+        )
+        result: dict[str, list[tuple]] = {}
+        for address, *row in self.execute(sql, params=[samples])[0]:
+            result.setdefault(address, []).append(tuple(row))
+        return result
+
+    def get_failing_devices(self, threshold: int) -> dict[str, tuple[int, str]]:
+        """Get firewalls that failed at least 'threshold' refreshes in a row
+
+        Returns:
+            dict[str, tuple[int, str]]: (consecutive_fails, updated), keyed by
+                                        inventory address
+        """
+        # read as text: the agent stores isoformat times the sqlite3 timestamp
+        # converter can not parse
+        sql = (
+            "SELECT address, consecutive_fails, CAST(updated AS TEXT) FROM inventory "
+            "WHERE consecutive_fails >= ?;"
+        )
+        rows = self.execute(sql, params=[threshold])[0]
+        return {address: (fails, updated) for address, fails, updated in rows}
+
+    def get_refresh_state(self) -> dict[str, tuple[str | None, str, int | None]]:
+        """Get the last refresh of every firewall in the inventory
+
+        Returns:
+            dict[str, tuple[str | None, str, int | None]]: (updated, last_result,
+                days to or since the nearest license expiry), keyed by address
+        """
+        sql = self.load_sql_from_file("refresh_state.sql")
+        rows = self.execute(sql)[0]
+        return {address: tuple(row) for address, *row in rows}
 
     def get_inventory_status_query(self):
         """Called by command.py after refresh completes
@@ -205,3 +326,72 @@ class GroundControlDB(Database):
         sql = self.load_sql_from_file("inventory_insert_or_replace.sql")
         return self.select(raw_sql=sql)
         # return self.select(from_table="inventory_view")
+
+
+def inventory_row(sresp: _sresp) -> dict:
+    """Inventory columns of a refresh response, except session_id"""
+    success = sresp.success
+    resp = getattr(sresp.data, "base_info", {})
+    return {
+        "address": sresp.fw.address.hostname,  # type: ignore
+        "model": resp["Model"] if success else None,
+        "displayVersion": resp["displayVersion"] if success else None,
+        "version": resp["version"] if success else None,
+        "serial_number": resp["serial_number"] if success else None,
+        "companyName": resp["companyName"] if success else None,
+        "username": resp["username"] if success else None,
+        "verify_tls": sresp.fw.address.verify_tls,  # type: ignore
+        "message": "" if success else sresp.text,
+        "last_result": _last_result(sresp),
+        "consecutive_fails": 0,
+        "reply_ms": sresp.timer if success else None,
+        "updated": datetime.now().isoformat(),
+        "last_seen": datetime.now().isoformat() if success else None,
+    }
+
+
+def status_row(sresp: _sresp) -> dict:
+    """Inventory status columns of a heartbeat response, except session_id.
+    updated is left alone: it is the time of the last refresh."""
+    row = {
+        "address": sresp.fw.address.hostname,  # type: ignore
+        "message": "" if sresp.success else sresp.text,
+        "last_result": _last_result(sresp),
+        "consecutive_fails": 0,
+    }
+    if sresp.success:
+        row["last_seen"] = datetime.now().isoformat()
+    return row
+
+
+def license_rows(sresp: _sresp) -> list[dict]:
+    """License rows of a successful refresh response"""
+    if not sresp.success:
+        raise _ex.ResponseContentError("No license data in response")
+
+    fwi = sresp.data
+    assert isinstance(fwi, FirewallInfo)
+    fw_license = fwi.get_license()
+    entitlements = fw_license.__dict__()
+
+    for sub in entitlements:
+        sub["uid"] = sub["serial_number"] + sub["name"]
+        sub["updated"] = datetime.now()
+
+    return entitlements
+
+
+def _last_result(sresp: _sresp) -> str:
+    if sresp.success:
+        return "ONLINE"
+    match type(sresp.error):
+        case _ex.ConnectionTimeoutError:
+            return "OFFLINE"
+        case _ex.NameResolutionError:
+            return "OFFLINE"
+        case _:
+            return "ERROR"
+
+
+def _timings_address(response: _sresp) -> str | None:
+    return getattr(getattr(response.fw, "address", None), "address", None)
@@ -0,0 +1,221 @@
+-- base/db/init/##_init_license_summary.sql
+-- Next license to expire and support license of every firewall, kept up to date by
+-- triggers so that dashboards join one row per firewall instead of searching
+-- license_view for each of them.
+-- /*
+CREATE INDEX IF NOT EXISTS licenses_serial_number ON licenses (serial_number);
+
+CREATE TABLE
+    IF NOT EXISTS license_summary (
+        serial_number TEXT PRIMARY KEY,
+        next_license_expiring TEXT,
+        start_date TEXT,
+        expiry_date TEXT,
+        support_start_date TEXT,
+        support_expiry_date TEXT,
+        updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+-- */
+-- /*
+-- Licenses expired more than 30 days ago are left out, like the dashboards always
+-- did. Of the rest, MIN(expiry_date) picks the row of the first license to expire.
+-- Filtered on serial_number, only the licenses of that firewall are read.
+DROP VIEW IF EXISTS license_summary_source;
+
+CREATE VIEW
+    IF NOT EXISTS license_summary_source AS
+SELECT
+    serial_number,
+    next_license_expiring,
+    start_date,
+    expiry_date,
+    (
+        SELECT
+            s.start_date
+        FROM
+            licenses s
+        WHERE
+            s.serial_number = next.serial_number
+            AND s.type IS NOT 'null'
+            AND s.name LIKE '%support%'
+            AND julianday (s.expiry_date) - julianday (current_timestamp) > -30
+        ORDER BY
+            s.expiry_date ASC
+        LIMIT
+            1
+    ) AS support_start_date,
+    (
+        SELECT
+            MIN(s.expiry_date)
+        FROM
+            licenses s
+        WHERE
+            s.serial_number = next.serial_number
+            AND s.type IS NOT 'null'
+            AND s.name LIKE '%support%'
+            AND julianday (s.expiry_date) - julianday (current_timestamp) > -30
+    ) AS support_expiry_date
+FROM
+    (
+        SELECT
+            serial_number,
+            IIF (
+                bundle IN ('Base Firewall', 'a-la-carte'),
+                name,
+                bundle
+            ) AS next_license_expiring,
+            start_date,
+            MIN(expiry_date) AS expiry_date
+        FROM
+            licenses
+        WHERE
+            type IS NOT 'null'
+            AND serial_number IS NOT ''
+            AND julianday (expiry_date) - julianday (current_timestamp) > -30
+        GROUP BY
+            serial_number
+    ) AS next;
+
+-- */
+-- /*
+-- Summaries holding a license that expired over 30 days ago. The triggers only
+-- run when licenses are written, so firewalls no longer refreshed leave these.
+DROP VIEW IF EXISTS license_summary_stale;
+
+CREATE VIEW
+    IF NOT EXISTS license_summary_stale AS
+SELECT
+    serial_number
+FROM
+    license_summary
+WHERE
+    julianday (expiry_date) - julianday (current_timestamp) <= -30
+    OR julianday (support_expiry_date) - julianday (current_timestamp) <= -30;
+
+-- */
+-- /*
+-- Fill in firewalls whose licenses were saved before license_summary existed
+INSERT
+OR IGNORE INTO license_summary (
+    serial_number,
+    next_license_expiring,
+    start_date,
+    expiry_date,
+    support_start_date,
+    support_expiry_date
+)
+SELECT
+    *
+FROM
+    license_summary_source
+WHERE
+    serial_number NOT IN (
+        SELECT
+            serial_number
+        FROM
+            license_summary
+    );
+
+-- */
+-- /*
+DROP TRIGGER IF EXISTS license_summary_insert;
+
+CREATE TRIGGER IF NOT EXISTS license_summary_insert AFTER INSERT ON licenses FOR EACH ROW BEGIN
+DELETE FROM license_summary
+WHERE
+    serial_number = NEW.serial_number;
+
+INSERT INTO
+    license_summary (
+        serial_number,
+        next_license_expiring,
+        start_date,
+        expiry_date,
+        support_start_date,
+        support_expiry_date
+    )
+SELECT
+    *
+FROM
+    license_summary_source
+WHERE
+    serial_number = NEW.serial_number;
+
+END;
+
+-- */
+-- /*
+-- Refreshes write every license again. Only changed licenses, or summaries with a
+-- license that has since expired over 30 days ago, need to be worked out again.
+DROP TRIGGER IF EXISTS license_summary_update;
+
+CREATE TRIGGER IF NOT EXISTS license_summary_update AFTER
+UPDATE ON licenses FOR EACH ROW WHEN OLD.serial_number IS NOT NEW.serial_number
+OR OLD.name IS NOT NEW.name
+OR OLD.bundle IS NOT NEW.bundle
+OR OLD.type IS NOT NEW.type
+OR OLD.start_date IS NOT NEW.start_date
+OR OLD.expiry_date IS NOT NEW.expiry_date
+OR EXISTS (
+    SELECT
+        1
+    FROM
+        license_summary
+    WHERE
+        serial_number = NEW.serial_number
+        AND (
+            julianday (expiry_date) - julianday (current_timestamp) <= -30
+            OR julianday (support_expiry_date) - julianday (current_timestamp) <= -30
+        )
+) BEGIN
+DELETE FROM license_summary
+WHERE
+    serial_number IN (OLD.serial_number, NEW.serial_number);
+
+INSERT INTO
+    license_summary (
+        serial_number,
+        next_license_expiring,
+        start_date,
+        expiry_date,
+        support_start_date,
+        support_expiry_date
+    )
+SELECT
+    *
+FROM
+    license_summary_source
+WHERE
+    serial_number IN (OLD.serial_number, NEW.serial_number);
+
+END;
+
+-- */
+-- /*
+DROP TRIGGER IF EXISTS license_summary_delete;
+
+CREATE TRIGGER IF NOT EXISTS license_summary_delete AFTER DELETE ON licenses FOR EACH ROW BEGIN
+DELETE FROM license_summary
+WHERE
+    serial_number = OLD.serial_number;
+
+INSERT INTO
+    license_summary (
+        serial_number,
+        next_license_expiring,
+        start_date,
+        expiry_date,
+        support_start_date,
+        support_expiry_date
+    )
+SELECT
+    *
+FROM
+    license_summary_source
+WHERE
+    serial_number = OLD.serial_number;
+
+END;
+
+-- */
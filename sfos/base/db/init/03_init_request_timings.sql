@@ -0,0 +1,23 @@
+-- base/db/init/##_init_request_timings.sql
+-- Create table of per-request latency phases, in milliseconds
+CREATE TABLE
+    IF NOT EXISTS request_timings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT DEFAULT NULL,
+        address TEXT,
+        url TEXT,
+        started TIMESTAMP,
+        status_code INTEGER DEFAULT NULL,
+        reused INTEGER DEFAULT 0,
+        dns_ms REAL DEFAULT NULL,
+        connect_ms REAL DEFAULT NULL,
+        tls_ms REAL DEFAULT NULL,
+        request_ms REAL DEFAULT NULL,
+        parse_ms REAL DEFAULT NULL,
+        total_ms REAL DEFAULT NULL
+    );
+
+CREATE INDEX IF NOT EXISTS request_timings_address_started ON request_timings (address, started);
+
+-- request timings are pruned by age
+CREATE INDEX IF NOT EXISTS request_timings_started ON request_timings (started);
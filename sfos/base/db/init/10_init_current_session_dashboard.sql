@@ -5,7 +5,7 @@ DROP VIEW IF EXISTS current_Session_dashboard;
 CREATE VIEW
     IF NOT EXISTS current_Session_dashboard AS
 SELECT
-    serial_number,
+    i.serial_number,
     status,
     address,
     model,
@@ -15,65 +15,13 @@ SELECT
     last_online,
     days_ago,
     fails,
-    (
-        SELECT
-            IIF (
-                l.bundle IN ('Base Firewall', 'a-la-carte'),
-                l.name,
-                l.bundle
-            )
-        FROM
-            license_view l
-        WHERE
-            l.serial_number = i.serial_number
-            AND l.remaining_days > -30
-        ORDER BY
-            l.remaining_days ASC
-        LIMIT
-            1
-    ) AS 'next_license_expiring',
-    (
-        SELECT
-            l.expiry_date
-        FROM
-            license_view l
-        WHERE
-            l.serial_number = i.serial_number
-            AND l.remaining_days > -30
-        ORDER BY
-            l.remaining_days ASC
-        LIMIT
-            1
-    ) AS 'expiry_date',
-    (
-        SELECT
-            l.status_description
-        FROM
-            license_view l
-        WHERE
-            l.serial_number = i.serial_number
-            AND l.remaining_days > -30
-        ORDER BY
-            l.remaining_days ASC
-        LIMIT
-            1
-    ) AS 'license_status',
-    (
-        SELECT
-            l.status
-        FROM
-            license_view l
-        WHERE
-            l.serial_number = i.serial_number
-            AND l.name LIKE '%support%'
-            AND l.remaining_days > -30
-        ORDER BY
-            l.remaining_days ASC
-        LIMIT
-            1
-    ) AS 'support'
+    s.next_license_expiring AS 'next_license_expiring',
+    s.expiry_date AS 'expiry_date',
+    s.license_status AS 'license_status',
+    s.support AS 'support'
 FROM
-    current_session_view i;
+    current_session_view i
+    LEFT JOIN license_summary_view s ON s.serial_number = i.serial_number;
 
 
 -- */
\ No newline at end of file
@@ -0,0 +1,71 @@
+-- base/db/init/##_init_license_summary_view.sql
+-- license_summary with the status of its licenses as of now, worded like
+-- license_view. Summaries holding a license that expired over 30 days ago are left
+-- out until GroundControlDB.refresh_license_summary() works them out again.
+-- /*
+DROP VIEW IF EXISTS license_summary_view;
+
+CREATE VIEW
+    IF NOT EXISTS license_summary_view AS
+SELECT
+    serial_number,
+    next_license_expiring,
+    strftime ('%Y-%m-%d', expiry_date) AS expiry_date,
+    IIF (
+        active_days < 0,
+        'Not valid for ' || - active_days || ' days',
+        IIF (
+            remaining_days >= 0,
+            IIF (
+                remaining_days > 90,
+                'Active',
+                'Expiring in ' || remaining_days || ' days'
+            ),
+            'Expired ' || - remaining_days || ' days ago'
+        )
+    ) AS license_status,
+    IIF (
+        support_expiry_date IS NULL,
+        NULL,
+        IIF (
+            support_active_days < 0,
+            'FUTURE',
+            IIF (support_remaining_days >= 0, 'ACTIVE', 'EXPIRED')
+        )
+    ) AS support
+FROM
+    (
+        SELECT
+            serial_number,
+            next_license_expiring,
+            expiry_date,
+            CAST(
+                min(
+                    julianday (current_timestamp),
+                    julianday (expiry_date)
+                ) - julianday (start_date) AS int
+            ) AS active_days,
+            CAST(
+                julianday (expiry_date) - julianday (current_timestamp) AS int
+            ) AS remaining_days,
+            support_expiry_date,
+            CAST(
+                min(
+                    julianday (current_timestamp),
+                    julianday (support_expiry_date)
+                ) - julianday (support_start_date) AS int
+            ) AS support_active_days,
+            CAST(
+                julianday (support_expiry_date) - julianday (current_timestamp) AS int
+            ) AS support_remaining_days
+        FROM
+            license_summary
+        WHERE
+            julianday (expiry_date) - julianday (current_timestamp) > -30
+            AND (
+                support_expiry_date IS NULL
+                OR julianday (support_expiry_date) - julianday (current_timestamp) > -30
+            )
+    );
+
+-- */
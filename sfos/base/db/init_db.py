@@ -16,11 +16,13 @@ from sfos.logging.logging import db_log as log, Level, db_logtrace as logtrace
 SQL_INIT_PATH = "./sfos/base/db/init"
 
 
-def init_db(filename: str | None = None) -> _db:
+def init_db(filename: str | None = None, persistent: bool = False) -> _db:
     """Ensure the database file exists, and that it is properly initialized
 
     Args:
         filename (str | None, optional): _description_. Defaults to None.
+        persistent (bool, optional): Keep one connection open in WAL mode.
+                                     Defaults to False.
 
     Returns:
         _db: database instance
@@ -30,9 +32,9 @@ def init_db(filename: str | None = None) -> _db:
     logtrace(action="init_db")
     instance.db = None
     if filename:
-        instance.db = _db(filename)
+        instance.db = _db(filename, persistent=persistent)
     else:
-        instance.db = _db()
+        instance.db = _db(persistent=persistent)
         log(
             Level.INFO,
             f"Initialized db file='{instance.db.filename}' session='{instance.db.session_id}'",
@@ -0,0 +1,18 @@
+-- base/db/sql/refresh_state.sql
+-- Last refresh of every firewall, and how close its nearest license expiry is
+SELECT
+    inventory.address,
+    CAST(inventory.updated AS TEXT) AS updated,
+    inventory.last_result,
+    expiry.days AS license_days
+FROM
+    inventory
+    LEFT JOIN (
+        SELECT
+            serial_number,
+            MIN(ABS(remaining_days)) AS days
+        FROM
+            license_view
+        GROUP BY
+            serial_number
+    ) AS expiry ON expiry.serial_number = inventory.serial_number;
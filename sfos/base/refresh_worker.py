@@ -0,0 +1,224 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+Refresh firewalls from a pool of worker processes.
+
+Worker processes are started with 'spawn' on every platform, and only import this
+module and its dependencies: importing sfos.agent would open the agent database.
+Firewalls are sent to the workers as plain tuples, and each worker logs in and parses
+index.jsp on its own threads. Only the database rows come back, so the parent
+process stays the single SQLite writer.
+"""
+
+# pylint: disable=broad-exception-caught
+from __future__ import annotations
+
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Iterator, NamedTuple
+
+from sfos.base.db.ground_control_db import inventory_row, license_rows
+from sfos.logging.logging import (
+    Level,
+    bind_log_context,
+    init_logging,
+    logerror,
+    logstate,
+)
+from sfos.objects.request_timings import RequestTimings
+from sfos.static import constants as _c, exceptions as _ex
+from sfos.webadmin.connector import Connector as _conn, SfosResponse as _sresp
+
+# firewalls per task sent to a worker, as a multiple of its threads
+CHUNK_FACTOR = 4
+
+# (index, hostname, port, verify_tls, timeout, adaptive_timeout, credentials,
+#  resume_session)
+ShardEntry = tuple
+
+
+class RefreshRecord(NamedTuple):
+    """Result of refreshing one firewall in a worker process"""
+
+    index: int
+    success: bool
+    error: Exception | None
+    timer: int | None
+    retries: int
+    inventory: dict
+    licenses: list[dict]
+    timings: list[RequestTimings]
+    # (cookies, csrf_token) of the webadmin session, to be cached by the parent
+    session: tuple[dict, str] | None
+
+
+# state of a worker process, set by _init_worker
+_pool: ThreadPoolExecutor | None = None
+_session_id: str | None = None
+
+
+def shard_entry(index: int, fw: _conn) -> ShardEntry:
+    """Everything a worker process needs to rebuild a Connector"""
+    address = fw.address
+    resume = None
+    if fw.session_cache is not None and fw.credentials and address:
+        resume = fw.session_cache.get(fw.target())
+    return (
+        index,
+        address.hostname,  # type: ignore
+        address.port,  # type: ignore
+        address.verify_tls,  # type: ignore
+        address.timeout,  # type: ignore
+        address.adaptive_timeout,  # type: ignore
+        fw.credentials,
+        resume,
+    )
+
+
+def refresh_sharded(
+    firewalls: list[_conn],
+    workers: int,
+    concurrency: int = 1,
+    session_id: str | None = None,
+) -> Iterator[tuple[_conn, RefreshRecord]]:
+    """Refresh firewalls on 'workers' processes of 'concurrency' threads each
+
+    Firewalls are sent in chunks, in order, to whichever worker is free. Records are
+    yielded as each chunk completes. Firewalls of a chunk lost with its worker are
+    yielded as failed.
+
+    Args:
+        firewalls (list[_conn]): Firewalls to refresh
+        workers (int): Number of worker processes
+        concurrency (int, optional): Threads per worker process. Defaults to 1.
+        session_id (str | None, optional): Added to the worker log entries.
+
+    Yields:
+        Iterator[tuple[_conn, RefreshRecord]]: Each firewall with its result
+    """
+    if not firewalls:
+        return
+    size = min(concurrency * CHUNK_FACTOR, math.ceil(len(firewalls) / workers))
+    entries = [shard_entry(index, fw) for index, fw in enumerate(firewalls)]
+    chunks = [entries[i : i + size] for i in range(0, len(entries), size)]
+    context = multiprocessing.get_context("spawn")
+    initargs = (
+        context.Value("i", 0),
+        os.path.abspath(logstate.PATH),
+        logstate.log_level,
+        concurrency,
+        session_id,
+    )
+    with ProcessPoolExecutor(
+        workers, mp_context=context, initializer=_init_worker, initargs=initargs
+    ) as pool:
+        futures = {pool.submit(refresh_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                records = future.result()
+            except Exception as e:
+                logerror(e)
+                error = _ex.AgentError(f"refresh worker failed: {e}")
+                records = [
+                    _record(entry[0], _conn_from_entry(entry), None, error)
+                    for entry in futures[future]
+                ]
+            for record in records:
+                yield firewalls[record.index], record
+
+
+def refresh_chunk(entries: list[ShardEntry]) -> list[RefreshRecord]:
+    """Refresh a chunk of firewalls on the threads of this worker process"""
+    assert _pool is not None, "refresh_chunk only runs in a refresh worker"
+    return list(_pool.map(_refresh_entry, entries))
+
+
+def _init_worker(
+    counter, log_path: str, level: Level, concurrency: int, session_id: str | None
+) -> None:
+    global _pool, _session_id
+    with counter.get_lock():
+        counter.value += 1
+        number = counter.value
+    # a log folder per worker: rotating file handlers can not share files
+    logstate.PATH = os.path.join(log_path, f"worker-{number}")
+    init_logging(level if level != Level.NONE else Level.INFO)
+    _session_id = session_id
+    _pool = ThreadPoolExecutor(max(1, concurrency), thread_name_prefix="refresh")
+
+
+def _conn_from_entry(entry: ShardEntry) -> _conn:
+    (_, hostname, port, verify_tls, timeout, adaptive, credentials, resume) = entry
+    fw = _conn(
+        hostname=hostname,
+        port=port,
+        verify_tls=verify_tls,
+        timeout=timeout,
+        credentials=credentials,
+        resume_session=resume,
+    )
+    fw.address.adaptive_timeout = adaptive  # type: ignore
+    return fw
+
+
+def _refresh_entry(entry: ShardEntry) -> RefreshRecord:
+    fw = _conn_from_entry(entry)
+    address = fw.address
+    with bind_log_context(
+        session_id=_session_id,
+        host=address.hostname,  # type: ignore
+        port=address.port,  # type: ignore
+    ):
+        try:
+            return _record(entry[0], fw, fw.get_info())
+        except Exception as e:
+            logerror(e)
+            return _record(entry[0], fw, None, _ex.AgentError(str(e)))
+
+
+def _record(
+    index: int, fw: _conn, sresp: _sresp | None, error: Exception | None = None
+) -> RefreshRecord:
+    licenses: list[dict] = []
+    if sresp is not None and sresp.success:
+        try:
+            licenses = license_rows(sresp)
+        except Exception as e:
+            logerror(e)
+            sresp = _sresp(
+                fw=fw,
+                error=_ex.ResponseContentError(str(e)),
+                timer=sresp.timer,
+                timings=sresp.timings,
+                retries=sresp.retries,
+                trace="wrk-02",
+            )
+    if sresp is None:
+        sresp = _sresp(fw=fw, error=error, trace="wrk-01")
+    session = None
+    if sresp.success and fw.csrf_token and _c.JSESSIONID in fw.cookies:
+        session = (dict(fw.cookies), fw.csrf_token)
+    error = sresp.error
+    if error is not None and not isinstance(error, _ex.AgentError):
+        # only errors of this application are known to pickle
+        error = _ex.AgentError(str(error))
+    return RefreshRecord(
+        index,
+        bool(sresp.success),
+        error,
+        sresp.timer,
+        sresp.retries,
+        inventory_row(sresp),
+        licenses,
+        sresp.timings,
+        session,
+    )
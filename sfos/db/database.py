@@ -11,13 +11,15 @@ License.
 
 # pylint: disable=broad-exception-caught
 
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
 import os
 from pathlib import Path
 import sqlite3
 
 from sqlite3 import Connection, Cursor
-from typing import Any
+from typing import Any, Iterator
 
 from sfos.db.query import Select
 from sfos.db.data_formatting import qs, rs
@@ -37,12 +39,25 @@ class DBError(Exception):
 
 
 class Database:
-    """Lightweight wrapper for working with sqlite database"""
+    """Lightweight wrapper for working with sqlite database
 
-    def __init__(self, filename: str | None = None, init_sql: str | list | None = None):
+    By default every call opens the database file, commits and closes it again.
+    With persistent=True a single connection is kept open in WAL journal mode and
+    each statement is committed without closing it. Use transaction() to group many
+    statements into one commit in either mode.
+    """
+
+    def __init__(
+        self,
+        filename: str | None = None,
+        init_sql: str | list | None = None,
+        persistent: bool = False,
+    ):
         self.filename = filename
         self.connection: Connection | None = None
         self.cursor: Cursor | None = None
+        self.persistent = persistent
+        self._tx_depth = 0
         logdebug(
             f"Database __init__('{filename}') {f'with {len(init_sql)} init scripts' if isinstance(init_sql, list) else ''}"
         )
@@ -71,16 +86,60 @@ class Database:
             if self.connection:
                 return self.connection
             if self.filename:
-                self.connection = sqlite3.connect(
-                    database=self.filename,
-                    detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
-                )
+                self.connection = self._connect()
                 self.cursor = self.cursor or self.connection.cursor()
                 return self.connection
             raise _ex.DatabaseError("Failed to get database connection")
         except Exception as e:
             raise _ex.DatabaseError("Failed to get database connection") from e
 
+    def _connect(self) -> Connection:
+        connection = sqlite3.connect(
+            database=self.filename,  # type: ignore
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        )
+        if self.persistent:
+            # WAL lets readers continue while a refresh batch is being written,
+            # and NORMAL sync is safe in WAL mode while avoiding an fsync per commit
+            connection.execute("PRAGMA journal_mode=WAL;")
+            connection.execute("PRAGMA synchronous=NORMAL;")
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[Cursor]:
+        """Run all statements inside the block as a single transaction
+
+        The transaction is committed when the outermost block exits, or rolled
+        back if it exits with an exception. Nested blocks join the outer one.
+
+        Yields:
+            Cursor: Database cursor
+        """
+        cursor = self.get_cursor()
+        self._tx_depth += 1
+        try:
+            yield cursor
+        except BaseException:
+            self._tx_depth -= 1
+            if self._tx_depth == 0 and self.connection:
+                self.connection.rollback()
+                self._release(commit=False)
+            raise
+        self._tx_depth -= 1
+        if self._tx_depth == 0:
+            self._release()
+
+    def _release(self, commit: bool = True) -> None:
+        """Finish with the connection after a statement: keep it open inside a
+        transaction, commit it in persistent mode, or else commit and close it"""
+        if self._tx_depth:
+            return
+        if self.persistent:
+            if self.connection and commit:
+                self.connection.commit()
+            return
+        self.close_connection(commit)
+
     def get_cursor(self) -> Cursor:
         """Returns an active Cursor to the current database
 
@@ -121,10 +180,7 @@ class Database:
                 self.cursor = self.cursor or self.connection.cursor()
                 return self.connection, self.cursor
             if self.filename:
-                self.connection = sqlite3.connect(
-                    database=self.filename,
-                    detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
-                )
+                self.connection = self._connect()
                 self.cursor = self.cursor or self.connection.cursor()
                 return self.connection, self.cursor
             raise _ex.DatabaseError("No database specified")
@@ -205,7 +261,8 @@ class Database:
     def list_sql_files(self, path: str, ext: str = ".sql"):
         if not os.path.exists(path):
             raise _ex.PathNotFound(f"Path '{path}' not found")
-        sql_files = [file for file in os.listdir(path) if file.endswith(ext)]
+        # sorted: init scripts run in the order of their number prefix
+        sql_files = sorted(file for file in os.listdir(path) if file.endswith(ext))
         return sql_files
 
     def load_sql_from_file(self, filename: str, path: str) -> str | None:
@@ -263,7 +320,7 @@ class Database:
         result = cursor.fetchall()
 
         if close:
-            self.close_connection()
+            self._release()
         return [item for (item,) in result]
 
     def list_views(self, close: bool = True) -> list:
@@ -282,7 +339,7 @@ class Database:
         result = cursor.fetchall()
 
         if close:
-            self.close_connection()
+            self._release()
         return [item for (item,) in result]
 
     def list_table_cols(self, table_name: str, close: bool = True) -> list:
@@ -297,7 +354,7 @@ class Database:
         """
         result = self.execute(f"PRAGMA table_info({table_name});")
         if close:
-            self.close_connection()
+            self._release()
         return [cols[1] for cols in result]
 
     def list_table_col_defs(self, table_name: str, close: bool = True) -> list:
@@ -312,7 +369,7 @@ class Database:
         """
         result = self.execute(f"PRAGMA table_info({table_name});")
         if close:
-            self.close_connection()
+            self._release()
         return result
 
     def insert_into(
@@ -365,7 +422,7 @@ class Database:
             cursor.execute(sql, values)
             result = cursor.rowcount
             if close:
-                self.close_connection()
+                self._release()
             return result
         except Exception as e:
             raise e
@@ -400,14 +457,14 @@ class Database:
         self,
         statements: str | list[str],
         close: bool = True,
-        params: list | None = None,
+        params: list | dict | None = None,
     ) -> list[Any]:
         results = []
         if isinstance(statements, str):
             statements = [statements]
 
         for statement in statements:
-            if Path(statement).is_file():
+            if _is_sql_file(statement):
                 loginfo(f"Executing SQL Script '{statement}'")
                 statement = self.load_sql_from_file(statement)
             results.append(self._execute(statement, close, params))
@@ -418,7 +475,7 @@ class Database:
         self,
         statement: str,
         close: bool = True,
-        params: list | None = None,
+        params: list | dict | None = None,
     ) -> list[Any]:
         """_summary_
 
@@ -462,7 +519,7 @@ class Database:
                 results = []
 
             if close:
-                self.close_connection()
+                self._release()
 
             return results
         except sqlite3.OperationalError as e:
@@ -476,50 +533,86 @@ class Database:
         increment: list[str] | None = None,
     ) -> bool:
         """Insert new records or update columns on existing records if colflict found"""
-        # Remove columns listed in increment so they aren't duplicated
-        if increment:
-            for col in increment:
-                data.pop(col, None)
-            for col in increment:
-                data[col] = 0
-        else:
-            increment = []
+        data = _prep_upsert_row(data, increment)
+        sql = _build_upsert_sql(
+            insert_into, tuple(data.keys()), tuple(on_conflict), tuple(increment or [])
+        )
 
-        cols = list(f"'{name}'" if " " in name else name for name in data.keys())
-        column_names = ", ".join(cols)
-        key_names = ", ".join([qs(name) for name in on_conflict])
-        param_strs = ", ".join([f":{rs(name)}" for name in data.keys()])
-        tmp_param_values = list(data.values())
+        try:
+            self.execute(sql, params=_upsert_params(data))  # type: ignore
+            return True
+        except sqlite3.ProgrammingError as e:
+            logerror(
+                "Error with statement. Has the database structure changed?",
+                msg=str(e),
+            )
 
-        # Handle value formatting
-        param_values = []
-        for val in tmp_param_values:
-            if val is None:
-                param_values.append("NULL")
-            elif isinstance(val, datetime):
-                param_values.append(val.isoformat())
-            else:
-                param_values.append(val)
-
-        updates = []
-        for col in cols:
-            updates.append(
-                f"{col} = {insert_into}.{col} + 1"
-                if col in increment
-                else f"{col} = CASE WHEN excluded.{col} != {insert_into}.{col} "
-                f"AND excluded.{col} IS NOT NULL "
-                f"THEN excluded.{col} ELSE {insert_into}.{col} END"
+        except sqlite3.OperationalError as e:
+            logerror(
+                "Error with statement. Has a table or query been renemaed?",
+                msg=str(e),
             )
+
+        return False
+
+    def insert_many(self, table_name: str, rows: list[dict]) -> int:
+        """Insert rows with executemany in a single transaction
+
+        Args:
+            table_name (str): Table name
+            rows (list[dict]): One dict of column values per record. Every row is
+                               written with the columns of the first row.
+
+        Returns:
+            int: Number of rows written
+        """
+        if not rows:
+            return 0
+        columns = tuple(rows[0].keys())
         sql = (
-            f"INSERT INTO {insert_into} (\n     {column_names})\n"
-            f"VALUES (\n     {param_strs})\n"
-            f"ON CONFLICT ({key_names}) DO UPDATE SET\n"
-            f"{',\n'.join(updates)};"
+            f"INSERT INTO {table_name} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
         )
+        with self.transaction() as cursor:
+            logtrace(method="executemany", sql=sql, rows=len(rows))
+            cursor.executemany(sql, [[row.get(col) for col in columns] for row in rows])
+        return len(rows)
+
+    def insert_or_update_many(
+        self,
+        insert_into: str,
+        rows: list[dict],
+        on_conflict: list[str],
+        increment: list[str] | None = None,
+    ) -> int:
+        """Bulk variant of insert_or_update. The statement is built once for each
+        distinct column set, and all rows are written with executemany in a single
+        transaction.
+
+        Args:
+            insert_into (str): Table name
+            rows (list[dict]): One dict of column values per record
+            on_conflict (list[str]): Unique columns identifying an existing record
+            increment (list[str] | None, optional): Columns incremented on update.
+                                                    Defaults to None.
+
+        Returns:
+            int: Number of rows written, or 0 if the batch failed
+        """
+        batches: dict[tuple, list[dict]] = {}
+        for row in rows:
+            row = _prep_upsert_row(row, increment)
+            batches.setdefault(tuple(row.keys()), []).append(_upsert_params(row))
 
         try:
-            self.execute(sql, params=param_values)
-            return True
+            with self.transaction() as cursor:
+                for columns, params in batches.items():
+                    sql = _build_upsert_sql(
+                        insert_into, columns, tuple(on_conflict), tuple(increment or [])
+                    )
+                    logtrace(method="executemany", sql=sql, rows=len(params))
+                    cursor.executemany(sql, params)
+            return sum(len(params) for params in batches.values())
         except sqlite3.ProgrammingError as e:
             logerror(
                 "Error with statement. Has the database structure changed?",
@@ -532,4 +625,71 @@ class Database:
                 msg=str(e),
             )
 
+        except sqlite3.IntegrityError as e:
+            logerror(e)
+
+        return 0
+
+
+def _prep_upsert_row(data: dict, increment: list[str] | None = None) -> dict:
+    """Copy of data with increment columns reset to 0 and moved to the end"""
+    data = dict(data)
+    for col in increment or []:
+        data.pop(col, None)
+    for col in increment or []:
+        data[col] = 0
+    return data
+
+
+def _upsert_params(data: dict) -> dict:
+    """Named parameters for a statement from _build_upsert_sql"""
+    params = {}
+    for name, val in data.items():
+        # Handle value formatting
+        if val is None:
+            val = "NULL"
+        elif isinstance(val, datetime):
+            val = val.isoformat()
+        params[rs(name)] = val
+    return params
+
+
+@lru_cache(maxsize=64)
+def _build_upsert_sql(
+    insert_into: str,
+    columns: tuple[str, ...],
+    on_conflict: tuple[str, ...],
+    increment: tuple[str, ...] = (),
+) -> str:
+    """Build an INSERT ... ON CONFLICT DO UPDATE statement for a column set"""
+    cols = list(f"'{name}'" if " " in name else name for name in columns)
+    column_names = ", ".join(cols)
+    key_names = ", ".join([qs(name) for name in on_conflict])
+    param_strs = ", ".join([f":{rs(name)}" for name in columns])
+
+    updates = []
+    for col in cols:
+        updates.append(
+            f"{col} = {insert_into}.{col} + 1"
+            if col in increment
+            else f"{col} = CASE WHEN excluded.{col} != {insert_into}.{col} "
+            f"AND excluded.{col} IS NOT NULL "
+            f"THEN excluded.{col} ELSE {insert_into}.{col} END"
+        )
+    return (
+        f"INSERT INTO {insert_into} (\n     {column_names})\n"
+        f"VALUES (\n     {param_strs})\n"
+        f"ON CONFLICT ({key_names}) DO UPDATE SET\n"
+        f"{',\n'.join(updates)};"
+    )
+
+
+def _is_sql_file(statement: str) -> bool:
+    """True if statement is the path of an existing sql file rather than sql text"""
+    if "\n" in statement or len(statement) > 255:
+        # sql text - long statements raise OSError from Path.is_file() on posix
+        return False
+    try:
+        return Path(statement).is_file()
+    except OSError:
         return False
@@ -26,6 +26,9 @@ __all__ = [
     "db_loginfo",
     "db_logerror",
     "caller_name",
+    "dropped_log_records",
+    "stop_log_listener",
+    "bind_log_context",
 ]
 from sfos.logging.logging import (
     log,
@@ -44,4 +47,7 @@ from sfos.logging.logging import (
     db_loginfo,
     db_logerror,
     caller_name,  # helpful for debugging
+    dropped_log_records,
+    stop_log_listener,
+    bind_log_context,
 )
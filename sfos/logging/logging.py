@@ -13,12 +13,17 @@ License.
 # pylint: disable=broad-exception-caught
 from __future__ import annotations
 
+import atexit
+import contextvars
 import inspect
 import json
 import logging
 import os
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import UTC, datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import sys
 from typing import Literal, TypeAlias, TypeVar
 
@@ -37,6 +42,51 @@ P = ParamSpec("P")
 R = TypeVar("R")
 MessageType: TypeAlias = str | list | object | Level
 
+# Records are queued for a background writer thread. 0 writes on the calling thread
+LOG_QUEUE_SIZE = int(os.getenv("GC_LOG_QUEUE_SIZE", "10000"))
+# "text" for key="value" log lines, "json" for one JSON object per line
+LOG_FORMAT_STYLE = os.getenv("GC_LOG_FORMAT", "text").lower()
+
+# Fields added to every log record written from the current thread or task
+log_context: contextvars.ContextVar[dict] = contextvars.ContextVar(
+    "log_context", default={}
+)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format each record as a single line JSON object
+
+    Keyword arguments given to the log functions and fields bound with
+    bind_log_context() become top level keys.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": record.filename,
+            "line": record.lineno,
+            "func": record.funcName,
+        }
+        entry.update(getattr(record, "context", {}))
+        if isinstance(record.msg, _LogMessage):
+            entry["message"] = " ".join(str(part) for part in record.msg.parts)
+            entry.update(record.msg.fields())
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    """Copy the bound log context onto records on the thread that logs them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = log_context.get()
+        return True
+
 
 @dataclass
 class LogState:
@@ -49,7 +99,11 @@ class LogState:
     timers: dict = {}
     FORMATTER = logging.Formatter(_c.LOG_FORMAT, datefmt=_c.LOG_DATE_FORMAT)
     AGENT_FORMATTER = logging.Formatter(_c.AGENT_LOG_FORMAT, datefmt=_c.LOG_DATE_FORMAT)
+    JSON_FORMATTER = JsonLinesFormatter(datefmt=_c.LOG_DATE_FORMAT)
     PATH = "./logs"
+    json_lines: bool = LOG_FORMAT_STYLE == "json"
+    queue_handler: DroppingQueueHandler = None
+    listener: LogListener = None
 
     @property
     def init_application_done(self) -> bool:
@@ -68,9 +122,111 @@ class LogState:
         return self.init_agent_done and self.init_application_done and self.init_db_done
 
 
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler for a bounded queue that drops records when it is full
+
+    Records are queued as they are: joining the message and file writes both happen
+    on the QueueListener thread, so a slow disk cannot stall the calling thread.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class LogListener(QueueListener):
+    """QueueListener that waits for room in a full queue to enqueue its stop signal"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class _LogMessage:
+    """Log message parts, joined only when a handler formats the record
+
+    Parts and keyword values are copied to strings when the message is created, so
+    records waiting in the log queue neither hold on to the caller's objects nor
+    show changes made to them after the log call. Only a TRACE response is kept as
+    it is: a received response is not changed, and SfosResponse.release() only
+    drops its own reference to it. It is converted to a dict by the first handler
+    that formats the record, off the caller's thread when logging is queued.
+    """
+
+    __slots__ = ("parts", "kwargs", "response", "_response_dict")
+
+    def __init__(self, parts: list, kwargs: dict, response: object = None) -> None:
+        self.parts = [str(part) for part in parts]
+        self.kwargs = {key: _snapshot(value) for key, value in kwargs.items()}
+        self.response = response
+        self._response_dict: dict | None = None
+
+    def response_dict(self) -> dict | None:
+        """The TRACE response as a dict, converted once for all handlers"""
+        if self.response is not None and self._response_dict is None:
+            self._response_dict = resp2dict(self.response)
+        return self._response_dict
+
+    def fields(self) -> dict:
+        """Keyword arguments, with the TRACE response as a dict"""
+        if self.response is None:
+            return self.kwargs
+        return {**self.kwargs, "response": self.response_dict()}
+
+    def __str__(self) -> str:
+        kwargs = self.kwargs
+        if self.response is not None:
+            kwargs = {**kwargs, "response": json.dumps(self.response_dict())}
+        log_msgs = list(self.parts)
+        log_msgs.extend(f'{k}="{v}"' for k, v in kwargs.items())
+        message = " ".join(log_msgs)
+        return message.replace("\r", "").replace("\n", "")
+
+
+def _snapshot(value: object) -> str | int | float | bool | None:
+    # numbers and booleans stay as they are for the json lines formatter
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
 logstate = LogState()
 
 
+@contextmanager
+def bind_log_context(**fields: str | int | bool | None):
+    """Add fields such as host or session_id to every log entry written inside the
+    with block. Bindings nest, and are private to the current thread or asyncio task.
+    """
+    token = log_context.set({**log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        log_context.reset(token)
+
+
+def dropped_log_records() -> int:
+    """Number of log records dropped because the log queue was full"""
+    return logstate.queue_handler.dropped if logstate.queue_handler else 0
+
+
+def stop_log_listener() -> None:
+    """Write out queued log records and stop the background writer thread"""
+    if logstate.listener is not None:
+        logstate.listener.stop()
+        logstate.listener = None
+
+
 INIT_CALLED = False
 # FrameInfo tuple value position indexes
 FI_FRAME = 0
@@ -83,8 +239,19 @@ IF_INDEX = 5
 
 def caller_name(stacklevel: int = 2) -> str:
     """Get the name of the calling function"""
-    stacklevel += 1
-    return inspect.stack()[stacklevel][3]
+    # sys._getframe walks frame pointers only; inspect.stack() would also read
+    # source lines for every frame on the stack
+    return sys._getframe(stacklevel + 1).f_code.co_name
+
+
+def _needs_writer(messages: tuple) -> bool:
+    """True if any message changes the log level or carries an error to log"""
+    for itm in messages:
+        if type(itm) is not str and (
+            isinstance(itm, (Level, Exception)) or hasattr(itm, "error")
+        ):
+            return True
+    return False
 
 
 def init_logger(
@@ -95,11 +262,31 @@ def init_logger(
     logger = logging.getLogger(name)
     logger.setLevel(level.value)
     file_handler = RotatingFileHandler(log_filepath, maxBytes=20 * _c.MB, backupCount=5)
+    if logstate.json_lines:
+        formatter = logstate.JSON_FORMATTER
     file_handler.setFormatter(formatter if formatter else logstate.FORMATTER)
-    logger.addHandler(file_handler)
+    logger.addFilter(_ContextFilter())
+    if logstate.queue_handler is None:
+        logger.addHandler(file_handler)
+        return logger
+
+    # The listener passes every queued record to every file handler,
+    # so each one only accepts records from its own logger
+    file_handler.addFilter(logging.Filter(name))
+    logger.addHandler(logstate.queue_handler)
+    logstate.listener.handlers += (file_handler,)
     return logger
 
 
+def init_log_queue(logstate: LogState, maxsize: int = LOG_QUEUE_SIZE) -> None:
+    """Route log records through a bounded queue to a background writer thread"""
+    if maxsize <= 0 or logstate.queue_handler is not None:
+        return
+    logstate.queue_handler = DroppingQueueHandler(maxsize)
+    logstate.listener = LogListener(logstate.queue_handler.queue)
+    atexit.register(stop_log_listener)
+
+
 def init_logging(level: Level) -> None:
     """Initialize default logger."""
 
@@ -118,11 +305,14 @@ def init_logging(level: Level) -> None:
         os.makedirs(logstate.PATH)
 
     # Init application log
+    init_log_queue(logstate)
     logstate.logger_application = init_logger("Application", level, logstate)
     logstate.logger_database = init_logger("Database", level, logstate)
     logstate.logger_agent = init_logger(
         "Agent", level, logstate, logstate.AGENT_FORMATTER
     )
+    if logstate.listener is not None:
+        logstate.listener.start()
     logstate.logger_application.log(level.value, "Application Logging Initialized")
 
 
@@ -306,6 +496,10 @@ def log_writer(
         print(f"Log called too early from {caller_name(stacklevel + 2)}")
         return
 
+    # Return before any formatting if the level is disabled
+    if not logger.isEnabledFor(level.value) and not _needs_writer(messages):
+        return None
+
     for itm in messages:
         if isinstance(itm, Level):
             level = itm
@@ -315,6 +509,7 @@ def log_writer(
     level = Level.DEBUG if level is None else level
     ret_obj = None
     ret_error = None
+    response = None
     idx = 0
     for i, item in enumerate(msgs):
         if isinstance(item, Exception):
@@ -325,12 +520,17 @@ def log_writer(
             ret_obj = item
             break
         idx += 1
+    context = log_context.get()
     if ret_obj:
         if hasattr(ret_obj, "trace"):
             kwargs["trace"] = ret_obj.trace  # type: ignore
         if hasattr(ret_obj, "success"):
             kwargs["success"] = ret_obj.success  # type: ignore
-        if hasattr(ret_obj, "fw") and ret_obj.fw is not None:  # type: ignore
+        if (
+            "host" not in context
+            and hasattr(ret_obj, "fw")
+            and ret_obj.fw is not None  # type: ignore
+        ):
             kwargs["host"] = ret_obj.fw.address.hostname  # type: ignore
             kwargs["port"] = ret_obj.fw.address.port  # type: ignore
             kwargs["verify_tls"] = ret_obj.fw.address.verify_tls  # type: ignore
@@ -338,38 +538,19 @@ def log_writer(
             kwargs["msg"] = ret_obj.message  # type: ignore
         if hasattr(ret_obj, "timer"):
             kwargs["timer"] = ret_obj.timer  # type: ignore
-        if level == Level.TRACE:
-            if (
-                hasattr(
-                    ret_obj,
-                    "response",
-                )
-                and ret_obj.response is not None
-            ):  # type: ignore
-                kwargs["response"] = json.dumps(
-                    resp2dict(ret_obj.response)  # type: ignore
-                )
+        if level == Level.TRACE and getattr(ret_obj, "response", None) is not None:
+            # converted and serialized when the record is written
+            response = ret_obj.response  # type: ignore
 
     positional_args = (
         [msg for msg in msgs if isinstance(msg, MessageType)] if msgs else []
     )
-
-    kw_args = [
-        f'{k}="{str(v)}"' if isinstance(v, MessageType) else f"'{type(v)}'"
-        for k, v in kwargs.items()
-    ]
-    log_msgs = positional_args
-    log_msgs.extend(kw_args)
-    for msg in log_msgs:
-        if not isinstance(msg, str) and hasattr(msg, "__str__"):
-            msg = str(msg)
-        elif not isinstance(msg, str):
-            print("msg object is not string, it's", type(msg))
-    if isinstance(log_msgs, str):
-        message = log_msgs
-    else:
-        message = " ".join([str(msg) for msg in log_msgs]) if log_msgs else ""
-    message = message.replace("\r", "").replace("\n", "")
+    message = None
+    if positional_args or kwargs or response is not None:
+        if context and not logstate.json_lines:
+            # the json formatter reads bound fields from the record instead
+            kwargs = {**context, **kwargs}
+        message = _LogMessage(positional_args, kwargs, response)
     try:
         if ret_error:  # and level == Level.TRACE:
             logger.exception(ret_error, stacklevel=stacklevel + 1)
@@ -21,6 +21,7 @@ __all__ = [
     "EnabledOrDisabled",
     "FirewallInfo",
     "Definition",
+    "RequestTimings",
     "ServiceAddress",
     "SfosRequest",
     "SfosResponse",
@@ -37,6 +38,7 @@ from sfos.objects.custom_types import (
 )
 from sfos.objects.firewall_info import FirewallInfo
 from sfos.objects.req_definition import Definition
+from sfos.objects.request_timings import RequestTimings
 from sfos.objects.service_address import ServiceAddress
 from sfos.objects.sfos_request import SfosRequest
 from sfos.objects.sfos_response import SfosResponse
@@ -11,6 +11,7 @@ License.
 
 from __future__ import annotations
 import json
+import os
 import re as _re
 
 from datetime import datetime
@@ -19,10 +20,16 @@ from pydantic import BaseModel
 
 from sfos.static import constants as _c, exceptions as _ex, patterns as _p, DATE_FMT
 
+KEEP_INDEX_SOURCE = bool(int(os.getenv("GC_KEEP_INDEX_SOURCE", "0")))
+
 
 class FirewallInfo(BaseModel):
     """Used to parse and store info retrieved from SFOS connections
 
+    By default only the typed fields are populated. subscriptions is kept as the
+    raw JSON text and decoded by get_license() when needed. all_items and
+    _source_data are only set by an IndexParser created with keep_source=True.
+
     Args:
         BaseModel (_type_): _description_
 
@@ -209,10 +216,17 @@ class License:
 class IndexParser:
     """Parse index.jsp contents retrieved during sfos login"""
 
-    def __init__(self, csrf_key: str = _p.DEFAULT_CSRF_KEY_NAME) -> None:
+    def __init__(
+        self,
+        csrf_key: str = _p.DEFAULT_CSRF_KEY_NAME,
+        keep_source: bool = KEEP_INDEX_SOURCE,
+    ) -> None:
         """Accepts:
         csrf_key    (Optional) defaults to the static CSRF key value expected
                     at the time of release: "c$rFt0k3n"
+        keep_source (Optional) also store every jsp var in FirewallInfo.all_items
+                    and the trimmed script text in FirewallInfo._source_data.
+                    Defaults to GC_KEEP_INDEX_SOURCE, or False
 
         Updates:
             self.csrf_key_name
@@ -222,6 +236,7 @@ class IndexParser:
         super().__init__()
         # name of jsp var containing csrf token
         self.csrf_key_name = csrf_key
+        self.keep_source = keep_source
         self.csrf_token_value = None
         self._compile_re_to_find_csrf_key_value()
 
@@ -342,12 +357,14 @@ class IndexParser:
     def _update_and_find_csrf_token_value(
         self,
         search_text: str,
-    ) -> None:
+    ) -> str:
         """Accepts:
             search_text: str            A string to search with the compiled pattern
 
         Returns:
-            None
+            str - the csrf token value found. Callers should use the returned value
+                  rather than self.csrf_token_value, since a shared parser may be
+                  called from several threads at once
         Updates:
             self.csrf_key_name - calls self._update_csrf_key_name(search_text) first
             self.csrf_token_value - updated with the value found
@@ -357,9 +374,11 @@ class IndexParser:
 
         try:
             self._update_csrf_key_name(search_text)
-            self.csrf_token_value = self._search_for_pattern(
+            csrf_token_value = self._search_for_pattern(
                 self.re_to_find_csrf_key_value, search_text, "csrf_value"
             )
+            self.csrf_token_value = csrf_token_value
+            return csrf_token_value
         except _ex.NoMatchFound as e:
             raise _ex.NoMatchFound from e
 
@@ -408,6 +427,53 @@ class IndexParser:
 
         return found_keys
 
+    def _scan(self, search_text: str) -> tuple[dict, str | None]:
+        """Scan index.jsp once for jsp vars and the csrf key name
+
+        Accepts:
+            search_text - index_jsp text to search
+
+        Returns:
+            tuple (found_keys, csrf_key). csrf_key is the first argument passed to
+            Cyberoam.setCSRFToken(), or None if it was not found
+        """
+        found_keys: dict = {}
+        csrf_key: str | None = None
+
+        for match in _p.RE_TO_SCAN_INDEX.finditer(search_text):
+            if match.lastgroup == _p.GROUP_JSP_VAR_VALUE:
+                found_keys[match[_p.GROUP_JSP_VAR_KEY]] = match[_p.GROUP_JSP_VAR_VALUE]
+            elif csrf_key is None:
+                csrf_key = match[_p.GROUP_CSRF_KEY_NAME]
+
+        return found_keys, csrf_key
+
+    def _csrf_token_from(
+        self, found_items: dict, csrf_key: str | None, search_text: str
+    ) -> str:
+        """Accepts:
+            found_items - jsp vars found by self._scan()
+            csrf_key - key name passed to setCSRFToken(), if found
+            search_text - index_jsp text, searched again only if the token is
+                          not among found_items
+
+        Returns:
+            str - the csrf token value
+
+        Raises:
+            px.NoMatchFound - raised if no token is found
+        """
+        if self.csrf_key_name in found_items:
+            return found_items[self.csrf_key_name]
+
+        if csrf_key:
+            key_name = csrf_key.removeprefix("Cyberoam.")
+            if key_name in found_items:
+                return found_items[key_name]
+
+        # print("csrf key not found in dict. Starting hunt")
+        return self._update_and_find_csrf_token_value(search_text)
+
     def _trim(self, search_text: str) -> str:
         """Accepts:
             search_text     text to process
@@ -420,12 +486,9 @@ class IndexParser:
 
         Raises:
         """
-        return_value = search_text
-        return_value = return_value.replace("\t", " ")
-        return_value = return_value.replace("\r\n", "\n")
-        return_value = _re.sub("\n+", "\n", return_value, flags=_re.S)
-        return_value = _re.sub(" +", " ", return_value)
-        return return_value
+        return_value = search_text.replace("\t", " ").replace("\r\n", "\n")
+        return_value = _p.RE_TO_COLLAPSE_LINES.sub("\n", return_value)
+        return _p.RE_TO_COLLAPSE_SPACES.sub(" ", return_value)
 
     def _reduce_html_to_interesting_bits(self, search_text: str) -> str:
         """Accepts:
@@ -437,12 +500,9 @@ class IndexParser:
         Raises:
             ProcessorError  Raised if no relevant script data is found
         """
-        index_scripts = _p.RE_TO_FIND_SCRIPTS.findall(search_text)
-        return_text = ""
-        for script in index_scripts:
-            this = self._trim(str(script))
-            # print(f"interesting bits: {this}")
-            return_text += this
+        return_text = "".join(
+            self._trim(script) for script in _p.RE_TO_FIND_SCRIPTS.findall(search_text)
+        )
 
         if not return_text:
             # print("No data in search_text to parse")
@@ -471,31 +531,27 @@ class IndexParser:
         """
 
         try:
-            source_text = self._reduce_html_to_interesting_bits(raw_text)
+            source_text = (
+                self._reduce_html_to_interesting_bits(raw_text)
+                if self.keep_source
+                else None
+            )
             search_text = raw_text
 
-            # Strip the returned html down to just the <script> tag contents
-            # print(f"Starting parser with search_text bytes={len(search_text)}")
-            found_items = self._extract_key_value_pairs(search_text)
+            found_items, csrf_key = self._scan(search_text)
 
             if len(found_items) == 0:
                 raise _ex.NoMatchFound("'index.jsp' values not in raw_text")
 
-            # print(f"looking for {self.csrf_key_name} in search_text")
-            if self.csrf_key_name in found_items:
-                # print("csrf key found in dict")
-                found_items["csrf_token"] = found_items[self.csrf_key_name]
-            else:
-                # print("csrf key not found in dict. Starting hunt")
-                self._update_and_find_csrf_token_value(search_text)
-                found_items["csrf_token"] = self.csrf_token_value
-
-            # Store the raw index text and all found keys in found_items
-            found_items["_source_data"] = source_text
-            found_items["all_items"] = found_items
+            found_items["csrf_token"] = self._csrf_token_from(
+                found_items, csrf_key, search_text
+            )
 
             found_items["subscriptions"] = self._find_subscriptions(search_text)
 
+            # Only keep a copy of all found keys if asked to
+            found_items["all_items"] = dict(found_items) if self.keep_source else None
+
             # Are all required keys present?
 
             FirewallInfo.check_required_keys(found_items)
@@ -525,6 +581,7 @@ class IndexParser:
         result = FirewallInfo()
         for key in return_obj_values:
             setattr(result, key, return_obj_values[key])
+        result._source_data = source_text
 
         return result
 
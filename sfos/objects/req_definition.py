@@ -1,10 +1,18 @@
 from __future__ import annotations
-from typing import Literal
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any, Literal
 
 from sfos.static.enums import SfosMode as _req_mode, SfosOperation as _req_oper
 
 
 class Definition:
+    """Immutable request template loaded from sfos/webadmin/templates.
+
+    Definitions are cached and shared between threads, so attributes cannot be
+    changed after creation. Use replace() to get a modified copy.
+    """
+
     def __init__(
         self,
         req_mode: _req_mode,
@@ -12,12 +20,24 @@ class Definition:
         req_object: str | None = None,
         web_path: str | None = None,
         web_method: Literal["get", "post"] = "post",
-        web_headers: dict[str, str] = {},
+        web_headers: Mapping[str, str] | None = None,
         urlencode: bool | None = None,
         separator: str | None = None,
-        arguments: dict | None = None,
+        arguments: dict | list | None = None,
         special: str | None = None,
     ):
+        self._kwargs = {
+            "req_mode": req_mode,
+            "req_operation": req_operation,
+            "req_object": req_object,
+            "web_path": web_path,
+            "web_method": web_method,
+            "web_headers": web_headers,
+            "urlencode": urlencode,
+            "separator": separator,
+            "arguments": arguments,
+            "special": special,
+        }
 
         # Constants
         self.PATH_CONTROLLER = "webconsole/Controller"
@@ -29,8 +49,26 @@ class Definition:
         self.req_operation = req_operation
         self.req_object = req_object
         self.web_method: Literal["get", "post"] = web_method
-        self.web_headers = web_headers
+        self.web_headers: Mapping[str, str] = _freeze(web_headers or {})
         self.urlencode = urlencode or web_method == "get"
         self.separator = separator
-        self.arguments = arguments
+        self.arguments = _freeze(arguments)
         self.special = special
+        self._frozen = True
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"Definition is immutable, cannot set '{name}'")
+        super().__setattr__(name, value)
+
+    def replace(self, **changes: Any) -> Definition:
+        """Return a copy of this definition with the given init values changed"""
+        return Definition(**{**self._kwargs, **changes})
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
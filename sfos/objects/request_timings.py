@@ -0,0 +1,75 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from typing import Iterator
+
+# Timings for the request being sent on the current thread or asyncio task
+current_timings: ContextVar[RequestTimings | None] = ContextVar(
+    "current_timings", default=None
+)
+
+
+def ms_since(tstart: float) -> float:
+    """Milliseconds elapsed since a time.perf_counter() value"""
+    return round((time.perf_counter() - tstart) * 1000, 3)
+
+
+@dataclass
+class RequestTimings:
+    """Latency of each phase of one webadmin request, in milliseconds
+
+    dns, connect and tls are None when the request reused an open connection.
+    request covers sending the request and reading the complete response, and
+    parse covers extracting data from it.
+    """
+
+    url: str = ""
+    started: str = field(default_factory=lambda: datetime.now(tz=UTC).isoformat())
+    status_code: int | None = None
+    reused: bool = True
+    dns_ms: float | None = None
+    connect_ms: float | None = None
+    tls_ms: float | None = None
+    request_ms: float | None = None
+    parse_ms: float | None = None
+    total_ms: float | None = None
+
+    @property
+    def handshake_ms(self) -> float:
+        """Time spent opening a new connection"""
+        return (self.dns_ms or 0) + (self.connect_ms or 0) + (self.tls_ms or 0)
+
+    def add_parse(self, tstart: float) -> None:
+        """Add time since tstart to parse_ms"""
+        self.parse_ms = round((self.parse_ms or 0) + ms_since(tstart), 3)
+
+    def as_row(self) -> dict:
+        return asdict(self)
+
+    @contextmanager
+    def measure_request(self) -> Iterator[RequestTimings]:
+        """Collect connection phases from instrumented transports while sending.
+        Whatever the handshake did not take is counted as request time.
+        """
+        token = current_timings.set(self)
+        tstart = time.perf_counter()
+        try:
+            yield self
+        finally:
+            current_timings.reset(token)
+            self.request_ms = round(max(ms_since(tstart) - self.handshake_ms, 0), 3)
@@ -28,6 +28,8 @@ class ServiceAddress:
         self.port = port
         self.verify_tls = verify_tls
         self.timeout = timeout
+        # (connect, read) timeouts derived from this firewall's reply history
+        self.adaptive_timeout: tuple[float, float] | None = None
 
         # Constants
         self.PATH_CONTROLLER = "webconsole/Controller"
@@ -56,6 +58,12 @@ class ServiceAddress:
     def __call__(self) -> str:
         return self.address
 
+    @property
+    def request_timeout(self) -> float | tuple[float, float]:
+        """Timeout for requests sent to this address: the adaptive
+        (connect, read) timeouts if set, otherwise the configured timeout"""
+        return self.adaptive_timeout or self.timeout
+
     @property
     def address(self) -> str:
         """returns {hostname}:{port}"""
@@ -21,5 +21,6 @@ class SfosRequest:
     body: str | None
     method: Literal["get", "post"]
     verify: bool
-    timeout: int
+    timeout: float | tuple[float, float]
     special: str | None
+    idempotent: bool = False
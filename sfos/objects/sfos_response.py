@@ -11,16 +11,45 @@ License.
 
 # pylint: disable=broad-exception-caught
 import json
+import re as _re
 from datetime import datetime, UTC
 from requests import Request as _Request, Response as _response
 from requests.utils import dict_from_cookiejar as _dict_from_cookiejar
 from typing import Any
 
 from sfos.objects.firewall_info import FirewallInfo as _fwi
+from sfos.objects.request_timings import RequestTimings
+
+
+# Only text that starts like a JSON object or array is worth decoding
+_RE_JSON_START = _re.compile(r"\s*[\[{]")
 
 
 class SfosResponse:
-    """Response from a call to SFOS WebAdmin"""
+    """Response from a call to SFOS WebAdmin
+
+    data is decoded from the response text on first access, and only if the text
+    looks like JSON. Pass keep_response=False, or call release(), to drop the raw
+    response once the useful fields are extracted. retries counts the times the
+    request was sent again after a transient error.
+    """
+
+    __slots__ = (
+        "fw",
+        "request",
+        "response",
+        "error",
+        "status_code",
+        "timestamp",
+        "text",
+        "success",
+        "trace",
+        "timer",
+        "timings",
+        "retries",
+        "_data",
+        "_decoded",
+    )
 
     def __init__(
         self,
@@ -33,6 +62,9 @@ class SfosResponse:
         data: dict | _fwi | None = None,
         success: bool | None = None,
         timer: int | None = None,
+        keep_response: bool = True,
+        timings: list[RequestTimings] | None = None,
+        retries: int = 0,
     ) -> None:
         self.fw = fw
         self.request = request
@@ -45,6 +77,8 @@ class SfosResponse:
         self.success = None
         self.trace = trace
         self.timer = timer
+        self.timings = timings if timings is not None else []
+        self.retries = retries
         if self.error:
             self.success = success if success else False
             self.text = str(error)
@@ -55,16 +89,38 @@ class SfosResponse:
                 success if success else self.response.status_code in range(200, 300)
             )
             self.text = getattr(response, "text", "")
-            if data:
-                self.data = data
-            else:
-                try:
-                    self.data = json.loads(self.text)
-                except Exception:
-                    self.data = None
+            if not data:
+                # decoded by the data property when first used
+                self._decoded = not _is_json(self.text, response)
         elif data:
             self.success = success if success else True
-            self.data = data
+
+        if not keep_response:
+            self.response = None
+
+    @property
+    def data(self) -> dict | list | _fwi | None:
+        """Data passed to the constructor, or the response text decoded as JSON"""
+        if not self._decoded:
+            self._decoded = True
+            try:
+                self._data = json.loads(self.text)
+            except ValueError:
+                self._data = None
+        return self._data
+
+    @data.setter
+    def data(self, value: dict | list | _fwi | None) -> None:
+        self._data = value
+        self._decoded = True
+
+    def release(self) -> None:
+        """Drop the raw response, and the response text once data has been extracted.
+        status_code, success, error and data are kept.
+        """
+        self.response = None
+        if self.success and self.data is not None:
+            self.text = None
 
     # @property
     def __dict__(self) -> dict:  # type: ignore
@@ -80,6 +136,7 @@ class SfosResponse:
             "has_error": self.error is not None,
             "trace": self.trace,
             "timer": self.timer,
+            "retries": self.retries,
             "text": self.text,
             "data": data,
             "web_response": resp2dict(self.response) if self.response else None,
@@ -109,6 +166,15 @@ class SfosResponse:
         return result
 
 
+def _is_json(text: str | None, response: Any) -> bool:
+    """Check the content type and first characters of a response before decoding"""
+    if not text:
+        return False
+    headers = getattr(response, "headers", None) or {}
+    content_type = headers.get("Content-Type", "")
+    return "json" in content_type or _RE_JSON_START.match(text) is not None
+
+
 def resp2dict(response: _response, _root: bool = True):
     """_summary_
 
@@ -24,6 +24,7 @@ CSRF_TOKEN = "X-Csrf-Token"
 AUTH_SUCCESS_MSG = '{"redirectionURL":"/webpages/index.jsp","status":200}'
 AUTH_FAIL_MSG = '{"redirectionURL":"/webpages/login.jsp","status":-1}'
 AUTH_DISCLAIMER_MSG = '"disclaimer_message":"'
+SESSION_EXPIRED_MSG = "/webpages/login.jsp"
 
 # Log Formatting
 LOG_FORMAT = (
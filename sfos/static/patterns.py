@@ -7,7 +7,11 @@ GROUP_JSP_VAR_KEY = "key"
 GROUP_JSP_VAR_VALUE = "value"
 GROUP_SUBSCRIPTIONS = "subscriptions"
 DEFAULT_CSRF_KEY_NAME = "c$rFt0k3n"
-PATTERN_FIND_SCRIPTS = r"<script.*?>(?P<script>.*?)<\/script>"
+# raw pattern: r"<script.*?>(?P<script>.*?)<\/script>", unrolled so the body is
+# consumed in runs of non-'<' characters rather than one character at a time
+PATTERN_FIND_SCRIPTS = (
+    r"<script[^>]*>(?P<script>[^<]*(?:<(?!\/script>)[^<]*)*)<\/script>"
+)
 
 # raw r"setCSRFToken\((?P<csrf_value>.*?)\)"
 PATTERN_FIND_CSRF_KEY_NAME = r"setCSRFToken\((?P<" f"{GROUP_CSRF_KEY_NAME}" r">.*?)\)"
@@ -23,6 +27,17 @@ PATTERN_FIND_JSP_VARS = (
     r">[a-zA-Z0-9!@#$%^&]+)\s*=\s*"
     r"'?\"?(?P<value>.*?)'?\"?;"
 )
+# jsp vars and the setCSRFToken() call in a single scan. Both start with the literal
+# 'Cyberoam.' that re uses to skip ahead, so the scan costs about the same as
+# PATTERN_FIND_JSP_VARS alone. The match's lastgroup tells which one matched.
+PATTERN_SCAN_INDEX = (
+    r"Cyberoam\.(?:setCSRFToken\((?P<"
+    f"{GROUP_CSRF_KEY_NAME}"
+    r">.*?)\)|(?P<"
+    f"{GROUP_JSP_VAR_KEY}"
+    r">[a-zA-Z0-9!@#$%^&]+)\s*=\s*"
+    r"'?\"?(?P<value>.*?)'?\"?;)"
+)
 PATTERN_FIND_SUBSCRIPTIONS = (
     r"modulesubsctionList=(?P<" f"{GROUP_SUBSCRIPTIONS}" r">\[.*\]);"
 )
@@ -33,3 +48,6 @@ RE_TO_FIND_CSRF_KEY = _re.compile(PATTERN_FIND_CSRF_KEY_NAME)
 RE_TO_FIND_JSP_VARS = _re.compile(PATTERN_FIND_JSP_VARS)
 RE_TO_FIND_SUBSCRIPTIONS = _re.compile(PATTERN_FIND_SUBSCRIPTIONS)
 RE_TO_FIND_CSRF_KEY_VALUE_DEFAULT = _re.compile(PATTERN_FIND_CSRF_KEY_VALUE_DEFAULT)
+RE_TO_SCAN_INDEX = _re.compile(PATTERN_SCAN_INDEX)
+RE_TO_COLLAPSE_LINES = _re.compile("\n\n+")
+RE_TO_COLLAPSE_SPACES = _re.compile("  +")
@@ -11,6 +11,7 @@ License.
 
 __all__ = [
     "Connector",
+    "AsyncConnector",
     "SfosResponse",
     "Definition",
     "load_definition",
@@ -18,9 +19,14 @@ __all__ = [
     "make_sfos_request_from_template",
     "load_request_object_data",
     "SfosRequest",
+    "SessionCache",
+    "get_session_cache",
+    "SessionPool",
+    "get_session_pool",
 ]
 from sfos.objects.req_definition import Definition
 from sfos.webadmin.connector import Connector, SfosResponse
+from sfos.webadmin.async_connector import AsyncConnector
 from sfos.webadmin.methods import (
     load_definition,
     make_sfos_request,
@@ -28,3 +34,5 @@ from sfos.webadmin.methods import (
     load_request_object_data,
 )
 from sfos.objects.sfos_request import SfosRequest
+from sfos.webadmin.session_cache import SessionCache, get_session_cache
+from sfos.webadmin.session_pool import SessionPool, get_session_pool
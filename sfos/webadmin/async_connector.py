@@ -0,0 +1,315 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+# pylint: disable=broad-exception-caught
+
+from __future__ import annotations
+
+import asyncio
+import socket
+import ssl
+import time
+
+import httpx
+
+from sfos.logging.logging import logerror
+from sfos.objects import SfosResponse
+from sfos.objects.request_timings import RequestTimings, ms_since
+from sfos.objects.service_address import ServiceAddress as _sa
+from sfos.objects.sfos_request import SfosRequest as _req
+from sfos.static import exceptions as _ex
+from sfos.webadmin.connector import Connector
+from sfos.webadmin.methods import make_sfos_request as _make_req, load_definition
+from sfos.webadmin.retry_policy import RetryPolicy
+from sfos.webadmin.session_cache import SessionCache
+from sfos.webadmin.timings import httpx_trace
+
+
+class AsyncConnector(Connector):
+    """Connector variant whose network calls are coroutines
+
+    Uses the same login flow, csrf token handling and response parsing as Connector,
+    but sends requests through an httpx.AsyncClient so that many firewalls can be
+    serviced from a single event loop.
+    """
+
+    def __init__(
+        self,
+        address: _sa | None = None,
+        credentials: dict[str, str] | None = None,
+        hostname: str | None = None,
+        port: int | None = None,
+        verify_tls: bool | None = None,
+        username: str | None = None,
+        password: str | None = None,
+        resume_session: dict | None = None,
+        timeout: int = 2,
+        session_cache: SessionCache | None = None,
+        client: httpx.AsyncClient | None = None,
+        retry_policy: RetryPolicy | None = None,
+    ) -> None:
+        super().__init__(
+            address=address,
+            credentials=credentials,
+            hostname=hostname,
+            port=port,
+            verify_tls=verify_tls,
+            username=username,
+            password=password,
+            resume_session=resume_session,
+            timeout=timeout,
+            session_cache=session_cache,
+            retry_policy=retry_policy,
+        )
+        self.client = client
+
+    @classmethod
+    def from_connector(cls, fw: Connector) -> AsyncConnector:
+        """Create an AsyncConnector for the same firewall and credentials as fw"""
+        if isinstance(fw, AsyncConnector):
+            return fw
+        conn = cls(
+            address=fw.address,
+            credentials=fw.credentials,
+            retry_policy=fw.retry_policy,
+        )
+        conn.cookies = dict(fw.cookies)
+        conn.csrf_token = fw.csrf_token
+        conn.info = fw.info
+        conn.session_cache = fw.session_cache
+        conn._resumed = fw._resumed
+        return conn
+
+    async def __aenter__(self) -> AsyncConnector:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close the http client and release its connections"""
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+
+    async def login(self, credentials: dict | None = None) -> SfosResponse:
+        """login to SFOS firewal webadmin interface
+
+        Args:
+            credentials (dict | None, optional): _description_. Defaults to None.
+
+        Returns:
+            SfosResponse: _description_
+        """
+        failed = self._start_login(credentials)
+        if failed:
+            return failed
+
+        req_auth, req_token = self._get_login_req_cmds()  # type: ignore
+
+        # login starts a new webadmin session
+        self.cookies = {}
+        if self.client:
+            self.client.cookies.clear()
+        rsp_auth, rsp_token = await self.send_requests(req_auth, req_token)
+        result = self._finish_login(req_token, rsp_auth, rsp_token)
+        result.timings = [*rsp_auth.timings, *rsp_token.timings]
+        result.retries = rsp_auth.retries + rsp_token.retries
+        return result
+
+    async def get_info(self) -> SfosResponse:
+        """Get login response info from firewall. A resumed session is used to
+        read index.jsp instead, and only replaced by a login if it has expired.
+        """
+        if self.csrf_token and not self.info and self.address:
+            return await self.refresh_info()
+        tstart = time.perf_counter()
+        sfos_resp = None
+        if not self.csrf_token or not self.info:
+            sfos_resp = await self.login()
+            if not sfos_resp.success:
+                return sfos_resp
+
+        return SfosResponse(
+            fw=self,
+            request=sfos_resp.request if sfos_resp else None,
+            response=sfos_resp.response if sfos_resp else None,
+            data=self.info,
+            success=self.info is not None,
+            timer=int(ms_since(tstart)),
+            timings=sfos_resp.timings if sfos_resp else None,
+            retries=sfos_resp.retries if sfos_resp else 0,
+            trace="239",
+        )
+
+    async def refresh_info(self) -> SfosResponse:  # type: ignore[override]
+        """Read index.jsp again within the current session. Logs in if there is
+        no session, or if the session has expired.
+        """
+        if not self.csrf_token or not self.address:
+            return await self.get_info()
+
+        tstart = time.perf_counter()
+        req = _make_req(load_definition("GET_INDEX_JSP"), self.address)
+        rsp = await self.send_request(req)
+        if rsp.error and isinstance(rsp.error, _ex.AgentConnectionError):
+            return rsp
+        fwinfo = self._index_info(rsp)
+        if fwinfo is None:
+            result = await self.get_info()
+            result.timings = [*rsp.timings, *result.timings]
+            return result
+        return self._refreshed(req, rsp, fwinfo, tstart)
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        if not self.client:
+            verify = self.address.verify_tls if self.address else True
+            self.client = httpx.AsyncClient(verify=verify)
+        if self.cookies:
+            # reload saved session cookies if there are any
+            self.client.cookies.update(self.cookies)
+        return self.client
+
+    async def _ensure_authenticated(self) -> bool:  # type: ignore[override]
+        if not self.csrf_token and not self._logging_in:
+            results = await self.login()
+            if not results.success and results.error:
+                raise results.error
+            elif not results.success:
+                raise _ex.AgentConnectionError("Unable to authenticate")
+
+        return True
+
+    async def send_request(self, req: _req) -> SfosResponse:  # type: ignore[override]
+        """Send a request, and send it again after transient errors allowed by
+        the retry policy. Other firewalls on the event loop run during the wait.
+        """
+        tstart = time.perf_counter()
+        timings: list[RequestTimings] = []
+        retries = 0
+        while True:
+            result = await self._send_once(req)
+            timings.extend(result.timings)
+            delay = self.retry_policy.next_delay(
+                req, result.error, retries + 1, time.perf_counter() - tstart
+            )
+            if delay is None:
+                break
+            retries += 1
+            self._log_retry(req, result, retries, delay)
+            await asyncio.sleep(delay)
+        result.timings = timings
+        result.retries = retries
+        return result
+
+    async def _send_once(self, req: _req) -> SfosResponse:  # type: ignore[override]
+        tstart = time.perf_counter()
+        timings = RequestTimings(url=req.url)
+        response: httpx.Response | None = None
+        error = None
+        trace = 200
+        try:
+            await self._ensure_authenticated()
+            client = self._ensure_client()
+            self._set_csrf_header(req)
+            request = client.build_request(
+                req.method.upper(),
+                req.url,
+                headers=req.headers,
+                content=req.body if req.method == "post" else None,
+                timeout=_httpx_timeout(req.timeout),
+                extensions={"trace": httpx_trace(timings)},
+            )
+            if req.special == "download":
+                return await self._download(client, request, trace)
+
+            with timings.measure_request():
+                response = await client.send(request)
+            self.cookies = {c.name: c.value for c in client.cookies.jar}
+
+        except httpx.ConnectTimeout:
+            error = (246, _ex.ConnectionTimeoutError("Connection timed out"))
+
+        except httpx.ReadTimeout:
+            error = (248, _ex.ReadTimeoutError("Connection read timed out"))
+
+        except httpx.TransportError as e:
+            error = _classify_transport_error(e)
+
+        finally:
+            timer = int(ms_since(tstart))
+            if error:
+                (trace, error) = error
+
+        if self._check_resumed_session(response):
+            return await self._send_once(req)
+
+        return self._timed_response(
+            tstart,
+            timings,
+            fw=self,
+            request=req,
+            response=response,  # type: ignore
+            error=error,
+            timer=timer,
+            trace=f"conn-{trace}",
+        )
+
+    async def send_requests(  # type: ignore[override]
+        self, *reqs: _req
+    ) -> list[SfosResponse]:
+        """Send requests one at a time, in order, within this firewall's session
+
+        Returns:
+            list[SfosResponse]: One response per request
+        """
+        return [await self.send_request(req) for req in reqs]
+
+    async def _download(
+        self, client: httpx.AsyncClient, request: httpx.Request, trace: int
+    ) -> SfosResponse:
+        response = await client.send(request, stream=True)
+        try:
+            response.raise_for_status()
+            filename = self._download_filename(response.headers)
+            print("downloading", filename)
+            with open(filename, "wb") as f:
+                async for chunk in response.aiter_bytes(chunk_size=8192):
+                    f.write(chunk)
+        finally:
+            await response.aclose()
+        return SfosResponse(
+            success=True,
+            data={"action": "download", "file": filename},
+            trace=f"conn-{trace}",
+        )
+
+
+def _httpx_timeout(timeout: float | tuple[float, float]) -> httpx.Timeout:
+    """httpx form of a requests-style timeout or (connect, read) tuple"""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+def _classify_transport_error(e: httpx.TransportError) -> tuple[int, Exception]:
+    """Map an httpx transport error onto the agent exception used by Connector"""
+    cause = e.__cause__ or e.__context__
+    while cause is not None and not isinstance(cause, (ssl.SSLError, OSError)):
+        cause = cause.__cause__ or cause.__context__
+
+    if isinstance(cause, ssl.SSLError) or "CERTIFICATE_VERIFY_FAILED" in str(e):
+        return (245, _ex.CertificateError("Invalid Certificate"))
+    if isinstance(cause, socket.gaierror):
+        return (247, _ex.NameResolutionError("DNS Error"))
+    logerror(f"Connection error: '{e}'")
+    return (247, _ex.AgentConnectionError(f"Connection error: '{e}'"))
@@ -13,10 +13,9 @@ License.
 
 from __future__ import annotations
 import json
+import time
 import json_fix  # noqa: F401
 
-from datetime import datetime
-
 # import trace
 from typing import Literal
 
@@ -35,12 +34,16 @@ import urllib3
 from sfos.logging.logging import logtrace, logerror
 from sfos.objects import SfosResponse
 from sfos.objects.firewall_info import FirewallInfo as _fwi, parse_index as _parse_index
+from sfos.objects.request_timings import RequestTimings, ms_since
 from sfos.static import exceptions as _ex, SfosMode as _req_mode, constants as _c
 from sfos.webadmin.methods import (
     make_sfos_request as _make_req,
     load_definition,
 )
 from sfos.objects.service_address import ServiceAddress as _sa
+from sfos.webadmin.session_cache import SessionCache
+from sfos.webadmin.retry_policy import RetryPolicy, default_retry_policy
+from sfos.webadmin.session_pool import new_session as _new_session
 from sfos.objects.sfos_request import SfosRequest as _req
 
 urllib3.disable_warnings()
@@ -60,6 +63,8 @@ class Connector:
         password: str | None = None,
         resume_session: dict | None = None,
         timeout: int = 2,
+        session_cache: SessionCache | None = None,
+        retry_policy: RetryPolicy | None = None,
     ) -> None:
         if hostname:
             self.address = _sa(
@@ -79,6 +84,11 @@ class Connector:
         self.csrf_token = None
         self._logging_in = False
         self.session = None
+        self.session_cache = session_cache
+        self.retry_policy = retry_policy or default_retry_policy
+        self._resumed = False
+        if session_cache is not None and self.credentials and self.address:
+            resume_session = resume_session or session_cache.get(self.target())
 
         # Captcha raises an error and returns
         # an image to be interpreted by the user.
@@ -88,11 +98,18 @@ class Connector:
             resume_session
             and _c.JSESSIONID in resume_session
             and (
-                _c.CAPTCHA in credentials  # type: ignore
-                or _c.CSRF_TOKEN in resume_session
+                _c.CSRF_TOKEN in resume_session
+                or _c.CAPTCHA in credentials  # type: ignore
             )
         ):
             self.cookies[_c.JSESSIONID] = resume_session[_c.JSESSIONID]
+            if _c.CSRF_TOKEN in resume_session:
+                # A complete session: skip login until the firewall rejects it
+                self.cookies.update(
+                    {k: v for k, v in resume_session.items() if k != _c.CSRF_TOKEN}
+                )
+                self.csrf_token = resume_session[_c.CSRF_TOKEN]
+                self._resumed = True
 
     def target(self) -> str:
         """username and address of target connection
@@ -129,7 +146,30 @@ class Connector:
         Returns:
             SfosResponse: _description_
         """
+        failed = self._start_login(credentials)
+        if failed:
+            return failed
+
+        req_auth, req_token = self._get_login_req_cmds()  # type: ignore
+
+        # send SfosRequest one at a time to correlate with request
+        self.session = _new_session()
+        rsp_auth, rsp_token = self.send_requests(
+            req_auth, req_token, session=self.session
+        )
+        result = self._finish_login(req_token, rsp_auth, rsp_token)
+        result.timings = [*rsp_auth.timings, *rsp_token.timings]
+        result.retries = rsp_auth.retries + rsp_token.retries
+        return result
+
+    def _start_login(self, credentials: dict | None = None) -> SfosResponse | None:
+        """Prepare for a login attempt
+
+        Returns:
+            SfosResponse | None: A failed response if login cannot proceed
+        """
         self._logging_in = True
+        self._resumed = False
         self._set_creds(credentials)
         if not self.credentials:
             result = SfosResponse(
@@ -139,15 +179,14 @@ class Connector:
             )
             logerror(result)
             return result
+        return None
 
-        req_auth, req_token = self._get_login_req_cmds()  # type: ignore
-
-        # send SfosRequest one at a time to correlate with request
-        self.session = _session()
-        rsp_auth, rsp_token = self.send_requests(
-            req_auth, req_token, session=self.session
-        )
-
+    def _finish_login(
+        self, req_token: _req, rsp_auth: SfosResponse, rsp_token: SfosResponse
+    ) -> SfosResponse:
+        """Check the auth and index responses of a login attempt, and save the
+        csrf token and firewall info if it succeeded. Shared by all transports.
+        """
         if rsp_auth.error and isinstance(rsp_auth.error, _ex.AgentConnectionError):
             result = SfosResponse(
                 fw=self,
@@ -187,7 +226,10 @@ class Connector:
 
         try:
             assert rsp_token.text
+            tparse = time.perf_counter()
             fwinfo = _parse_index(rsp_token.text)
+            if rsp_token.timings:
+                rsp_token.timings[-1].add_parse(tparse)
             assert fwinfo.csrf_token is not None
             hostname = self.address.hostname if self.address else "?"
             logtrace(
@@ -210,6 +252,8 @@ class Connector:
         self.info = fwinfo
         self.csrf_token = fwinfo.csrf_token
         self._logging_in = False
+        if self.session_cache is not None:
+            self.session_cache.put(self.target(), self.cookies, self.csrf_token)
         return SfosResponse(
             fw=self,
             request=req_token,
@@ -219,24 +263,94 @@ class Connector:
         )
 
     def get_info(self) -> SfosResponse:
-        """Get login response info from firewall"""
-        tstart = datetime.now()
-        if not self.csrf_token:
+        """Get login response info from firewall. A resumed session is used to
+        read index.jsp instead, and only replaced by a login if it has expired.
+        """
+        if self.csrf_token and not self.info and self.address:
+            return self.refresh_info()
+        tstart = time.perf_counter()
+        sfos_resp = None
+        if not self.csrf_token or not self.info:
             sfos_resp = self.login()
             if not sfos_resp.success:
                 return sfos_resp
 
-        timer = int((datetime.now() - tstart).microseconds / 1000)
         return SfosResponse(
             fw=self,
             request=sfos_resp.request if sfos_resp else None,  # type: ignore
             response=sfos_resp.response if sfos_resp else None,  # type: ignore
             data=self.info,
             success=self.info is not None,
-            timer=timer,
+            timer=int(ms_since(tstart)),
+            timings=sfos_resp.timings if sfos_resp else None,
+            retries=sfos_resp.retries if sfos_resp else 0,
             trace="239",
         )
 
+    def refresh_info(self) -> SfosResponse:
+        """Read index.jsp again within the current session, to pick up changes to
+        the firewall info and licenses. Logs in if there is no session, or if the
+        session has expired.
+        """
+        if not self.csrf_token or not self.address:
+            return self.get_info()
+
+        tstart = time.perf_counter()
+        req = _make_req(load_definition("GET_INDEX_JSP"), self.address)  # type: ignore
+        rsp = self.send_request(req)
+        if rsp.error and isinstance(rsp.error, _ex.AgentConnectionError):
+            return rsp
+        fwinfo = self._index_info(rsp)
+        if fwinfo is None:
+            result = self.get_info()
+            result.timings = [*rsp.timings, *result.timings]
+            return result
+        return self._refreshed(req, rsp, fwinfo, tstart)
+
+    def _index_info(self, rsp: SfosResponse) -> _fwi | None:
+        """Parse index.jsp read within the current session. Drops the session and
+        returns None if the firewall redirected to the login page.
+        """
+        fwinfo = None
+        if rsp.success and rsp.text:
+            try:
+                tparse = time.perf_counter()
+                fwinfo = _parse_index(rsp.text)
+                if rsp.timings:
+                    rsp.timings[-1].add_parse(tparse)
+            except _ex.AgentError:
+                fwinfo = None
+        if fwinfo is None or fwinfo.csrf_token is None:
+            host = self.address.hostname if self.address else "?"
+            logtrace(host=host, msg="session expired, logging in")
+            self.drop_session()
+            return None
+        return fwinfo
+
+    def _refreshed(
+        self, req: _req, rsp: SfosResponse, fwinfo: _fwi, tstart: float
+    ) -> SfosResponse:
+        self.info = fwinfo
+        self.csrf_token = fwinfo.csrf_token
+        return SfosResponse(
+            fw=self,
+            request=req,
+            response=rsp.response,
+            data=fwinfo,
+            timer=int(ms_since(tstart)),
+            timings=rsp.timings,
+            retries=rsp.retries,
+            trace="241",
+        )
+
+    def drop_session(self) -> None:
+        """Forget the webadmin session, so that the next request logs in again"""
+        if self.session_cache is not None and self.credentials and self.address:
+            self.session_cache.discard(self.target())
+        self.csrf_token = None
+        self.info = None
+        self.cookies = {}
+
     def _get_login_req_cmds(self) -> list[_req]:
         if not self.address:
             logerror("No address")
@@ -272,8 +386,45 @@ class Connector:
         }
         return result
 
+    @staticmethod
+    def _download_filename(headers) -> str:
+        if "Content-Disposition" in headers and "filename=" in str(
+            headers["Content-Disposition"]
+        ):
+            fn_header = str(headers["Content-Disposition"])
+            filename = fn_header.split("filename=")[1]
+            return f"{filename}.sfos"
+        return "unknown.sfos"
+
+    def _check_resumed_session(self, response) -> bool:
+        """Validate a resumed session against the first response sent with it
+
+        Returns:
+            bool: True if the firewall rejected the session. It has been discarded,
+                  and the request should be sent again after a new login.
+        """
+        if not self._resumed or response is None:
+            return False
+        self._resumed = False
+        target = self.target()
+        text = getattr(response, "text", "") or ""
+        if response.status_code in (401, 403) or _c.SESSION_EXPIRED_MSG in (
+            f"{response.url} {text[:512]}"
+        ):
+            logtrace(host=target, msg="cached session rejected, logging in again")
+            self.drop_session()
+            return True
+        if self.session_cache is not None:
+            self.session_cache.touch(target)
+        return False
+
+    def _set_csrf_header(self, req: _req) -> None:
+        if self.csrf_token:
+            req.headers.pop(_c.CSRF_TOKEN, None)
+            req.headers[_c.CSRF_TOKEN] = self.csrf_token
+
     def _ensure_session(self, session: _session | None = None) -> Literal[True]:
-        self.session = session or self.session or _session()
+        self.session = session or self.session or _new_session()
         assert self.session is not None
         return True
 
@@ -288,15 +439,51 @@ class Connector:
         return True
 
     def send_request(self, req: _req, session: _session | None = None) -> SfosResponse:
-        tstart = datetime.now()
+        """Send a request, and send it again after transient errors allowed by
+        the retry policy. Waiting for a retry only holds up this firewall.
+
+        Returns:
+            SfosResponse: Response to the last attempt, with the timings of all
+                          attempts
+        """
+        tstart = time.perf_counter()
+        timings: list[RequestTimings] = []
+        retries = 0
+        while True:
+            result = self._send_once(req, session)
+            timings.extend(result.timings)
+            delay = self.retry_policy.next_delay(
+                req, result.error, retries + 1, time.perf_counter() - tstart
+            )
+            if delay is None:
+                break
+            retries += 1
+            self._log_retry(req, result, retries, delay)
+            time.sleep(delay)
+        result.timings = timings
+        result.retries = retries
+        return result
+
+    def _log_retry(
+        self, req: _req, result: SfosResponse, retry: int, delay: float
+    ) -> None:
+        logtrace(
+            host=self.address.hostname if self.address else "?",
+            msg="retrying request",
+            url=req.url,
+            error=type(result.error).__name__,
+            retry=retry,
+            delay=f"{delay:.3f}",
+        )
+
+    def _send_once(self, req: _req, session: _session | None = None) -> SfosResponse:
+        tstart = time.perf_counter()
+        timings = RequestTimings(url=req.url)
         assert self._ensure_session(session)
         if self.cookies and self.session:
             # reload saved session cookies if there are any
             cookies = _cookiejar_from_dict(self.cookies)
             self.session.cookies.update(cookies)
-        if self.csrf_token:
-            req.headers.pop(_c.CSRF_TOKEN, None)
-            req.headers[_c.CSRF_TOKEN] = self.csrf_token
 
         # Build request arguments dict
         request_contents = self._get_request_args(request=req)
@@ -307,6 +494,7 @@ class Connector:
             self._ensure_authenticated()
             if not self.session:
                 raise _req_ex.ConnectionError("Not Authenticated")
+            self._set_csrf_header(req)
             if req.method == "get":
                 method = self.session.get
             else:
@@ -314,15 +502,7 @@ class Connector:
             if req.special == "download":
                 with method(stream=True, **request_contents) as r:
                     r.raise_for_status()
-                    if (
-                        "Content-Disposition" in r.headers
-                        and "filename=" in r.headers["Content-Disposition"]
-                    ):
-                        fn_header = str(r.headers["Content-Disposition"])
-                        filename = fn_header.split("filename=")[1]
-                        filename = f"{filename}.sfos"
-                    else:
-                        filename = "unknown.sfos"
+                    filename = self._download_filename(r.headers)
                     print("downloading", filename)
                     with open(filename, "wb") as f:
                         for chunk in r.iter_content(chunk_size=8192):
@@ -336,7 +516,8 @@ class Connector:
                             trace=f"conn-{trace}",
                         )
             else:
-                response = method(**request_contents)
+                with timings.measure_request():
+                    response = method(**request_contents)
 
             self.cookies = _dict_from_cookiejar(
                 self.session.cookies
@@ -360,11 +541,17 @@ class Connector:
             error = (247, ex)
 
         finally:
-            timer = int((datetime.now() - tstart).microseconds / 1000)
+            timer = int(ms_since(tstart))
             if error:
                 (trace, error) = error
 
-        return SfosResponse(
+        if self._check_resumed_session(response):
+            self.session = None
+            return self._send_once(req)
+
+        return self._timed_response(
+            tstart,
+            timings,
             fw=self,
             request=req,
             response=response,
@@ -373,6 +560,20 @@ class Connector:
             trace=f"conn-{trace}",
         )
 
+    @staticmethod
+    def _timed_response(
+        tstart: float, timings: RequestTimings, **kwargs
+    ) -> SfosResponse:
+        """Create the SfosResponse for a sent request, timing the text extraction
+        as its parse phase. Shared by all transports.
+        """
+        tparse = time.perf_counter()
+        result = SfosResponse(timings=[timings], **kwargs)
+        timings.add_parse(tparse)
+        timings.status_code = result.status_code
+        timings.total_ms = ms_since(tstart)
+        return result
+
     def send_requests(
         self, *reqs: _req, session: _session | None = None
     ) -> list[SfosResponse]:
@@ -11,11 +11,15 @@ License.
 
 # pylint: disable=broad-exception-caught
 from __future__ import annotations
+import copy
 import json
 import os
+import threading
 import time
+import weakref
+from collections import OrderedDict
 from requests import Session
-from typing import Literal
+from typing import Any, Callable, Literal
 from urllib import parse
 
 from sfos.logging.logging import log, Level
@@ -27,6 +31,7 @@ from sfos.static import (
 )
 from sfos.objects.req_definition import Definition as _srdef
 from sfos.objects.sfos_request import SfosRequest as _req
+from sfos.webadmin.retry_policy import is_idempotent
 
 
 separators = {True: "&", False: "\n"}
@@ -42,10 +47,68 @@ header_defs = {
 }
 
 
+class TemplateRegistry:
+    """Thread-safe in-memory cache of values built from template files
+
+    A cached value is rebuilt when the modification time or size of any file it
+    was built from changes, so edited templates are picked up without a restart.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[Any, tuple[tuple, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, files: list[str], build: Callable[[], Any]) -> Any:
+        """Get the cached value for key, building it if files have changed
+
+        Args:
+            key (Any): Cache key
+            files (list[str]): Files the value is built from
+            build (Callable[[], Any]): Creates the value. Must not be mutated later.
+
+        Returns:
+            Any: cached or newly built value
+        """
+        stamp = _file_stamps(files)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] == stamp:
+            return entry[1]
+
+        value = build()
+        with self._lock:
+            self._entries[key] = (stamp, value)
+        return value
+
+    def clear(self) -> None:
+        """Drop all cached values"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _file_stamps(files: list[str]) -> tuple:
+    stamps = []
+    for filename in files:
+        try:
+            st = os.stat(filename)
+            stamps.append((filename, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append((filename, None, None))
+    return tuple(stamps)
+
+
+templates = TemplateRegistry()
+
+
 def get_common_headers(method: Literal["get", "post"], path: str = HEADER_PATH) -> dict:
-    h_common = load_json_data(header_defs["common"], path)
-    h_method = load_json_data(header_defs[method], path)
-    return {**h_common, **h_method}
+    files = [os.path.join(path, header_defs[name]) for name in ("common", method)]
+
+    def build() -> dict:
+        h_common = load_json_data(header_defs["common"], path)
+        h_method = load_json_data(header_defs[method], path)
+        return {**h_common, **h_method}
+
+    return dict(templates.get(("headers", method, path), files, build))
 
 
 def _find_file(name: str, paths: list[str]) -> str | None:
@@ -78,10 +141,16 @@ def load_request_object_data(
         raise _ex.NoMatchFound(f"No request object found for '{command}'")
 
     # load the object from file
-    data = load_json_data(name=command, path=path)
+    filename = os.path.join(path, command)
+    data = templates.get(
+        ("req_objects", filename),
+        [filename],
+        lambda: load_json_data(name=command, path=path),
+    )
     if name not in data["req_objects"]:
         raise _ex.NoMatchFound(f"Request object '{name}' not found for '{command}'")
-    return data["req_objects"][name]
+    # callers may modify the returned object
+    return copy.deepcopy(data["req_objects"][name])
 
 
 def load_definition(
@@ -114,13 +183,24 @@ def load_definition(
         )
         raise _ex.DefinitionNotFound("Definition not found:", name)
 
-    log(level=Level.INFO, action="load_definition", definition=name, file=filepath)
+    header_file = (
+        header_path
+        if isinstance(header_path, str)
+        else _find_file(header_defs["common"], header_path) or HEADER_PATH
+    )
+    files = [os.path.join(filepath, name)]
+    files.extend(os.path.join(header_file, fn) for fn in header_defs.values())
 
-    def_data = load_json_data(name, filepath)
-    if isinstance(def_data, list):
-        return [_dict_to_def(item) for item in def_data]
-    else:
-        return _dict_to_def(def_data)
+    def build() -> _srdef | tuple[_srdef, ...]:
+        log(level=Level.INFO, action="load_definition", definition=name, file=filepath)
+        def_data = load_json_data(name, filepath)
+        if isinstance(def_data, list):
+            return tuple(_dict_to_def(item, header_file) for item in def_data)
+        return _dict_to_def(def_data, header_file)
+
+    # Definitions are immutable, so cached instances are shared by all callers
+    result = templates.get(("definition", filepath, name, header_file), files, build)
+    return list(result) if isinstance(result, tuple) else result
 
 
 def _dict_to_def(
@@ -131,7 +211,10 @@ def _dict_to_def(
     accepts:
       req_dict: dict    Values to use when creating a Definition class instance"""
     header_path = header_path or HEADER_PATH
+    if not isinstance(header_path, str):
+        header_path = _find_file(header_defs["common"], header_path) or HEADER_PATH
     common_headers = get_common_headers(req_dict["web_method"], header_path)
+    req_dict = dict(req_dict)
 
     # convert int to enum
     if "req_mode" in req_dict:
@@ -203,50 +286,6 @@ def _prepare_req_headers(headers: dict[str, str], address: _sa) -> dict[str, str
     return results
 
 
-def _prepare_request_conent(
-    definition: _srdef, req_data: str | None = None
-) -> list[str]:
-    # Prepare all SfosRequest components:
-    # [mode=x, operation=y, json=z, __requesttype=ajax],
-
-    # Early return if no req_data
-    if definition.req_mode == _req_mode.NONE:
-        return []
-
-    result = [f"mode={str(definition.req_mode.value)}"]
-    if definition.req_operation != _req_oper.NONE:
-        result.append("operation=" + str(definition.req_operation.value))
-    if definition.req_object:
-        result.append("requestObj=" + str(definition.req_object))
-    if req_data and (definition.web_method == "get" or definition.urlencode):
-        # req_data becomes query string if method = get or urlencode is enabled
-        if not isinstance(req_data, str):
-            req_data = json.dumps(req_data)
-        req_data = parse.quote(req_data)
-    if req_data:
-        result.append(f"json={req_data}")
-
-    result.append("__RequestType=ajax")
-    result.append(f"t={int(time.time())}")
-    return result
-
-
-def _assemble_request_content(definition: _srdef, req_data: str | None = None) -> str:
-    """Assembles a SfosRequest by preparing its individual parts,
-    then assembling the list of parts into a final string"""
-
-    # Prepare all SfosRequest components
-    result = _prepare_request_conent(definition, req_data)
-    if result == []:
-        return ""
-    separator = definition.separator or separators[definition.urlencode]
-
-    # combine result list into a single string
-    req_content = separator.join(result)
-
-    return req_content
-
-
 def make_sfos_request_from_template(
     command: str,
     address: _sa,
@@ -257,8 +296,12 @@ def make_sfos_request_from_template(
     command_paths = command_paths or REQ_TEMPLATE_PATH
 
     req_defs = load_definition(command, command_paths)
-    if request_object:
-        req_defs.req_object = load_request_object_data(command, request_object)
+    if request_object and isinstance(req_defs, list):
+        req_object = load_request_object_data(command, request_object)
+        req_defs = [req_def.replace(req_object=req_object) for req_def in req_defs]
+    elif request_object:
+        req_object = load_request_object_data(command, request_object)
+        req_defs = req_defs.replace(req_object=req_object)
 
     if isinstance(req_defs, list):
         return [make_sfos_request(req_def, address, data) for req_def in req_defs]
@@ -273,25 +316,100 @@ def make_sfos_request(
 ) -> _req:
     """Compiles the SfosRequest data, url, method, and headers
     needed to execute the SfosRequest"""
+    return compile_definition(definition).render(address, data)
 
-    url = None
-    data = _assemble_request_content(definition, data)
-    if definition.web_method == "get":
-        url = address.url(definition.path, data)
-        data = None
-    else:
-        url = address.url(definition.path)
-
-    data = _req(
-        url=url,
-        headers=_prepare_req_headers(definition.web_headers, address),
-        method=definition.web_method,
-        body=data,
-        verify=address.verify_tls,
-        timeout=address.timeout,
-        special=definition.special,
-    )
-    return data
+
+class CompiledDefinition:
+    """A Definition prepared for rendering many requests
+
+    The static body fragments are built once per definition, and the url and
+    headers once per firewall address. Rendering a request then only adds the
+    request data and timestamp.
+    """
+
+    MAX_ADDRESSES = 16384
+
+    def __init__(self, definition: _srdef) -> None:
+        self.definition = definition
+        self.has_content = definition.req_mode != _req_mode.NONE
+        self.quote_data = definition.web_method == "get" or bool(definition.urlencode)
+        self.separator = definition.separator or separators[definition.urlencode]
+        prefix = [f"mode={str(definition.req_mode.value)}"]
+        if definition.req_operation != _req_oper.NONE:
+            prefix.append("operation=" + str(definition.req_operation.value))
+        if definition.req_object:
+            prefix.append("requestObj=" + str(definition.req_object))
+        self.prefix = self.separator.join(prefix)
+        self.suffix = f"{self.separator}__RequestType=ajax{self.separator}t="
+        self.idempotent = is_idempotent(
+            definition.web_method, definition.req_mode, definition.special
+        )
+        self._addresses: OrderedDict[tuple, tuple[str, dict[str, str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def content(self, req_data: str | None = None) -> str:
+        """Request body of the definition with req_data: its mode, operation,
+        requestObj, json, __RequestType and t fields, joined by its separator"""
+        if not self.has_content:
+            return ""
+        if req_data and self.quote_data:
+            if not isinstance(req_data, str):
+                req_data = json.dumps(req_data)
+            req_data = parse.quote(req_data)
+        data = f"{self.separator}json={req_data}" if req_data else ""
+        return f"{self.prefix}{data}{self.suffix}{int(time.time())}"
+
+    def for_address(self, address: _sa) -> tuple[str, dict[str, str]]:
+        """Url and prepared headers for address. The headers must not be modified."""
+        key = (address.hostname, address.port)
+        with self._lock:
+            cached = self._addresses.get(key)
+            if cached:
+                self._addresses.move_to_end(key)
+                return cached
+        cached = (
+            address.url(self.definition.path),
+            _prepare_req_headers(self.definition.web_headers, address),
+        )
+        with self._lock:
+            self._addresses[key] = cached
+            if len(self._addresses) > self.MAX_ADDRESSES:
+                self._addresses.popitem(last=False)
+        return cached
+
+    def render(self, address: _sa, data: str | None = None) -> _req:
+        """Create the SfosRequest for address"""
+        url, headers = self.for_address(address)
+        body: str | None = self.content(data)
+        if self.definition.web_method == "get":
+            url = f"{url}?{parse.quote(body)}" if body else url  # type: ignore
+            body = None
+
+        return _req(
+            url=url,
+            headers=dict(headers),
+            method=self.definition.web_method,
+            body=body,
+            verify=address.verify_tls,
+            timeout=address.request_timeout,
+            special=self.definition.special,
+            idempotent=self.idempotent,
+        )
+
+
+_compiled: weakref.WeakKeyDictionary[_srdef, CompiledDefinition] = (
+    weakref.WeakKeyDictionary()
+)
+_compiled_lock = threading.Lock()
+
+
+def compile_definition(definition: _srdef) -> CompiledDefinition:
+    """Get the CompiledDefinition for a definition, compiling it on first use"""
+    with _compiled_lock:
+        compiled = _compiled.get(definition)
+        if compiled is None:
+            compiled = _compiled[definition] = CompiledDefinition(definition)
+        return compiled
 
 
 def download_file(session: Session, url: str):
@@ -0,0 +1,112 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+from dataclasses import dataclass, field
+
+from sfos.objects.sfos_request import SfosRequest as _req
+from sfos.static import exceptions as _ex, SfosMode as _req_mode
+
+RETRY_CONNECT_ATTEMPTS = int(os.getenv("GC_RETRY_CONNECT_ATTEMPTS", "3"))
+RETRY_READ_ATTEMPTS = int(os.getenv("GC_RETRY_READ_ATTEMPTS", "2"))
+RETRY_CONNECTION_ATTEMPTS = int(os.getenv("GC_RETRY_CONNECTION_ATTEMPTS", "2"))
+RETRY_BACKOFF = float(os.getenv("GC_RETRY_BACKOFF", "0.5"))
+RETRY_MAX_BACKOFF = float(os.getenv("GC_RETRY_MAX_BACKOFF", "5"))
+RETRY_DEADLINE = float(os.getenv("GC_RETRY_DEADLINE", "15"))
+
+# Modes that only read from the firewall, so sending them twice is harmless
+READ_ONLY_MODES = frozenset(
+    {
+        _req_mode.NONE,
+        _req_mode.READ_RECORD,
+        _req_mode.manage_page_detail,
+        _req_mode.GET_SYSTEM_GRAPH,
+        _req_mode.GET_HA_TYPE,
+        _req_mode.HEARTBEAT_STATUS,
+        _req_mode.SERVICE_STATUS,
+    }
+)
+
+
+def _default_attempts() -> dict[type[Exception], int]:
+    return {
+        _ex.ConnectionTimeoutError: RETRY_CONNECT_ATTEMPTS,
+        _ex.ReadTimeoutError: RETRY_READ_ATTEMPTS,
+        _ex.NameResolutionError: 1,
+        _ex.AgentConnectionError: RETRY_CONNECTION_ATTEMPTS,
+    }
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """When and how long to wait before sending a failed request again
+
+    Args:
+        attempts (dict[type[Exception], int]): Total attempts per error class. An
+            error uses the entry of its closest class. Errors without an entry are
+            not retried.
+        backoff (float): Upper bound in seconds of the first jittered wait. Doubles
+            with every retry. Defaults to GC_RETRY_BACKOFF or 0.5.
+        max_backoff (float): Longest upper bound of a wait.
+            Defaults to GC_RETRY_MAX_BACKOFF or 5.
+        deadline (float): No retry starts later than this many seconds after the
+            first attempt. Defaults to GC_RETRY_DEADLINE or 15.
+        always_retry (tuple[type[Exception], ...]): Errors raised before the request
+            was sent, that are retried for every request. Others are only retried
+            for idempotent requests.
+    """
+
+    attempts: dict[type[Exception], int] = field(default_factory=_default_attempts)
+    backoff: float = RETRY_BACKOFF
+    max_backoff: float = RETRY_MAX_BACKOFF
+    deadline: float = RETRY_DEADLINE
+    always_retry: tuple[type[Exception], ...] = (_ex.ConnectionTimeoutError,)
+
+    def max_attempts(self, error: Exception) -> int:
+        """Total attempts allowed for requests failing with this error"""
+        for cls in type(error).__mro__:
+            if cls in self.attempts:
+                return self.attempts[cls]
+        return 1
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before retry number 'retry', with full jitter"""
+        cap = min(self.backoff * 2 ** (retry - 1), self.max_backoff)
+        return random.uniform(0, cap)
+
+    def next_delay(
+        self, req: _req, error: Exception | None, attempt: int, elapsed: float
+    ) -> float | None:
+        """Seconds to wait before sending req again after 'attempt' attempts
+
+        Returns:
+            float | None: None if the request should not be sent again
+        """
+        if error is None or attempt >= self.max_attempts(error):
+            return None
+        if not (req.idempotent or isinstance(error, self.always_retry)):
+            return None
+        wait = self.delay(attempt)
+        if elapsed + wait >= self.deadline:
+            return None
+        return wait
+
+
+NO_RETRY = RetryPolicy(attempts={})
+default_retry_policy = RetryPolicy()
+
+
+def is_idempotent(method: str, mode: _req_mode, special: str | None = None) -> bool:
+    """A request that can be sent again without changing the firewall"""
+    return special != "download" and (method == "get" or mode in READ_ONLY_MODES)
@@ -0,0 +1,195 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+# pylint: disable=broad-exception-caught
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from sfos.logging.logging import logtrace, logerror
+from sfos.static import constants as _c
+
+DEFAULT_SESSION_CACHE_FILE = os.getenv(
+    "GC_SESSION_CACHE_FILE", "./ground_control.sessions"
+)
+DEFAULT_SESSION_CACHE_TTL = float(os.getenv("GC_SESSION_CACHE_TTL", "600"))
+
+
+def _config_dir() -> Path:
+    if os.name == "nt":
+        base = os.getenv("APPDATA") or Path.home()
+    else:
+        base = os.getenv("XDG_CONFIG_HOME") or Path.home() / ".config"
+    return Path(base) / "sfos-ground-control"
+
+
+# kept away from the cache file: a key stored next to it would protect nothing
+DEFAULT_SESSION_CACHE_KEY_FILE = _config_dir() / "session_cache.key"
+
+
+class SessionCache:
+    """Encrypted on-disk cache of webadmin sessions, keyed by username@address
+
+    Each entry holds the session cookies and csrf token from a successful login, in
+    the form accepted by Connector(resume_session=...). Entries that have not been
+    used for 'ttl' seconds are evicted.
+
+    Args:
+        filename (str | None): Cache file. Defaults to GC_SESSION_CACHE_FILE or
+                               ./ground_control.sessions
+        key (str | bytes | None): Fernet key used to encrypt the cache. Defaults to
+                               GC_SESSION_CACHE_KEY, or the key in 'key_file'
+        ttl (float | None): Seconds an unused session is kept.
+                            Defaults to GC_SESSION_CACHE_TTL or 600.
+        key_file (str | None): Key generated on first use, readable only by the
+                               current user. Defaults to session_cache.key in the
+                               user config dir, e.g. ~/.config/sfos-ground-control
+
+    Raises:
+        PermissionError: if the key file can be read by other users
+    """
+
+    def __init__(
+        self,
+        filename: str | None = None,
+        key: str | bytes | None = None,
+        ttl: float | None = None,
+        key_file: str | None = None,
+    ) -> None:
+        self.filename = Path(filename or DEFAULT_SESSION_CACHE_FILE)
+        self.ttl = DEFAULT_SESSION_CACHE_TTL if ttl is None else ttl
+        self.key_file = Path(key_file or DEFAULT_SESSION_CACHE_KEY_FILE)
+        self._fernet = Fernet(key or os.getenv("GC_SESSION_CACHE_KEY") or self._key())
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: dict[str, dict] = self._load()
+
+    def get(self, target: str) -> dict | None:
+        """Get a cached session for target
+
+        Returns:
+            dict | None: cookies and csrf token, or None if there is no live session
+        """
+        with self._lock:
+            entry = self._entries.get(target)
+            if entry and self._expired(entry, time.time()):
+                logtrace(f"session cache entry for {target} expired")
+                del self._entries[target]
+                self._dirty = True
+                entry = None
+            if not entry:
+                return None
+            return {**entry["cookies"], _c.CSRF_TOKEN: entry["csrf_token"]}
+
+    def put(self, target: str, cookies: dict, csrf_token: str) -> None:
+        """Save the session established by a successful login"""
+        with self._lock:
+            self._entries[target] = {
+                "cookies": dict(cookies),
+                "csrf_token": csrf_token,
+                "used": time.time(),
+            }
+            self._dirty = True
+
+    def touch(self, target: str) -> None:
+        """Mark a cached session as used, extending its ttl"""
+        with self._lock:
+            if target in self._entries:
+                self._entries[target]["used"] = time.time()
+                self._dirty = True
+
+    def discard(self, target: str) -> None:
+        """Remove a session that the firewall no longer accepts"""
+        with self._lock:
+            if self._entries.pop(target, None):
+                self._dirty = True
+
+    def save(self) -> None:
+        """Write the cache to disk if it has changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            entries = {
+                k: v for k, v in self._entries.items() if not self._expired(v, now)
+            }
+            token = self._fernet.encrypt(json.dumps(entries).encode("utf-8"))
+            tmpfile = self.filename.with_name(f"{self.filename.name}.tmp")
+            _write_private(tmpfile, token)
+            os.replace(tmpfile, self.filename)
+            self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return now - entry.get("used", 0) > self.ttl
+
+    def _load(self) -> dict[str, dict]:
+        if not self.filename.is_file():
+            return {}
+        try:
+            data = self._fernet.decrypt(self.filename.read_bytes())
+            return json.loads(data)
+        except (InvalidToken, ValueError) as e:
+            logerror(f"Ignoring unreadable session cache {self.filename}: {e!r}")
+            return {}
+
+    def _key(self) -> bytes:
+        keyfile = self.key_file
+        if keyfile.is_file():
+            if os.name != "nt" and keyfile.stat().st_mode & 0o077:
+                raise PermissionError(
+                    f"{keyfile} must only be readable by its owner (chmod 600)"
+                )
+            return keyfile.read_bytes().strip()
+        keyfile.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        key = Fernet.generate_key()
+        _write_private(keyfile, key)
+        return key
+
+
+def _write_private(filename: Path, data: bytes) -> None:
+    """Write a file readable only by the current user"""
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+
+
+_cache: SessionCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_session_cache() -> SessionCache | None:
+    """Get the process-wide SessionCache, created on first use and saved at exit.
+
+    Returns:
+        SessionCache | None: None if disabled with GC_SESSION_CACHE_TTL=0
+    """
+    global _cache
+    if DEFAULT_SESSION_CACHE_TTL <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = SessionCache()
+                atexit.register(_cache.save)
+            except Exception as e:
+                logerror(f"Session cache unavailable: {e!r}")
+                return None
+        return _cache
@@ -0,0 +1,172 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests import Session as _session
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from sfos.logging.logging import logtrace
+from sfos.webadmin.timings import TimedHTTPAdapter
+
+DEFAULT_POOL_SIZE = int(os.getenv("GC_POOL_SIZE", "10"))
+DEFAULT_POOL_IDLE_TIMEOUT = float(os.getenv("GC_POOL_IDLE_TIMEOUT", "60"))
+DEFAULT_POOL_MAX_LIFETIME = float(os.getenv("GC_POOL_MAX_LIFETIME", "600"))
+
+
+class _HostPool:
+    """Connection pool for a single scheme://host:port"""
+
+    def __init__(self, pool_size: int) -> None:
+        self.adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    def expired(self, now: float, idle_timeout: float, max_lifetime: float) -> bool:
+        return (
+            now - self.last_used > idle_timeout or now - self.created > max_lifetime
+        )
+
+
+class SessionPool:
+    """Process-wide keep-alive connection pools, one per firewall host
+
+    Sessions created by SessionPool.session() keep their own cookies, but send
+    requests through connections shared with every other session to the same
+    host, so repeated logins and scripts skip the tcp and tls handshakes.
+
+    Args:
+        pool_size (int | None): Connections kept open per host.
+                                Defaults to GC_POOL_SIZE or 10.
+        idle_timeout (float | None): Seconds a host pool may sit unused before its
+                                connections are closed.
+                                Defaults to GC_POOL_IDLE_TIMEOUT or 60.
+        max_lifetime (float | None): Seconds after which a host pool is closed and
+                                replaced, regardless of use.
+                                Defaults to GC_POOL_MAX_LIFETIME or 600.
+    """
+
+    # seconds between sweeps for expired pools of hosts no longer requested
+    SWEEP_INTERVAL = 30.0
+
+    def __init__(
+        self,
+        pool_size: int | None = None,
+        idle_timeout: float | None = None,
+        max_lifetime: float | None = None,
+    ) -> None:
+        self.pool_size = pool_size or DEFAULT_POOL_SIZE
+        self.idle_timeout = (
+            DEFAULT_POOL_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        )
+        self.max_lifetime = (
+            DEFAULT_POOL_MAX_LIFETIME if max_lifetime is None else max_lifetime
+        )
+        self._hosts: dict[str, _HostPool] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + self.SWEEP_INTERVAL
+
+    def session(self) -> _session:
+        """Create a requests Session that borrows connections from this pool"""
+        session = _session()
+        adapter = _PooledAdapter(self)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def adapter_for(self, url: str) -> HTTPAdapter:
+        """Get the shared adapter for the host in url, replacing it first if it has
+        been idle or open for too long. Pools of other hosts are only checked by a
+        sweep, at most once every SWEEP_INTERVAL seconds."""
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}".lower()
+        now = time.monotonic()
+        closing = []
+        with self._lock:
+            host = self._hosts.get(key)
+            if host is not None and host.expired(
+                now, self.idle_timeout, self.max_lifetime
+            ):
+                closing.append((key, host))
+                host = None
+            if host is None:
+                logtrace(f"creating connection pool for {key}")
+                host = self._hosts[key] = _HostPool(self.pool_size)
+            host.last_used = now
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.SWEEP_INTERVAL
+                closing += self._evict(now)
+        # closing connections can block: leave the lock to other requests
+        for expired_key, expired in closing:
+            logtrace(f"closing connection pool for {expired_key}")
+            expired.adapter.close()
+        return host.adapter
+
+    def hosts(self) -> list[str]:
+        """Hosts that currently have a connection pool"""
+        with self._lock:
+            return list(self._hosts)
+
+    def clear(self) -> None:
+        """Close all pooled connections"""
+        with self._lock:
+            for host in self._hosts.values():
+                host.adapter.close()
+            self._hosts.clear()
+
+    def _evict(self, now: float) -> list[tuple[str, _HostPool]]:
+        """Remove expired host pools and return them, to be closed by the caller"""
+        expired = [
+            (key, host)
+            for key, host in self._hosts.items()
+            if host.expired(now, self.idle_timeout, self.max_lifetime)
+        ]
+        for key, _ in expired:
+            del self._hosts[key]
+        return expired
+
+
+class _PooledAdapter(BaseAdapter):
+    """Session adapter that forwards each request to the shared host pool.
+    Closing a session does not close the shared connections."""
+
+    def __init__(self, pool: SessionPool) -> None:
+        super().__init__()
+        self.pool = pool
+
+    def send(self, request, **kwargs):  # type: ignore[override]
+        return self.pool.adapter_for(request.url).send(request, **kwargs)
+
+    def close(self) -> None:
+        pass
+
+
+_pool: SessionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """Get the process-wide SessionPool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool()
+        return _pool
+
+
+def new_session() -> _session:
+    """Create a requests Session using the process-wide SessionPool"""
+    return get_session_pool().session()
@@ -0,0 +1,125 @@
+"""SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+Transports that record connection phases into RequestTimings.measure_request()
+"""
+
+from __future__ import annotations
+
+import socket
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, NewConnectionError
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+from sfos.objects.request_timings import RequestTimings, current_timings, ms_since
+
+
+class _TimedConnectionMixin:
+    """Time name resolution and the tcp connect separately, then the tls handshake"""
+
+    _dns_host: str
+    host: str
+    port: int
+
+    def _new_conn(self) -> socket.socket:
+        timings = current_timings.get()
+        if timings is None:
+            return super()._new_conn()  # type: ignore[misc]
+
+        timings.reused = False
+        tstart = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(
+                self._dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM
+            )
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e  # type: ignore
+        finally:
+            timings.dns_ms = ms_since(tstart)
+
+        # Connect to the resolved addresses in turn, as urllib3 would
+        tstart = time.perf_counter()
+        dns_host = self._dns_host
+        error: Exception | None = None
+        try:
+            for address in dict.fromkeys(sockaddr[0] for *_, sockaddr in addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()  # type: ignore[misc]
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+            raise error or OSError("getaddrinfo returns an empty list")
+        finally:
+            self._dns_host = dns_host
+            timings.connect_ms = ms_since(tstart)
+
+    def connect(self) -> None:
+        timings = current_timings.get()
+        tstart = time.perf_counter()
+        super().connect()  # type: ignore[misc]
+        if timings is not None and isinstance(self, HTTPSConnection):
+            elapsed = ms_since(tstart)
+            timings.tls_ms = round(
+                max(elapsed - (timings.dns_ms or 0) - (timings.connect_ms or 0), 0), 3
+            )
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose new connections report dns, connect and tls timings"""
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def httpx_trace(timings: RequestTimings):
+    """Build an httpx 'trace' extension that records connection phases.
+    httpcore resolves names inside connect_tcp, so dns time is part of connect_ms.
+    """
+    started: dict[str, float] = {}
+
+    async def trace(event: str, info: dict) -> None:
+        name, _, state = event.rpartition(".")
+        if name == "connection.connect_tcp" or name == "connection.start_tls":
+            if state == "started":
+                started[name] = time.perf_counter()
+            elif state == "complete" and name in started:
+                elapsed = ms_since(started[name])
+                timings.reused = False
+                if name == "connection.connect_tcp":
+                    timings.connect_ms = elapsed
+                else:
+                    timings.tls_ms = elapsed
+
+    return trace
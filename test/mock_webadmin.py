@@ -0,0 +1,475 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+
+Local stand-in for SFOS WebAdmin, for load and benchmark tests without a firewall.
+
+Serves the ADMIN_LOGIN controller request, index.jsp, HEARTBEAT_STATUS,
+GET_SYSTEM_GRAPH and backup downloads over HTTPS from a single event loop thread.
+Each distinct Host header is a separate virtual firewall with its own serial number
+and sessions. Virtual firewalls are reached on different ports, or on Linux by
+binding to 0.0.0.0 and connecting to different loopback addresses (127.0.x.y).
+
+    with MockWebAdmin(ports=4, behavior=MockBehavior(latency=0.05)) as webadmin:
+        firewalls = webadmin.connectors(4)
+
+Run from the repository root to serve until interrupted:
+
+    python -m test.mock_webadmin --ports 100 --latency 0.05 --failure-rate 0.01
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import random
+import secrets
+import ssl
+import tempfile
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib import parse
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from sfos.objects.firewall_info import parse_index
+from sfos.static import constants as _c
+from sfos.static import SfosMode as _mode
+from sfos.webadmin import Connector
+
+INDEX = (Path(__file__).parent / "samples" / "test_v20_ga_index.jsp").read_text()
+INDEX_CSRF_TOKEN = parse_index(INDEX).csrf_token or ""
+INDEX_SERIAL = "V01001AZAZAZ999"
+LOGIN_PAGE = b"<html><body>/webpages/login.jsp</body></html>"
+MAX_HEADER_SIZE = 64 * 1024
+
+PATH_CONTROLLER = "/webconsole/Controller"
+PATH_INDEX_JSP = "/webconsole/webpages/index.jsp"
+PATH_LOGIN_JSP = "/webconsole/webpages/login.jsp"
+
+
+@dataclass
+class MockBehavior:
+    """How the virtual firewalls respond
+
+    Args:
+        latency (float): Seconds added before every response
+        jitter (float): Up to this many seconds added at random to latency
+        failure_rate (float): Fraction of requests answered by dropping the
+                              connection without a response
+        captcha (str | None): If set, logins must include this captcha value
+        disclaimer (bool): Logins return a disclaimer that must be accepted
+        username (str): Accepted username
+        password (str): Accepted password
+        backup_size (int): Size in bytes of a downloaded backup file
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    failure_rate: float = 0.0
+    captcha: str | None = None
+    disclaimer: bool = False
+    username: str = "admin"
+    password: str = "mock-password"
+    backup_size: int = 64 * _c.KB
+
+
+@dataclass
+class VirtualFirewall:
+    """State of one simulated firewall"""
+
+    host: str
+    serial: str
+    sessions: dict[str, str] = field(default_factory=dict)
+    logins: Counter[str] = field(default_factory=Counter)
+    requests: Counter[str] = field(default_factory=Counter)
+
+    def index(self, csrf_token: str) -> bytes:
+        page = INDEX.replace(INDEX_CSRF_TOKEN, csrf_token)
+        return page.replace(INDEX_SERIAL, self.serial).encode("utf-8")
+
+
+@dataclass
+class _Request:
+    method: str
+    path: str
+    params: dict[str, str]
+    headers: dict[str, str]
+
+    @property
+    def session_id(self) -> str | None:
+        for cookie in self.headers.get("cookie", "").split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == _c.JSESSIONID:
+                return value
+        return None
+
+
+@dataclass
+class _Response:
+    status: int = 200
+    body: bytes = b""
+    headers: dict[str, str] = field(default_factory=dict)
+    reason: str = "OK"
+
+    @classmethod
+    def json(cls, data: dict, **headers: str) -> _Response:
+        body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        return cls(body=body, headers={"Content-Type": "application/json", **headers})
+
+    def encode(self) -> bytes:
+        headers = {"Content-Length": str(len(self.body)), **self.headers}
+        lines = [f"HTTP/1.1 {self.status} {self.reason}"]
+        lines.extend(f"{k}: {v}" for k, v in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + self.body
+
+
+class MockWebAdmin:
+    """HTTPS server simulating any number of SFOS WebAdmin consoles
+
+    Args:
+        behavior (MockBehavior | None): Responses of all virtual firewalls.
+                                        May be changed while the server runs.
+        host (str): Address to listen on. Use 0.0.0.0 to accept connections to
+                    every loopback address.
+        ports (int): Number of listening ports, each picked by the OS
+        seed (int | None): Seed for the latency jitter and failure decisions
+    """
+
+    def __init__(
+        self,
+        behavior: MockBehavior | None = None,
+        host: str = "127.0.0.1",
+        ports: int = 1,
+        seed: int | None = None,
+    ) -> None:
+        self.behavior = behavior or MockBehavior()
+        self.host = host
+        self.port_count = ports
+        self.ports: list[int] = []
+        self.firewalls: dict[str, VirtualFirewall] = {}
+        self._random = random.Random(seed)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._servers: list[asyncio.Server] = []
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._certdir: tempfile.TemporaryDirectory | None = None
+
+    def __enter__(self) -> MockWebAdmin:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> MockWebAdmin:
+        """Start listening from a background thread"""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="mock-webadmin", daemon=True
+        )
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._listen(), self._loop).result()
+        return self
+
+    def stop(self) -> None:
+        """Close all connections and stop the server thread"""
+        if not self._loop or not self._thread:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = self._thread = None
+        if self._certdir:
+            self._certdir.cleanup()
+            self._certdir = None
+
+    def connectors(self, count: int, **kwargs) -> list[Connector]:
+        """Create Connectors for 'count' different virtual firewalls
+
+        Firewalls are spread over the listening ports, then over loopback
+        addresses when the server listens on 0.0.0.0.
+        """
+        if count > len(self.ports) and self.host != "0.0.0.0":
+            raise ValueError(f"{count} firewalls need {count} ports or host 0.0.0.0")
+        kwargs = {
+            "username": self.behavior.username,
+            "password": self.behavior.password,
+            **kwargs,
+        }
+        return virtual_firewalls(self.ports, count, **kwargs)
+
+    def firewall(self, host: str) -> VirtualFirewall:
+        """The virtual firewall answering for a Host header, created on first use"""
+        fw = self.firewalls.get(host)
+        if fw is None:
+            fw = VirtualFirewall(host, f"X{len(self.firewalls):014d}")
+            self.firewalls[host] = fw
+        return fw
+
+    async def _listen(self) -> None:
+        context = self._ssl_context()
+        for _ in range(self.port_count):
+            server = await asyncio.start_server(
+                self._serve, self.host, 0, ssl=context, limit=MAX_HEADER_SIZE
+            )
+            self._servers.append(server)
+            self.ports.append(server.sockets[0].getsockname()[1])
+
+    async def _close(self) -> None:
+        for server in self._servers:
+            server.close()
+        for writer in list(self._writers):
+            writer.transport.abort()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.add(writer)
+        try:
+            while request := await _read_request(reader):
+                behavior = self.behavior
+                delay = behavior.latency + self._random.uniform(0, behavior.jitter)
+                if delay:
+                    await asyncio.sleep(delay)
+                if self._random.random() < behavior.failure_rate:
+                    writer.transport.abort()
+                    return
+                writer.write(self._handle(request).encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        except asyncio.LimitOverrunError:
+            writer.write(_Response(431, reason="Header Too Large").encode())
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _handle(self, request: _Request) -> _Response:
+        fw = self.firewall(request.headers.get("host", ""))
+        mode = request.params.get("mode", "")
+        fw.requests[mode or request.path] += 1
+
+        if request.path == PATH_LOGIN_JSP:
+            return _Response(body=LOGIN_PAGE, headers={"Content-Type": "text/html"})
+        if request.path == PATH_CONTROLLER and mode == _mode.ADMIN_LOGIN.code:
+            return self._login(fw, request)
+
+        csrf_token = fw.sessions.get(request.session_id or "")
+        if csrf_token is None:
+            if request.path == PATH_INDEX_JSP:
+                location = {"Location": PATH_LOGIN_JSP}
+                return _Response(302, reason="Found", headers=location)
+            return _Response.json(json.loads(_c.AUTH_FAIL_MSG))
+
+        if request.path == PATH_INDEX_JSP:
+            body = fw.index(csrf_token)
+            return _Response(body=body, headers={"Content-Type": "text/html"})
+        if request.path != PATH_CONTROLLER:
+            return _Response(404, reason="Not Found")
+        if request.headers.get(_c.CSRF_TOKEN.lower()) != csrf_token:
+            return _Response(403, b"missing csrf token", reason="Forbidden")
+        return self._controller(fw, request, mode)
+
+    def _login(self, fw: VirtualFirewall, request: _Request) -> _Response:
+        behavior = self.behavior
+        try:
+            creds = json.loads(request.params.get("json", "{}"))
+        except ValueError:
+            creds = {}
+        if behavior.captcha and creds.get(_c.CAPTCHA) != behavior.captcha:
+            fw.logins["captcha"] += 1
+            return _Response.json(
+                {"redirectionURL": "/webpages/login.jsp", "status": -1, "captcha": 1}
+            )
+        if (
+            creds.get(_c.USERNAME) != behavior.username
+            or creds.get(_c.PASSWORD) != behavior.password
+        ):
+            fw.logins["failure"] += 1
+            return _Response.json(json.loads(_c.AUTH_FAIL_MSG))
+        if behavior.disclaimer:
+            fw.logins["disclaimer"] += 1
+            return _Response.json(
+                {"status": 200, "disclaimer_message": "Authorized use only"}
+            )
+
+        fw.logins["success"] += 1
+        session_id = secrets.token_hex(16)
+        fw.sessions[session_id] = secrets.token_hex(13)
+        cookie = f"{_c.JSESSIONID}={session_id}; Path=/; Secure; HttpOnly"
+        return _Response(
+            body=_c.AUTH_SUCCESS_MSG.encode("utf-8"),
+            headers={"Content-Type": "application/json", "Set-Cookie": cookie},
+        )
+
+    def _controller(
+        self, fw: VirtualFirewall, request: _Request, mode: str
+    ) -> _Response:
+        if mode == _mode.HEARTBEAT_STATUS.code:
+            return _Response.json(
+                {"status": 200, "hbStatus": 1, "atpStatus": 0, "liveUsers": 3}
+            )
+        if mode == _mode.GET_SYSTEM_GRAPH.code:
+            samples = [[i * 300, self._random.randint(0, 100)] for i in range(12)]
+            return _Response.json({"status": 200, "graph": samples})
+        if mode == _mode.DOWNLOAD_BACKUP.code and request.method == "GET":
+            filename = f"Backup_{fw.serial}"
+            return _Response(
+                body=b"\0" * self.behavior.backup_size,
+                headers={
+                    "Content-Type": "application/octet-stream",
+                    "Content-Disposition": f"attachment; filename={filename}",
+                },
+            )
+        if mode == _mode.DOWNLOAD_BACKUP.code:
+            return _Response.json({"status": 200, "statusmessage": "backup ready"})
+        return _Response.json({"status": 500, "statusmessage": f"mode {mode}"})
+
+    def _ssl_context(self) -> ssl.SSLContext:
+        self._certdir = tempfile.TemporaryDirectory(prefix="mock_webadmin")
+        certfile = Path(self._certdir.name, "cert.pem")
+        keyfile = Path(self._certdir.name, "key.pem")
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "mock-webadmin")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=30))
+            .add_extension(
+                x509.SubjectAlternativeName(
+                    [
+                        x509.DNSName("localhost"),
+                        x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+                    ]
+                ),
+                critical=False,
+            )
+            .sign(key, hashes.SHA256())
+        )
+        certfile.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+        keyfile.write_bytes(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile)
+        return context
+
+
+def virtual_firewalls(ports: list[int], count: int, **kwargs) -> list[Connector]:
+    """Create Connectors for 'count' virtual firewalls of a server listening on
+    'ports', e.g. one started with 'python -m test.mock_webadmin'.
+    Connector arguments default to the MockBehavior credentials.
+    """
+    kwargs = {
+        "username": MockBehavior.username,
+        "password": MockBehavior.password,
+        "verify_tls": False,
+        **kwargs,
+    }
+    result = []
+    for i in range(count):
+        hostname = "127.0.0.1"
+        if i >= len(ports):
+            hostname = str(ipaddress.ip_address("127.0.1.0") + i // len(ports))
+        port = ports[i % len(ports)]
+        result.append(Connector(hostname=hostname, port=port, **kwargs))
+    return result
+
+
+async def _read_request(reader: asyncio.StreamReader) -> _Request | None:
+    """Read one HTTP/1.1 request, or None when the client closed the connection"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise
+        return None
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = request_line.split(" ", 2)
+    headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+    path, _, query = target.partition("?")
+    # GET requests carry the whole percent-encoded body as their query string
+    params = _parse_params(parse.unquote(query))
+    params.update(_parse_params(body.decode("utf-8")))
+    return _Request(method, path, params, headers)
+
+
+def _parse_params(content: str) -> dict[str, str]:
+    """Split a controller request body into its fields. Bodies of requests that
+    are not urlencoded are separated by newlines, and their json is left as is.
+    """
+    separator = "\n" if "\n" in content else "&"
+    result = {}
+    for part in content.split(separator):
+        name, _, value = part.partition("=")
+        if name:
+            result[name] = parse.unquote(value)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for SFOS WebAdmin")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--ports", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--captcha", default=None)
+    parser.add_argument("--disclaimer", action="store_true")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="mock-password")
+    args = parser.parse_args()
+
+    behavior = MockBehavior(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        captcha=args.captcha,
+        disclaimer=args.disclaimer,
+        username=args.username,
+        password=args.password,
+    )
+    with MockWebAdmin(behavior, host=args.host, ports=args.ports) as webadmin:
+        ports = json.dumps(webadmin.ports)
+        print(f"Listening on {args.host} ports {ports}", flush=True)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
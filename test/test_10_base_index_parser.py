@@ -10,6 +10,8 @@ License.
 """
 
 import json
+import re
+
 import pytest
 
 from sfos.objects.firewall_info import (
@@ -98,3 +100,47 @@ def test_index_parser_call(sample: str) -> None:
 
     # Un-comment to see more output while testing
     # assert False
+
+
+def test_index_parser_single_scan(sample: str) -> None:
+    found, csrf_key = _ip()._scan(sample)
+    assert found == dict(_iv.RE_TO_FIND_JSP_VARS.findall(sample))
+    assert csrf_key == _iv.RE_TO_FIND_CSRF_KEY.search(sample)[_iv.GROUP_CSRF_KEY_NAME]
+
+
+def test_index_parser_scripts_pattern(sample: str) -> None:
+    legacy = re.compile(r"<script.*?>(?P<script>.*?)<\/script>", flags=re.S)
+    assert _iv.RE_TO_FIND_SCRIPTS.findall(sample) == legacy.findall(sample)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("a\t\tb", "a b"),
+        ("a \t b\r\n\r\n\nc", "a b\nc"),
+        ("a\n \n  b\r", "a\n \n b\r"),
+        ("", ""),
+    ],
+)
+def test_index_parser_trim(text: str, expected: str) -> None:
+    assert _ip()._trim(text) == expected
+
+
+def test_index_parser_renamed_csrf_key(sample: str) -> None:
+    renamed = sample.replace("c$rFt0k3n", "newT0ken")
+    result = _ip()(renamed)
+    assert result.csrf_token == "3ms4cmcc89ol1l1atfcsqft6r9"
+    assert len(json.loads(result.subscriptions)) == 10
+
+
+def test_index_parser_compact(sample: str) -> None:
+    result = _ip()(sample)
+    assert result.all_items is None
+    assert result._source_data is None
+    assert result.get_license().bundle_name
+
+    kept = _ip(keep_source=True)(sample)
+    assert kept.all_items["version"] == "20.0.0.222"
+    assert "all_items" not in kept.all_items
+    assert "Cyberoam.c$rFt0k3n" in kept._source_data
+    assert kept.base_info == result.base_info
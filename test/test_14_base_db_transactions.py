@@ -0,0 +1,126 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import sqlite3
+
+import pytest
+
+from sfos.db import Database
+
+INIT_SQL = "CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, name TEXT);"
+
+
+@pytest.fixture
+def dbname(tmp_path) -> str:
+    return str(tmp_path / "test_14.sqlite3")
+
+
+def count_rows(dbname: str) -> int:
+    """Count rows as seen by a separate connection"""
+    with sqlite3.connect(dbname) as conn:
+        return conn.execute("SELECT count(*) FROM items;").fetchone()[0]
+
+
+def test_default_mode_closes(dbname: str) -> None:
+    db = Database(dbname, INIT_SQL)
+    db.insert_into("items", name="a")
+    assert db.connection is None
+    assert count_rows(dbname) == 1
+
+
+def test_persistent_mode(dbname: str) -> None:
+    db = Database(dbname, INIT_SQL, persistent=True)
+    db.insert_into("items", name="a")
+    connection = db.connection
+    assert connection is not None
+    assert connection.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    assert connection.execute("PRAGMA synchronous;").fetchone()[0] == 1  # NORMAL
+    assert count_rows(dbname) == 1
+
+    db.insert_into("items", name="b")
+    assert db.connection is connection
+    assert count_rows(dbname) == 2
+    db.close_connection()
+
+
+@pytest.mark.parametrize("persistent", [False, True])
+def test_transaction_commits_once(dbname: str, persistent: bool) -> None:
+    db = Database(dbname, INIT_SQL, persistent=persistent)
+    with db.transaction():
+        for name in "abc":
+            db.insert_into("items", name=name)
+            with db.transaction():
+                db.execute("INSERT INTO items (name) VALUES (?);", params=[name * 2])
+        assert count_rows(dbname) == 0
+
+    assert count_rows(dbname) == 6
+    assert (db.connection is not None) == persistent
+    db.close_connection()
+
+
+@pytest.mark.parametrize("persistent", [False, True])
+def test_transaction_rollback(dbname: str, persistent: bool) -> None:
+    db = Database(dbname, INIT_SQL, persistent=persistent)
+    db.insert_into("items", name="kept")
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.insert_into("items", name="lost")
+            raise RuntimeError("abort batch")
+
+    assert count_rows(dbname) == 1
+    db.insert_into("items", name="after")
+    assert count_rows(dbname) == 2
+    db.close_connection()
+
+
+UPSERT_SQL = (
+    "CREATE TABLE IF NOT EXISTS subs "
+    "(uid TEXT UNIQUE, name TEXT, fails INTEGER DEFAULT 0);"
+)
+
+
+def test_insert_or_update_many(dbname: str) -> None:
+    db = Database(dbname, UPSERT_SQL)
+    rows = [{"uid": f"u{i}", "name": f"n{i}"} for i in range(50)]
+    assert db.insert_or_update_many("subs", rows, on_conflict=["uid"]) == 50
+
+    changed = [{"uid": "u1", "name": "changed"}, {"uid": "u99", "name": "new"}]
+    assert db.insert_or_update_many("subs", changed, on_conflict=["uid"]) == 2
+    assert db.insert_or_update_many(
+        "subs", [{"uid": "u2", "name": "n2"}], ["uid"], increment=["fails"]
+    )
+
+    result = dict(
+        (uid, (name, fails))
+        for uid, name, fails in db.execute("SELECT uid, name, fails FROM subs;")[0]
+    )
+    assert len(result) == 51
+    assert result["u1"] == ("changed", 0)
+    assert result["u2"] == ("n2", 1)
+    assert result["u99"] == ("new", 0)
+
+
+def test_insert_or_update_many_matches_single(dbname: str, tmp_path) -> None:
+    rows = [{"uid": "a", "name": "x"}, {"uid": "a", "name": "y"}, {"uid": "b"}]
+    single = Database(str(tmp_path / "single.sqlite3"), UPSERT_SQL)
+    for row in rows:
+        assert single.insert_or_update("subs", row, on_conflict=["uid"])
+    many = Database(dbname, UPSERT_SQL)
+    assert many.insert_or_update_many("subs", rows, on_conflict=["uid"]) == 3
+
+    query = "SELECT uid, name, fails FROM subs ORDER BY uid;"
+    assert many.execute(query) == single.execute(query)
+
+
+def test_insert_or_update_many_bad_column(dbname: str) -> None:
+    db = Database(dbname, UPSERT_SQL)
+    assert db.insert_or_update_many("subs", [{"uid": "a", "nope": 1}], ["uid"]) == 0
+    assert db.execute("SELECT count(*) FROM subs;")[0] == [(0,)]
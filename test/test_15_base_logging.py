@@ -0,0 +1,189 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from sfos.logging import bind_log_context, caller_name, logtrace
+from sfos.logging.logging import (
+    LogState,
+    _LogMessage,
+    log_context,
+    init_log_queue,
+    init_logger,
+    init_logging,
+    logstate,
+)
+from sfos.static import Level
+
+
+class Formatted:
+    """Counts how often log_writer turns it into a string"""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __str__(self) -> str:
+        self.count += 1
+        return "formatted"
+
+
+@pytest.fixture
+def info_level():
+    init_logging(Level.INFO)
+    level = logstate.logger_application.level
+    logstate.logger_application.setLevel(Level.INFO.value)
+    yield logstate.logger_application
+    logstate.logger_application.setLevel(level)
+
+
+def test_disabled_level_skips_formatting(info_level) -> None:
+    item = Formatted()
+    assert logtrace("message", item=item) is None
+    assert item.count == 0
+
+
+def test_disabled_level_returns_error(info_level) -> None:
+    error = ValueError("boom")
+    assert logtrace("failed", error) is error
+
+
+def test_caller_name() -> None:
+    def inner() -> str:
+        return caller_name(1)
+
+    assert inner() == "test_caller_name"
+    assert caller_name(0) == "test_caller_name"
+
+
+@pytest.fixture
+def queued_state(tmp_path):
+    state = LogState()
+    state.PATH = str(tmp_path)
+    init_log_queue(state, maxsize=2)
+    yield state
+    if state.listener._thread is not None:
+        state.listener.stop()
+
+
+def test_log_queue_routes_records(queued_state, tmp_path) -> None:
+    first = init_logger("Test15First", Level.INFO, queued_state)
+    second = init_logger("Test15Second", Level.INFO, queued_state)
+    queued_state.listener.start()
+    item = Formatted()
+    first.info(_LogMessage(["one"], {"item": item}))
+    second.info("two")
+    queued_state.listener.stop()
+
+    assert item.count >= 1
+    assert 'message="one item="formatted""' in (tmp_path / "test15first.log").read_text()
+    second_log = (tmp_path / "test15second.log").read_text()
+    assert "two" in second_log and "one" not in second_log
+
+
+def test_log_message_copies_arguments(queued_state, tmp_path) -> None:
+    logger = init_logger("Test15Copy", Level.INFO, queued_state)
+    item = Formatted()
+    fields = {"state": "before"}
+    logger.info(_LogMessage(["one"], {"item": item, "fields": fields, "count": 2}))
+    fields["state"] = "after"
+    assert item.count == 1  # formatted by the logging thread
+    queued_state.listener.start()
+    queued_state.listener.stop()
+
+    text = (tmp_path / "test15copy.log").read_text()
+    assert "fields=\"{'state': 'before'}\" count=\"2\"" in text
+    assert item.count == 1
+
+
+class Response(requests.Response):
+    """Received response that counts how often resp2dict reads its text"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.reads = 0
+        self.status_code = 200
+        self._content = b"<html>"
+        self.request = requests.Request("GET", "https://fw.test/").prepare()
+
+    @property
+    def text(self) -> str:
+        self.reads += 1
+        return super().text
+
+
+def test_log_message_converts_response_in_handler(queued_state, tmp_path) -> None:
+    logger = init_logger("Test15Trace", Level.INFO, queued_state)
+    logger.propagate = False  # pytest's capture handler formats on this thread
+    response = Response()
+    logger.info(_LogMessage(["trace"], {}, response))
+    assert response.reads == 0  # left to the logging thread
+    queued_state.listener.start()
+    queued_state.listener.stop()
+
+    assert response.reads == 1
+    assert "<html>" in (tmp_path / "test15trace.log").read_text()
+
+
+def test_log_queue_drops_when_full(queued_state) -> None:
+    logger = init_logger("Test15Full", Level.INFO, queued_state)
+    for i in range(5):
+        logger.info("record %s", i)
+    assert queued_state.queue_handler.dropped == 3
+    queued_state.listener.start()
+
+
+def test_bind_log_context_nests() -> None:
+    with bind_log_context(session_id="ABCDE"):
+        with bind_log_context(host="fw1.test"):
+            assert log_context.get() == {"session_id": "ABCDE", "host": "fw1.test"}
+        assert log_context.get() == {"session_id": "ABCDE"}
+    assert log_context.get() == {}
+
+
+def test_bind_log_context_per_thread() -> None:
+    seen = {}
+
+    def task(host: str) -> None:
+        with bind_log_context(host=host):
+            seen[host] = dict(log_context.get())
+
+    with bind_log_context(session_id="ABCDE"):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            for i in range(8):
+                pool.submit(contextvars.copy_context().run, task, f"fw{i}")
+    assert seen["fw3"] == {"session_id": "ABCDE", "host": "fw3"}
+    assert len(seen) == 8
+
+
+def test_json_lines_formatter(tmp_path) -> None:
+    state = LogState()
+    state.PATH = str(tmp_path)
+    state.json_lines = True
+    logger = init_logger("Test15Json", Level.INFO, state)
+    with bind_log_context(host="fw.test"):
+        logger.info(_LogMessage(["refresh\\ncomplete"], {"count": 3, "ok": True}))
+    logger.info("plain %s", "record")
+    for handler in logger.handlers:
+        handler.close()
+
+    lines = (tmp_path / "test15json.log").read_text().splitlines()
+    first, second = [json.loads(line) for line in lines]
+    assert first["message"] == "refresh\\ncomplete"
+    assert first["host"] == "fw.test"
+    assert first["count"] == 3 and first["ok"] is True
+    assert first["level"] == "INFO" and first["logger"] == "Test15Json"
+    assert second["message"] == "plain record"
+    assert "host" not in second
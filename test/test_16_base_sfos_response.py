@@ -0,0 +1,99 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import json
+
+import pytest
+from requests import Response
+
+from sfos.objects import sfos_response
+from sfos.objects.sfos_response import SfosResponse
+from test.tools import get_sample
+
+
+def make_response(body: str, content_type: str, status: int = 200) -> Response:
+    response = Response()
+    response.status_code = status
+    response.encoding = "utf-8"
+    response.headers["Content-Type"] = content_type
+    response._content = body.encode("utf-8")
+    return response
+
+
+@pytest.fixture
+def loads_calls(monkeypatch) -> list:
+    calls = []
+    loads = json.loads
+
+    def counting_loads(text, *args, **kwargs):
+        calls.append(text)
+        return loads(text, *args, **kwargs)
+
+    monkeypatch.setattr(sfos_response.json, "loads", counting_loads)
+    return calls
+
+
+def test_html_is_not_decoded(loads_calls: list) -> None:
+    page = get_sample("test_v20_ga_index.jsp")
+    result = SfosResponse(trace="t", response=make_response(page, "text/html"))
+    assert result.success
+    assert result.data is None
+    assert loads_calls == []
+
+
+def test_json_decoded_on_first_access(loads_calls: list) -> None:
+    response = make_response(' {"status": 200}', "text/plain")
+    result = SfosResponse(trace="t", response=response)
+    assert loads_calls == []
+    assert result.data == {"status": 200}
+    assert result.data == {"status": 200}
+    assert len(loads_calls) == 1
+
+
+def test_bad_json_content(loads_calls: list) -> None:
+    response = make_response("<html></html>", "application/json")
+    assert SfosResponse(trace="t", response=response).data is None
+    assert len(loads_calls) == 1
+
+
+def test_data_argument_and_setter() -> None:
+    result = SfosResponse(trace="t", data={"a": 1})
+    assert result.success and result.data == {"a": 1}
+    result.data = None
+    assert result.data is None
+
+
+def test_slots() -> None:
+    result = SfosResponse(trace="t")
+    with pytest.raises(AttributeError):
+        result.unexpected = True  # type: ignore
+
+
+def test_drop_response() -> None:
+    response = make_response('{"status": 200}', "application/json")
+    result = SfosResponse(trace="t", response=response, keep_response=False)
+    assert result.response is None
+    assert result.status_code == 200
+    assert result.data == {"status": 200}
+
+    kept = SfosResponse(trace="t", response=response)
+    assert kept.response is response
+    kept.release()
+    assert kept.response is None and kept.text is None
+    assert kept.data == {"status": 200}
+
+
+def test_release_keeps_undecoded_text() -> None:
+    response = make_response("Access denied", "text/html")
+    result = SfosResponse(trace="t", response=response)
+    result.release()
+    assert result.response is None
+    assert result.text == "Access denied"
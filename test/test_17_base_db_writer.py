@@ -0,0 +1,88 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import threading
+import time
+
+import pytest
+
+from sfos.base.db import DBWriter, GroundControlDB as DB
+from sfos.static import exceptions as _ex
+
+
+@pytest.fixture
+def t_db(tmp_path) -> DB:
+    db = DB(filename=str(tmp_path / "test_17_gcdb.sqlite3"), persistent=True)
+    yield db
+    db.close_connection()
+
+
+def save(key: str, delay: float = 0):
+    def job(db: DB) -> None:
+        time.sleep(delay)
+        db.save_setting(key, threading.current_thread().name)
+
+    return job
+
+
+def saved(db: DB) -> dict[str, str]:
+    rows = db.execute("SELECT key, value FROM settings WHERE key LIKE 'k%';")[0]
+    return dict(rows)
+
+
+def test_writer_coalesces_batches(t_db: DB) -> None:
+    with DBWriter(t_db, queue_size=100, batch_rows=10, batch_ms=1000) as writer:
+        for i in range(25):
+            writer.put(save(f"k{i:02}"))
+        writer.flush()
+        assert writer.stats.jobs == 25
+
+    assert writer.stats.batches == 3  # 10 + 10 + 5
+    assert writer.stats.waits == 0
+    rows = saved(t_db)  # the connection is back with this thread
+    assert len(rows) == 25
+    assert set(rows.values()) == {"db-writer"}
+
+
+def test_writer_backpressure(t_db: DB) -> None:
+    with DBWriter(t_db, queue_size=2, batch_rows=1, batch_ms=0) as writer:
+        tstart = time.perf_counter()
+        for i in range(6):
+            writer.put(save(f"k{i}", delay=0.05))
+        producer_elapsed = time.perf_counter() - tstart
+
+    assert writer.stats.waits > 0
+    assert producer_elapsed >= 0.1  # held back by the writer
+    assert writer.stats.batches == 6
+    assert len(saved(t_db)) == 6
+
+
+def test_writer_isolates_failed_jobs(t_db: DB) -> None:
+    def fail(db: DB) -> None:
+        raise RuntimeError("bad row")
+
+    with DBWriter(t_db, batch_rows=10, batch_ms=1000) as writer:
+        writer.put(save("k1"))
+        writer.put(fail)
+        writer.put(save("k2"))
+
+    assert writer.stats.failed == 1
+    assert writer.stats.jobs == 2
+    assert sorted(saved(t_db)) == ["k1", "k2"]
+
+
+def test_writer_needs_start(t_db: DB) -> None:
+    writer = DBWriter(t_db)
+    with pytest.raises(_ex.DatabaseError):
+        writer.put(save("k1"))
+    with t_db.transaction():
+        with pytest.raises(_ex.DatabaseError):
+            writer.start()
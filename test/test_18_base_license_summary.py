@@ -0,0 +1,118 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks.bench_dashboard import BASELINE_DASHBOARD, make_fleet
+from sfos.base import GroundControlDB as DB
+
+COLUMNS = "serial_number, next_license_expiring, expiry_date, license_status, support"
+
+
+@pytest.fixture
+def t_db(tmp_path) -> DB:
+    db = DB(filename=str(tmp_path / "test_18_gcdb.sqlite3"), persistent=True)
+    yield db
+    db.close_connection()
+
+
+def dashboard(db: DB, view: str) -> list[tuple]:
+    return db.execute(f"SELECT {COLUMNS} FROM {view} ORDER BY address;")[0]
+
+
+def test_dashboard_matches_license_view(t_db: DB) -> None:
+    inventory, licenses = make_fleet(50, 6, t_db.session_id)
+    t_db.insert_or_update_many("inventory", inventory, on_conflict=["address"])
+    t_db.insert_or_update_many("licenses", licenses, on_conflict=["uid"])
+    for row in licenses[::3]:
+        row["expiry_date"] -= timedelta(days=200)
+    t_db.insert_or_update_many("licenses", licenses[::3], on_conflict=["uid"])
+    t_db.execute("DELETE FROM licenses WHERE rowid % 5 = 0;")
+    t_db.execute(BASELINE_DASHBOARD)
+
+    expected = dashboard(t_db, "baseline_dashboard")
+    assert len(expected) == 50
+    assert any(row[4] for row in expected)  # some firewalls have support
+    assert dashboard(t_db, "inventory_dashboard") == expected
+    assert dashboard(t_db, "current_session_dashboard") == expected
+
+
+def test_stale_summary_without_license_writes(t_db: DB) -> None:
+    inventory, licenses = make_fleet(50, 6, t_db.session_id)
+    t_db.insert_or_update_many("inventory", inventory, on_conflict=["address"])
+    t_db.insert_or_update_many("licenses", licenses, on_conflict=["uid"])
+    t_db.execute(BASELINE_DASHBOARD)
+    # 60 days pass, and no firewall is refreshed
+    t_db.execute("DROP TRIGGER license_summary_update;")
+    for table, columns in [
+        ("licenses", ["start_date", "expiry_date"]),
+        ("license_summary", ["start_date", "expiry_date"]),
+        ("license_summary", ["support_start_date", "support_expiry_date"]),
+    ]:
+        shift = ", ".join(f"{col} = datetime({col}, '-60 days')" for col in columns)
+        t_db.execute(f"UPDATE {table} SET {shift};")
+
+    expected = dashboard(t_db, "baseline_dashboard")
+    stale = t_db.execute("SELECT serial_number FROM license_summary_stale;")[0]
+    assert stale
+    # stale summaries are left out, instead of showing long expired licenses
+    shown = {row[0]: row[1:] for row in dashboard(t_db, "inventory_dashboard")}
+    assert all(shown[serial] == (None,) * 4 for (serial,) in stale)
+    oldest = "SELECT MIN(julianday (expiry_date) - julianday ()) FROM "
+    # the view shows the expiry date without its time of day
+    assert t_db.execute(oldest + "license_summary_view;")[0][0][0] > -31
+
+    assert t_db.refresh_license_summary() == len(stale)
+    assert t_db.refresh_license_summary() == 0
+    assert dashboard(t_db, "inventory_dashboard") == expected
+
+
+def test_summary_follows_license_changes(t_db: DB) -> None:
+    # naive UTC, like sqlite current_timestamp. Hours keep days away from rounding
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    license = {
+        "uid": "S1Enhanced Support",
+        "serial_number": "S1",
+        "name": "Enhanced Support",
+        "start_date": now - timedelta(days=300),
+        "expiry_date": now + timedelta(days=65, hours=1),
+        "bundle": "a-la-carte",
+        "type": "term",
+    }
+    t_db.insert_or_update("licenses", license, on_conflict=["uid"])
+    summary = "SELECT next_license_expiring, license_status, support FROM "
+    summary += "license_summary_view WHERE serial_number = 'S1';"
+    assert t_db.execute(summary)[0] == [
+        ("Enhanced Support", "Expiring in 65 days", "ACTIVE")
+    ]
+
+    license["expiry_date"] = now - timedelta(days=45)
+    t_db.insert_or_update("licenses", license, on_conflict=["uid"])
+    assert t_db.execute(summary)[0] == []  # expired over 30 days ago
+
+    license["expiry_date"] = now - timedelta(days=5, hours=1)
+    t_db.insert_or_update("licenses", license, on_conflict=["uid"])
+    assert t_db.execute(summary)[0] == [
+        ("Enhanced Support", "Expired 5 days ago", "EXPIRED")
+    ]
+
+    # a refresh that writes the same license again recomputes a stale summary
+    stale = now - timedelta(days=45)
+    t_db.execute(f"UPDATE license_summary SET expiry_date = '{stale}';")
+    t_db.insert_or_update("licenses", license, on_conflict=["uid"])
+    assert t_db.execute(summary)[0] == [
+        ("Enhanced Support", "Expired 5 days ago", "EXPIRED")
+    ]
+
+    t_db.execute("DELETE FROM licenses WHERE serial_number = 'S1';")
+    assert t_db.execute(summary)[0] == []
@@ -16,7 +16,11 @@ from sfos.static import (
     SfosMode as _req_mode,
     SfosOperation as _req_oper,
 )
-from sfos.webadmin.methods import make_sfos_request as _make_req
+from sfos.webadmin.methods import (
+    make_sfos_request as _make_req,
+    compile_definition as _compile,
+    load_definition,
+)
 
 
 @pytest.fixture
@@ -98,3 +102,49 @@ def test_request_get(address: _sa, headers: dict) -> None:
     assert result.method == "get"
     assert result.timeout == 10
     assert result.verify is True
+
+
+@pytest.mark.parametrize(
+    "urlencode,data,e_json",
+    [
+        (True, None, ""),
+        (True, '{"a":"b c"}', "&json=%7B%22a%22%3A%22b%20c%22%7D"),
+        (True, {"key": 1}, "&json=%7B%22key%22%3A%201%7D"),
+        (False, '{"a":"b c"}', '\njson={"a":"b c"}'),
+    ],
+)
+def test_compiled_content(urlencode: bool, data, e_json: str) -> None:
+    req_def = _srdef(
+        _req_mode.TEST,
+        _req_oper.TEST,
+        req_object="obj",
+        web_method="post",
+        urlencode=urlencode,
+    )
+    sep = "&" if urlencode else "\n"
+    t_content = _compile(req_def).content(data)
+    e_content = f"mode=99999{sep}operation=-99999{sep}requestObj=obj{e_json}"
+    e_content += f"{sep}__RequestType=ajax{sep}t="
+    # ignore timestamp
+    assert t_content.rsplit("t=", 1)[0] + "t=" == e_content
+
+
+def test_compiled_address_cache(address: _sa) -> None:
+    req_def = load_definition(_req_mode.HEARTBEAT_STATUS)
+    compiled = _compile(req_def)
+    assert _compile(req_def) is compiled
+
+    first = _make_req(req_def, address)
+    second = _make_req(req_def, _sa("testhost"))
+    other = _make_req(req_def, _sa("otherhost", 4443, False, 3))
+
+    assert first.headers == second.headers
+    assert first.headers is not second.headers
+    assert compiled.for_address(address) is compiled.for_address(_sa("testhost"))
+    assert other.url == "https://otherhost:4443/webconsole/Controller"
+    assert other.headers["Host"] == "otherhost:4443"
+    assert other.verify is False
+    assert other.timeout == 3
+
+    first.headers["X-Csrf-Token"] = "token"
+    assert "X-Csrf-Token" not in _make_req(req_def, address).headers
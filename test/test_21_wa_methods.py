@@ -9,6 +9,9 @@ the License for the specific language governing permissions and limitations unde
 License.
 """
 
+import os
+import shutil
+
 import pytest
 from sfos.objects import Definition as _def, ServiceAddress as _sa
 from sfos.static import (
@@ -172,7 +175,7 @@ def test_get_request_def(auth_def: _def) -> None:
 def test_prepare_req_content(auth_def: _def, auth_data: auth_data) -> None:
     t_def = auth_def
     t_data = auth_data
-    t_parts = _m._prepare_request_conent(t_def, t_data)
+    t_parts = _m.compile_definition(t_def).content(t_data).split("&")
     e_parts = [
         "mode=151",
         (
@@ -194,7 +197,7 @@ def test_assemble_req_content(
 ) -> None:
     t_def = auth_def
     t_data = auth_data
-    t_content = _m._assemble_request_content(t_def, t_data)
+    t_content = _m.compile_definition(t_def).content(t_data)
     e_content = auth_request
     assert t_content.startswith(e_content)
 
@@ -216,3 +219,54 @@ def test_make_request(
     assert t_req.body.startswith(auth_request)
     assert t_req.verify is True
     assert t_req.method == "post"
+
+
+def test_definition_cached_and_immutable() -> None:
+    t_first = _m.load_definition(_req_mode.ADMIN_LOGIN)
+    t_second = _m.load_definition(_req_mode.ADMIN_LOGIN)
+
+    assert t_first == t_second
+    assert t_first[0] is t_second[0]
+    with pytest.raises(AttributeError):
+        t_first[0].req_object = "changed"
+    with pytest.raises(TypeError):
+        t_first[0].web_headers["Referer"] = "changed"
+
+    t_copy = t_first[0].replace(req_object="changed")
+    assert t_copy.req_object == "changed"
+    assert t_first[0].req_object is None
+    assert t_copy.web_headers == t_first[0].web_headers
+
+
+def test_definition_reloads_on_change(tmp_path) -> None:
+    shutil.copy(
+        os.path.join(_m.REQ_TEMPLATE_PATH, "HEARTBEAT_STATUS.json"),
+        tmp_path / "TMP_DEF.json",
+    )
+    t_path = str(tmp_path)
+    t_def = _m.load_definition("TMP_DEF", t_path)
+    assert t_def is _m.load_definition("TMP_DEF", t_path)
+    assert t_def.web_method == "post"
+
+    t_file = tmp_path / "TMP_DEF.json"
+    t_file.write_text(t_file.read_text().replace('"post"', '"get"'))
+    stat = t_file.stat()
+    os.utime(t_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    t_reloaded = _m.load_definition("TMP_DEF", t_path)
+    assert t_reloaded is not t_def
+    assert t_reloaded.web_method == "get"
+
+
+def test_request_object_not_shared(address: _sa) -> None:
+    t_obj = _m.load_request_object_data("HEARTBEAT_STATUS", "atpStatus")
+    t_obj["atpStatus"] = 99
+    assert _m.load_request_object_data("HEARTBEAT_STATUS", "atpStatus") == {
+        "atpStatus": 1
+    }
+
+    t_reqs = _m.make_sfos_request_from_template(
+        "HEARTBEAT_STATUS", address, request_object="atpStatus"
+    )
+    assert len(t_reqs) == 1
+    assert _m.load_definition("HEARTBEAT_STATUS").req_object is None
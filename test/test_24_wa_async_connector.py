@@ -0,0 +1,108 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import asyncio
+from argparse import Namespace
+
+import httpx
+import pytest
+
+from sfos.agent.actions.command import run_cli_command_async, run_command_def_async
+from sfos.base import GroundControlDB as DB
+from sfos.objects.firewall_info import FirewallInfo, parse_index
+from sfos.static import constants as _c, exceptions as _ex
+from sfos.webadmin import AsyncConnector
+from test.tools import get_sample
+
+INDEX = get_sample("test_v20_ga_index.jsp")
+CSRF_TOKEN = parse_index(INDEX).csrf_token
+
+
+def webadmin(request: httpx.Request) -> httpx.Response:
+    """Minimal stand-in for the webadmin login and controller endpoints"""
+    if request.method == "GET" and request.url.path.endswith("index.jsp"):
+        return httpx.Response(200, text=INDEX)
+    if b"mode=151" in request.content:
+        return httpx.Response(
+            200,
+            text=_c.AUTH_SUCCESS_MSG,
+            headers={"Set-Cookie": f"{_c.JSESSIONID}=abc123; Path=/"},
+        )
+    if request.headers.get(_c.CSRF_TOKEN) != CSRF_TOKEN:
+        return httpx.Response(403, text="missing csrf token")
+    if f"{_c.JSESSIONID}=abc123" not in request.headers.get("cookie", ""):
+        return httpx.Response(403, text="no session")
+    return httpx.Response(200, json={"status": 200, "mode": "heartbeat"})
+
+
+def offline(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectTimeout("timed out", request=request)
+
+
+def make_fw(handler, name: str = "fw.test") -> AsyncConnector:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncConnector(hostname=name, username="u", password="p", client=client)
+
+
+def test_async_login() -> None:
+    async def run():
+        async with make_fw(webadmin) as fw:
+            return fw, await fw.get_info()
+
+    fw, resp = asyncio.run(run())
+    assert resp.success
+    assert isinstance(resp.data, FirewallInfo)
+    assert fw.csrf_token == CSRF_TOKEN
+    assert fw.cookies[_c.JSESSIONID] == "abc123"
+    assert fw.client is None
+
+
+def test_async_command_uses_session() -> None:
+    async def run():
+        async with make_fw(webadmin) as fw:
+            return await run_command_def_async(fw, "HEARTBEAT_STATUS")
+
+    results = asyncio.run(run())
+    assert len(results) == 1
+    assert results[0].success
+    assert results[0].data == {"status": 200, "mode": "heartbeat"}
+
+
+def test_async_connect_timeout() -> None:
+    async def run():
+        async with make_fw(offline) as fw:
+            return await fw.get_info()
+
+    resp = asyncio.run(run())
+    assert not resp.success
+    assert isinstance(resp.error, _ex.ConnectionTimeoutError)
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_async_refresh(tmp_path, concurrency: int) -> None:
+    db = DB(filename=str(tmp_path / "test_24_gcdb.sqlite3"))
+    fws = [make_fw(webadmin, f"on{i}.test") for i in range(3)]
+    fws += [make_fw(offline, f"off{i}.test") for i in range(2)]
+    args = Namespace(command="refresh", concurrency=concurrency)
+
+    results = asyncio.run(run_cli_command_async(fws, args, db=db))
+    rows = db.execute("SELECT address, last_result FROM inventory;")[0]
+    db.close_connection()
+
+    assert len(results) == 5
+    assert len([r for r in results if r.success]) == 3
+    assert sorted(rows) == [
+        ("off0.test", "OFFLINE"),
+        ("off1.test", "OFFLINE"),
+        ("on0.test", "ONLINE"),
+        ("on1.test", "ONLINE"),
+        ("on2.test", "ONLINE"),
+    ]
@@ -0,0 +1,108 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sfos.webadmin.session_pool import SessionPool, get_session_pool, new_session
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1  # type: ignore
+
+    def do_GET(self) -> None:  # noqa: N802
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:  # noqa: A002
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    httpd.connections = 0  # type: ignore
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def test_sessions_share_connections(server) -> None:
+    pool = SessionPool(pool_size=2, idle_timeout=60, max_lifetime=600)
+    for _ in range(3):
+        session = pool.session()
+        for _ in range(2):
+            assert session.get(url(server), timeout=2).text == "ok"
+        session.close()
+
+    assert server.connections == 1
+    assert pool.hosts() == [url(server).rstrip("/")]
+    pool.clear()
+    assert pool.hosts() == []
+
+
+def test_sessions_keep_own_cookies(server) -> None:
+    pool = SessionPool()
+    first, second = pool.session(), pool.session()
+    first.cookies.set("JSESSIONID", "first")
+    assert "JSESSIONID" not in second.cookies
+    pool.clear()
+
+
+@pytest.mark.parametrize(
+    "idle_timeout,max_lifetime", [(0, 600), (60, 0)], ids=["idle", "lifetime"]
+)
+def test_expired_pool_reconnects(server, idle_timeout, max_lifetime) -> None:
+    pool = SessionPool(idle_timeout=idle_timeout, max_lifetime=max_lifetime)
+    session = pool.session()
+    session.get(url(server), timeout=2)
+    session.get(url(server), timeout=2)
+
+    assert server.connections == 2
+    pool.clear()
+
+
+def test_expired_hosts_swept() -> None:
+    pool = SessionPool(idle_timeout=60, max_lifetime=600)
+    first = pool.adapter_for("https://first.test:4444/webconsole")
+    pool.adapter_for("https://second.test:4444/webconsole")
+    for host in pool._hosts.values():
+        host.last_used -= 120
+
+    # only the requested host is checked between sweeps
+    assert pool.adapter_for("https://first.test:4444/") is not first
+    assert len(pool.hosts()) == 2
+
+    pool._next_sweep = 0
+    pool.adapter_for("https://first.test:4444/")
+    assert pool.hosts() == ["https://first.test:4444"]
+    pool.clear()
+
+
+def test_process_wide_pool() -> None:
+    assert get_session_pool() is get_session_pool()
+    session = new_session()
+    assert session.get_adapter("https://fw.test:4444/").pool is get_session_pool()
@@ -0,0 +1,167 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import asyncio
+import os
+import time
+import warnings
+
+import httpx
+import pytest
+from cryptography.fernet import Fernet
+from urllib3.exceptions import InsecureRequestWarning
+
+from sfos.agent.actions.command import run_command_def_async
+from sfos.objects.firewall_info import parse_index
+from sfos.static import constants as _c
+from sfos.webadmin import AsyncConnector, SessionCache
+from test.mock_webadmin import MockWebAdmin
+from test.tools import get_sample
+
+INDEX = get_sample("test_v20_ga_index.jsp")
+CSRF_TOKEN = parse_index(INDEX).csrf_token
+
+
+class WebAdmin:
+    """Stand-in webadmin that counts logins and accepts one live session id"""
+
+    def __init__(self) -> None:
+        self.logins = 0
+        self.session_id = "first"
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, text=INDEX)
+        if b"mode=151" in request.content:
+            self.logins += 1
+            return httpx.Response(
+                200,
+                text=_c.AUTH_SUCCESS_MSG,
+                headers={"Set-Cookie": f"{_c.JSESSIONID}={self.session_id}; Path=/"},
+            )
+        cookie = f"{_c.JSESSIONID}={self.session_id}"
+        if cookie not in request.headers.get("cookie", ""):
+            return httpx.Response(200, text=_c.AUTH_FAIL_MSG)
+        if request.headers.get(_c.CSRF_TOKEN) != CSRF_TOKEN:
+            return httpx.Response(403, text="missing csrf token")
+        return httpx.Response(200, json={"status": 200})
+
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch) -> str:
+    monkeypatch.setenv("GC_SESSION_CACHE_KEY", Fernet.generate_key().decode())
+    return str(tmp_path / "sessions")
+
+
+def heartbeat(webadmin: WebAdmin, cache: SessionCache) -> list:
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(webadmin))
+        async with AsyncConnector(
+            hostname="fw.test",
+            username="u",
+            password="p",
+            session_cache=cache,
+            client=client,
+        ) as fw:
+            return await run_command_def_async(fw, "HEARTBEAT_STATUS")
+
+    results = asyncio.run(run())
+    cache.save()
+    return results
+
+
+def test_cache_roundtrip_encrypted(cache_file: str) -> None:
+    key = Fernet.generate_key()
+    cache = SessionCache(cache_file, key=key)
+    cache.put("u@fw.test:4444", {_c.JSESSIONID: "abc"}, "token-123")
+    cache.save()
+
+    with open(cache_file, "rb") as f:
+        raw = f.read()
+    assert b"token-123" not in raw and b"abc" not in raw
+
+    loaded = SessionCache(cache_file, key=key)
+    assert loaded.get("u@fw.test:4444") == {
+        _c.JSESSIONID: "abc",
+        _c.CSRF_TOKEN: "token-123",
+    }
+    wrong_key = SessionCache(cache_file, key=Fernet.generate_key())
+    assert wrong_key.get("u@fw.test:4444") is None
+
+
+def test_cache_generates_key(cache_file: str, tmp_path, monkeypatch) -> None:
+    monkeypatch.delenv("GC_SESSION_CACHE_KEY", raising=False)
+    key_file = str(tmp_path / "config" / "session_cache.key")
+    first = SessionCache(cache_file, key_file=key_file)
+    first.put("t", {}, "x")
+    first.save()
+    assert SessionCache(cache_file, key_file=key_file).get("t") is not None
+    assert not os.path.exists(f"{cache_file}.key")
+    if os.name != "nt":
+        assert os.stat(key_file).st_mode & 0o777 == 0o600
+        assert os.stat(os.path.dirname(key_file)).st_mode & 0o777 == 0o700
+        os.chmod(key_file, 0o644)
+        with pytest.raises(PermissionError):
+            SessionCache(cache_file, key_file=key_file)
+
+
+def test_cache_ttl(cache_file: str, monkeypatch) -> None:
+    cache = SessionCache(cache_file, ttl=60)
+    cache.put("t", {}, "x")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 30)
+    cache.touch("t")
+    monkeypatch.setattr(time, "time", lambda: now + 80)
+    assert cache.get("t") is not None
+    monkeypatch.setattr(time, "time", lambda: now + 200)
+    assert cache.get("t") is None
+    assert len(cache) == 0
+
+
+def test_repeat_run_skips_login(cache_file: str) -> None:
+    webadmin = WebAdmin()
+    assert heartbeat(webadmin, SessionCache(cache_file))[0].success
+    assert webadmin.logins == 1
+
+    results = heartbeat(webadmin, SessionCache(cache_file))
+    assert results[0].success
+    assert results[0].data == {"status": 200}
+    assert webadmin.logins == 1
+
+
+def test_rejected_session_relogin(cache_file: str) -> None:
+    webadmin = WebAdmin()
+    heartbeat(webadmin, SessionCache(cache_file))
+
+    # firewall forgets the session between runs
+    webadmin.session_id = "second"
+    results = heartbeat(webadmin, SessionCache(cache_file))
+    assert results[0].success
+    assert webadmin.logins == 2
+    cached = SessionCache(cache_file).get("u@fw.test:4444")
+    assert cached and cached[_c.JSESSIONID] == "second"
+
+
+def test_second_run_refresh_skips_login(cache_file: str) -> None:
+    warnings.simplefilter("ignore", InsecureRequestWarning)
+    with MockWebAdmin(seed=26) as webadmin:
+        (fw,) = webadmin.connectors(1, session_cache=SessionCache(cache_file))
+        assert fw.get_info().success
+        fw.session_cache.save()  # type: ignore
+        virtual = webadmin.firewall(fw.address.address)  # type: ignore
+        assert virtual.logins == {"success": 1}
+        virtual.logins.clear()
+
+        # a later run resumes the saved session and reads index.jsp with it
+        (fw,) = webadmin.connectors(1, session_cache=SessionCache(cache_file))
+        result = fw.get_info()
+        assert result.success and result.data.version  # type: ignore
+        assert virtual.logins == {}
@@ -0,0 +1,134 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sfos.base.db.ground_control_db import GroundControlDB as DB
+from sfos.objects import RequestTimings
+from sfos.objects.sfos_request import SfosRequest
+from sfos.static import constants as _c
+from sfos.webadmin import Connector
+from sfos.webadmin.session_pool import SessionPool
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:  # noqa: N802
+        time.sleep(self.server.delay)  # type: ignore
+        body = b'{"status": 200}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:  # noqa: A002
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    httpd.delay = 0  # type: ignore
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server) -> str:
+    return f"http://localhost:{server.server_address[1]}/"
+
+
+def connector(server) -> Connector:
+    return Connector(
+        hostname="localhost",
+        port=server.server_address[1],
+        username="u",
+        password="p",
+        resume_session={_c.JSESSIONID: "abc", _c.CSRF_TOKEN: "token"},
+    )
+
+
+def test_phases_new_and_reused_connection(server) -> None:
+    pool = SessionPool()
+    session = pool.session()
+    first, second = RequestTimings(url(server)), RequestTimings(url(server))
+    with first.measure_request():
+        session.get(url(server), timeout=2)
+    with second.measure_request():
+        session.get(url(server), timeout=2)
+
+    assert not first.reused
+    assert first.dns_ms is not None and first.connect_ms is not None
+    assert first.tls_ms is None
+    assert first.request_ms is not None and first.request_ms >= 0
+
+    assert second.reused
+    assert second.dns_ms is None and second.connect_ms is None
+    assert second.handshake_ms == 0
+    pool.clear()
+
+
+def test_timer_counts_whole_seconds(server) -> None:
+    server.delay = 1.05
+    fw = connector(server)
+    result = fw.send_request(
+        SfosRequest(url(server), {}, None, "get", False, 5, None)  # type: ignore
+    )
+
+    assert result.success
+    assert result.timer >= 1000
+    (timings,) = result.timings
+    assert timings.status_code == 200
+    assert timings.request_ms >= 1000
+    assert timings.parse_ms is not None
+    assert timings.total_ms >= result.timer
+
+
+def test_timings_saved(server, tmp_path) -> None:
+    db = DB(filename=str(tmp_path / "test_27_gcdb.sqlite3"))
+    fw = connector(server)
+    result = fw.send_request(
+        SfosRequest(url(server), {}, None, "get", False, 5, None)  # type: ignore
+    )
+
+    assert db.insert_request_timings(result) == 1
+    rows = db.execute(
+        "SELECT session_id, address, url, status_code, total_ms "
+        "FROM request_timings;"
+    )[0]
+    address = fw.address.address  # type: ignore
+    assert rows == [
+        (db.session_id, address, url(server), 200, result.timings[0].total_ms)
+    ]
+    db.close_connection()
+
+
+def test_old_timings_pruned(tmp_path) -> None:
+    db = DB(filename=str(tmp_path / "test_27_gcdb.sqlite3"))
+    now = datetime.now(tz=UTC)
+    started = [(now - timedelta(days=days)).isoformat() for days in (0, 13, 15, 40)]
+    timings = [RequestTimings("https://fw.test/", started=when) for when in started]
+    db.insert_timings("fw.test:4444", timings)
+
+    assert db.prune_request_timings(days=14) == 2
+    assert db.prune_request_timings(days=0) == 0
+    sql = "SELECT CAST(started AS TEXT) FROM request_timings ORDER BY started;"
+    assert db.execute(sql)[0] == [(started[1],), (started[0],)]
+    db.close_connection()
@@ -0,0 +1,136 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import asyncio
+import os
+import warnings
+
+import pytest
+from urllib3.exceptions import InsecureRequestWarning
+
+from sfos.agent.actions.command import run_command_def, run_command_def_async
+from sfos.agent.actions.refresh import RefreshStats, run_refresh
+from sfos.base.db.ground_control_db import GroundControlDB as DB
+from sfos.static import constants as _c
+from sfos.static import exceptions as _ex
+from sfos.webadmin import AsyncConnector
+from sfos.webadmin.methods import make_sfos_request_from_template
+from test.mock_webadmin import MockBehavior, MockWebAdmin
+
+
+@pytest.fixture
+def webadmin():
+    warnings.simplefilter("ignore", InsecureRequestWarning)
+    with MockWebAdmin(ports=4, seed=28) as server:
+        yield server
+
+
+def test_login_and_commands(webadmin: MockWebAdmin) -> None:
+    (fw,) = webadmin.connectors(1)
+    info = fw.get_info()
+    assert info.success
+    assert info.data.applianceKey == "X00000000000000"
+
+    (heartbeat,) = run_command_def(fw, "HEARTBEAT_STATUS")
+    assert heartbeat.success
+    assert heartbeat.data["hbStatus"] == 1
+    (graph,) = run_command_def(fw, "GET_SYSTEM_GRAPH", "cpu")
+    assert len(graph.data["graph"]) == 12
+
+    virtual = webadmin.firewall(f"127.0.0.1:{webadmin.ports[0]}")
+    assert virtual.logins == {"success": 1}
+    assert virtual.requests["1322"] == 1
+    assert fw.csrf_token in virtual.sessions.values()
+
+
+def test_download_backup(webadmin: MockWebAdmin, tmp_path, monkeypatch) -> None:
+    webadmin.behavior.backup_size = 1000
+    (fw,) = webadmin.connectors(1)
+    assert fw.login().success
+    assert fw.address is not None
+    reqs = make_sfos_request_from_template("DOWNLOAD_BACKUP", fw.address)
+    # templates are read from the working directory, backups are saved to it
+    monkeypatch.chdir(tmp_path)
+    ready, download = fw.send_requests(*reqs)
+
+    assert ready.success
+    assert download.data["file"] == "Backup_X00000000000000.sfos"
+    assert os.path.getsize(tmp_path / download.data["file"]) == 1000
+
+
+@pytest.mark.parametrize(
+    "behavior,error",
+    [
+        (MockBehavior(password="other"), "Incorrect username or password"),
+        (MockBehavior(disclaimer=True), "Blocked by disclaimer"),
+        (MockBehavior(captcha="abc12"), ""),
+    ],
+    ids=["password", "disclaimer", "captcha"],
+)
+def test_login_refused(webadmin: MockWebAdmin, behavior, error) -> None:
+    (fw,) = webadmin.connectors(1)
+    webadmin.behavior = behavior
+    result = fw.login()
+    assert not result.success
+    assert isinstance(result.error, _ex.LoginError)
+    assert error in str(result.error)
+
+
+def test_captcha_accepted(webadmin: MockWebAdmin) -> None:
+    webadmin.behavior.captcha = "abc12"
+    (fw,) = webadmin.connectors(1)
+    fw.credentials[_c.CAPTCHA] = "abc12"  # type: ignore
+    assert fw.login().success
+
+
+def test_failures_and_latency(webadmin: MockWebAdmin) -> None:
+    webadmin.behavior.failure_rate = 1.0
+    (fw,) = webadmin.connectors(1)
+    result = fw.get_info()
+    assert isinstance(result.error, _ex.AgentConnectionError)
+
+    webadmin.behavior = MockBehavior(latency=0.1)
+    result = fw.get_info()
+    assert result.success
+    assert result.timer >= 200  # auth and index.jsp
+
+
+def test_refresh_many_firewalls(webadmin: MockWebAdmin, tmp_path) -> None:
+    db = DB(filename=str(tmp_path / "test_28_gcdb.sqlite3"))
+    stats = RefreshStats()
+    results = run_refresh(webadmin.connectors(4), db, concurrency=4, stats=stats)
+
+    assert stats.count == 4 and stats.failures == 0
+    assert len(webadmin.firewalls) == 4
+    assert sorted(r.data.applianceKey for r in results) == [
+        f"X{i:014d}" for i in range(4)
+    ]
+    db.close_connection()
+
+
+def test_async_connector(webadmin: MockWebAdmin) -> None:
+    async def heartbeat() -> list:
+        fws = [AsyncConnector.from_connector(fw) for fw in webadmin.connectors(2)]
+        try:
+            return await asyncio.gather(
+                *[run_command_def_async(fw, "HEARTBEAT_STATUS") for fw in fws]
+            )
+        finally:
+            for fw in fws:
+                await fw.aclose()
+
+    results = asyncio.run(heartbeat())
+    assert [r[0].data["status"] for r in results] == [200, 200]
+
+
+def test_too_many_firewalls(webadmin: MockWebAdmin) -> None:
+    with pytest.raises(ValueError):
+        webadmin.connectors(5)
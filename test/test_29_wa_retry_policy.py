@@ -0,0 +1,178 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from sfos.objects.sfos_request import SfosRequest
+from sfos.static import SfosMode, constants as _c, exceptions as _ex
+from sfos.webadmin import AsyncConnector, Connector
+from sfos.webadmin.retry_policy import NO_RETRY, RetryPolicy, is_idempotent
+
+FAST = RetryPolicy(backoff=0.01, max_backoff=0.01)
+SESSION = {_c.JSESSIONID: "abc", _c.CSRF_TOKEN: "token"}
+
+
+class FixedDelay(RetryPolicy):
+    def delay(self, retry: int) -> float:
+        return 0.2
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers after server.delays[n] seconds for the n-th request"""
+
+    protocol_version = "HTTP/1.1"
+
+    def reply(self) -> None:
+        server = self.server
+        with server.lock:  # type: ignore
+            delays = server.delays  # type: ignore
+            delay = delays.pop(0) if delays else 0
+        time.sleep(delay)
+        body = b'{"status": 200}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = reply  # noqa: N815
+
+    def log_message(self, format, *args) -> None:  # noqa: A002
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    httpd.delays = []  # type: ignore
+    httpd.lock = threading.Lock()  # type: ignore
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def request(server, method: str = "get", idempotent: bool = True) -> SfosRequest:
+    url = f"http://localhost:{server.server_address[1]}/"
+    body = "mode=151" if method == "post" else None
+    return SfosRequest(
+        url, {}, body, method, False, 0.3, None, idempotent  # type: ignore
+    )
+
+
+def connector(server, policy: RetryPolicy) -> Connector:
+    return Connector(
+        hostname="localhost",
+        port=server.server_address[1],
+        username="u",
+        password="p",
+        resume_session=SESSION,
+        retry_policy=policy,
+    )
+
+
+def test_policy() -> None:
+    get = SfosRequest("u", {}, None, "get", False, 1, None, True)
+    post = SfosRequest("u", {}, "mode=151", "post", False, 1, None, False)
+    connect, read = _ex.ConnectionTimeoutError(), _ex.ReadTimeoutError()
+
+    assert FAST.max_attempts(connect) == 3
+    assert FAST.max_attempts(_ex.NameResolutionError()) == 1
+    assert FAST.max_attempts(_ex.AgentConnectionError()) == 2
+    assert FAST.max_attempts(_ex.CertificateError()) == 1
+    assert 0 <= FAST.next_delay(get, read, 1, 0) <= 0.01  # type: ignore
+    assert FAST.next_delay(get, read, 2, 0) is None  # attempts used up
+    assert FAST.next_delay(post, read, 1, 0) is None  # may have been processed
+    assert FAST.next_delay(post, connect, 1, 0) is not None  # was never sent
+    assert FAST.next_delay(get, None, 1, 0) is None
+    assert RetryPolicy(deadline=1).next_delay(get, connect, 1, 1) is None
+
+
+def test_idempotent_requests() -> None:
+    assert is_idempotent("get", SfosMode.NONE)
+    assert is_idempotent("post", SfosMode.HEARTBEAT_STATUS)
+    assert not is_idempotent("post", SfosMode.ADMIN_LOGIN)
+    assert not is_idempotent("get", SfosMode.DOWNLOAD_BACKUP, "download")
+
+
+def test_retry_after_read_timeout(server) -> None:
+    server.delays = [0.6]
+    result = connector(server, FAST).send_request(request(server))
+
+    assert result.success
+    assert result.retries == 1
+    assert [t.status_code for t in result.timings] == [None, 200]
+
+
+def test_no_retry(server) -> None:
+    server.delays = [0.6]
+    result = connector(server, NO_RETRY).send_request(request(server))
+
+    assert isinstance(result.error, _ex.ReadTimeoutError)
+    assert result.retries == 0
+
+
+def test_no_retry_for_updates(server) -> None:
+    server.delays = [0.6]
+    req = request(server, "post", idempotent=False)
+    result = connector(server, FAST).send_request(req)
+
+    assert isinstance(result.error, _ex.ReadTimeoutError)
+    assert result.retries == 0
+
+
+def test_async_retry_does_not_block() -> None:
+    calls = {"flaky.test": 0, "steady.test": 0}
+    finished = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        calls[host] += 1
+        if host == "flaky.test" and calls[host] < 3:
+            raise httpx.ConnectTimeout("timed out", request=request)
+        return httpx.Response(200, json={"status": 200})
+
+    def make_fw(host: str, policy: RetryPolicy) -> AsyncConnector:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return AsyncConnector(
+            hostname=host,
+            username="u",
+            password="p",
+            resume_session=SESSION,
+            client=client,
+            retry_policy=policy,
+        )
+
+    async def send(fw: AsyncConnector):
+        url = f"https://{fw.address.hostname}:4444/"  # type: ignore
+        req = SfosRequest(url, {}, None, "get", False, 1, None, True)
+        result = await fw.send_request(req)
+        finished.append(fw.address.hostname)  # type: ignore
+        await fw.aclose()
+        return result
+
+    async def run():
+        slow = FixedDelay()
+        flaky = make_fw("flaky.test", slow)
+        steady = make_fw("steady.test", slow)
+        return await asyncio.gather(send(flaky), send(steady))
+
+    flaky, steady = asyncio.run(run())
+    assert flaky.success and flaky.retries == 2
+    assert steady.success and steady.retries == 0
+    assert finished[0] == "steady.test"
@@ -14,6 +14,7 @@ import pytest
 import shlex
 
 from sfos import agent as _agent
+from sfos.agent.cli_args.command_args import check_command_arguments
 
 
 def parser_t1() -> _args.ArgumentParser:
@@ -105,3 +106,42 @@ def x_test_parser_prod(raw_args: str) -> None:
     assert t_args.username == "test_user"
     assert t_args.password == "test_pass"
     assert t_args.action == "noop"
+
+
+@pytest.mark.parametrize(
+    "raw_args,max_age",
+    [
+        ("refresh", None),
+        ("refresh --max-age 90s", 90),
+        ("refresh --max-age 30", 1800),
+        ("refresh --max-age 6h", 21600),
+        ("refresh --max-age 1.5d", 129600),
+    ],
+)
+def test_command_max_age(raw_args: str, max_age: float | None) -> None:
+    (_, p_command, *_) = _agent.init_cli()
+    ns, _ = p_command.parse_known_args(shlex.split(raw_args))
+    assert ns.max_age == max_age
+
+
+@pytest.mark.parametrize(
+    "raw_args,valid",
+    [
+        ("refresh --daemon --concurrency 8", True),
+        ("refresh --daemon --workers 4", False),
+        ("refresh --daemon --max-age 6h", False),
+        ("heartbeat --daemon", False),
+        ("refresh --workers 4 --max-age 6h", True),
+        ("refresh --async --concurrency 64 --max-age 6h", True),
+        ("refresh --async --workers 4", False),
+        ("refresh --async --daemon", False),
+    ],
+)
+def test_command_daemon_options(raw_args: str, valid: bool) -> None:
+    (_, p_command, *_) = _agent.init_cli()
+    ns, _ = p_command.parse_known_args(shlex.split(raw_args))
+    if valid:
+        assert check_command_arguments(p_command, ns) is ns
+    else:
+        with pytest.raises(SystemExit):
+            check_command_arguments(p_command, ns)
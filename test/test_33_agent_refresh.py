@@ -0,0 +1,112 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import threading
+import time
+import warnings
+
+import pytest
+from urllib3.exceptions import InsecureRequestWarning
+
+from sfos.agent.actions.refresh import RefreshStats, run_refresh, run_refresh_sharded
+from sfos.base import GroundControlDB as DB
+from sfos.static import exceptions as _ex
+from sfos.webadmin.connector import Connector, SfosResponse
+from sfos.webadmin.session_cache import SessionCache
+from test.mock_webadmin import MockWebAdmin
+
+
+class SlowOfflineConnector(Connector):
+    """Connector stand-in that fails like an offline firewall after a delay"""
+
+    delay = 0.2
+    threads: set = set()
+
+    def get_info(self) -> SfosResponse:
+        SlowOfflineConnector.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        return SfosResponse(
+            fw=self,
+            error=_ex.ConnectionTimeoutError("Connection timed out"),
+            trace="test-33",
+        )
+
+
+@pytest.fixture
+def t_db(tmp_path) -> DB:
+    db = DB(filename=str(tmp_path / "test_33_gcdb.sqlite3"))
+    yield db
+    db.close_connection()
+
+
+@pytest.fixture
+def firewalls() -> list[Connector]:
+    SlowOfflineConnector.threads = set()
+    return [
+        SlowOfflineConnector(hostname=f"fw{i:02n}.test", username="u", password="p")
+        for i in range(8)
+    ]
+
+
+def test_refresh_concurrent(t_db: DB, firewalls: list[Connector]) -> None:
+    stats = RefreshStats()
+    tstart = time.perf_counter()
+    results = run_refresh(firewalls, t_db, concurrency=8, stats=stats)
+    elapsed = time.perf_counter() - tstart
+
+    assert len(results) == 8
+    assert elapsed < SlowOfflineConnector.delay * 4
+    assert len(SlowOfflineConnector.threads) > 1
+    assert stats.count == 8
+    assert stats.failures == 8
+    assert stats.rate > 0
+
+    rows = t_db.execute("SELECT address, last_result FROM inventory;")[0]
+    assert sorted(rows) == [(f"fw{i:02n}.test", "OFFLINE") for i in range(8)]
+
+
+def test_refresh_sequential(t_db: DB, firewalls: list[Connector]) -> None:
+    stats = RefreshStats()
+    results = run_refresh(firewalls[:2], t_db, stats=stats)
+
+    assert [r.fw for r in results] == firewalls[:2]
+    assert len(SlowOfflineConnector.threads) == 1
+    assert stats.concurrency == 1
+    assert stats.count == 2
+
+
+def test_refresh_no_db(firewalls: list[Connector]) -> None:
+    results = run_refresh(firewalls, None)
+    assert len(results) == 1
+    assert isinstance(results[0].error, _ex.DatabaseError)
+
+
+def test_refresh_sharded(t_db: DB, tmp_path) -> None:
+    warnings.simplefilter("ignore", InsecureRequestWarning)
+    cache = SessionCache(str(tmp_path / "sessions.json"))
+    with MockWebAdmin(host="0.0.0.0", seed=33) as webadmin:
+        fws = webadmin.connectors(6, session_cache=cache)
+        fws.append(Connector(hostname="offline.invalid", username="u", password="p"))
+        stats = RefreshStats()
+        results = run_refresh_sharded(fws, t_db, workers=2, concurrency=2, stats=stats)
+        logins = [webadmin.firewall(fw.address.address).logins for fw in fws[:6]]
+
+    assert sorted(r.success for r in results) == [False] + [True] * 6
+    assert stats.workers == 2 and stats.count == 7 and stats.failures == 1
+    assert logins == [{"success": 1}] * 6
+    assert all(cache.get(fw.target()) for fw in fws[:6])
+
+    rows = t_db.execute("SELECT last_result, COUNT(*) FROM inventory GROUP BY 1;")[0]
+    licenses = t_db.execute("SELECT COUNT(*) FROM licenses;")[0][0][0]
+    timings = t_db.execute("SELECT COUNT(*) FROM request_timings;")[0][0][0]
+    assert sorted(rows) == [("OFFLINE", 1), ("ONLINE", 6)]
+    assert licenses > 0
+    assert timings == sum(len(r.timings) for r in results)
@@ -0,0 +1,112 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+from sfos.agent.actions import RefreshStats
+from sfos.agent.metrics import (
+    DaemonMetrics,
+    RefreshMetrics,
+    write_metrics,
+    write_refresh_metrics,
+)
+from sfos.objects import RequestTimings
+from sfos.static import exceptions as _ex
+from sfos.webadmin import Connector
+from sfos.webadmin.connector import SfosResponse
+
+
+def response(hostname: str, timer: int, error=None, timings=None) -> SfosResponse:
+    fw = Connector(hostname=hostname, username="u", password="p")
+    result = SfosResponse(
+        fw=fw, error=error, timer=timer, timings=timings or [], trace="test-34"
+    )
+    result.success = error is None
+    return result
+
+
+def results() -> list[SfosResponse]:
+    return [
+        response("fw1.test", 40, timings=[RequestTimings("a", total_ms=40.0)]),
+        response("fw1.test", 0, timings=[RequestTimings("b", total_ms=1500.0)]),
+        response("fw2.test", 2000, error=_ex.ConnectionTimeoutError("timed out")),
+        response("fw3.test", 5, error=_ex.CertificateError("bad cert")),
+        response("fw4.test", 6, error=_ex.CertificateError("bad cert")),
+    ]
+
+
+def test_render() -> None:
+    stats = RefreshStats(count=5, failures=3, elapsed=2.5, db_elapsed=0.25)
+    lines = RefreshMetrics(results(), stats).render().splitlines()
+
+    latency = "gc_firewall_reply_latency_seconds"
+    assert f'{latency}_bucket{{firewall="fw1.test:4444",le="0.05"}} 1' in lines
+    assert f'{latency}_bucket{{firewall="fw1.test:4444",le="1.0"}} 1' in lines
+    assert f'{latency}_bucket{{firewall="fw1.test:4444",le="2.5"}} 2' in lines
+    assert f'{latency}_bucket{{firewall="fw1.test:4444",le="+Inf"}} 2' in lines
+    assert f'{latency}_count{{firewall="fw1.test:4444"}} 2' in lines
+    assert f'{latency}_sum{{firewall="fw2.test:4444"}} 2.0' in lines
+
+    assert 'gc_logins_total{result="success"} 2' in lines
+    assert 'gc_logins_total{result="failure"} 3' in lines
+    assert 'gc_login_failures_total{error="CertificateError"} 2' in lines
+    assert 'gc_login_failures_total{error="ConnectionTimeoutError"} 1' in lines
+    assert "gc_refresh_duration_seconds 2.5" in lines
+    assert "gc_refresh_db_write_seconds 0.25" in lines
+    assert "gc_refresh_firewalls_per_second 2.0" in lines
+    assert "# TYPE gc_firewall_reply_latency_seconds histogram" in lines
+
+
+def test_write_metrics_file(tmp_path) -> None:
+    filename = tmp_path / "ground_control.prom"
+    assert write_refresh_metrics([], RefreshStats(), filename="") is None
+
+    written = write_refresh_metrics(results(), RefreshStats(), str(filename))
+    assert written == filename
+    assert "gc_refresh_firewalls 0" in filename.read_text().splitlines()
+    assert [p.name for p in tmp_path.iterdir()] == ["ground_control.prom"]
+
+
+def test_counters_continue_from_previous_file(tmp_path) -> None:
+    filename = str(tmp_path / "ground_control.prom")
+    stats = RefreshStats(count=5, failures=3)
+    write_refresh_metrics(results(), stats, filename)
+    write_refresh_metrics(results()[2:], stats, filename)
+    lines = (tmp_path / "ground_control.prom").read_text().splitlines()
+
+    latency = "gc_firewall_reply_latency_seconds"
+    assert f'{latency}_count{{firewall="fw1.test:4444"}} 2' in lines
+    assert f'{latency}_count{{firewall="fw2.test:4444"}} 2' in lines
+    assert 'gc_logins_total{result="success"} 2' in lines
+    assert 'gc_logins_total{result="failure"} 6' in lines
+    assert 'gc_login_failures_total{error="CertificateError"} 4' in lines
+    assert "gc_log_records_dropped_total 0" in lines
+    assert "gc_refresh_firewalls 5" in lines  # gauges are replaced
+
+
+def test_daemon_metrics(tmp_path) -> None:
+    filename = str(tmp_path / "ground_control.prom")
+    metrics = DaemonMetrics()
+    for result in results():
+        metrics.add("heartbeat", result)
+    write_metrics(metrics, filename)
+    metrics.reset()
+    metrics.add("refresh", results()[2])
+    write_metrics(metrics, filename)
+    lines = (tmp_path / "ground_control.prom").read_text().splitlines()
+
+    polls = "gc_daemon_polls_total"
+    assert f'{polls}{{kind="heartbeat",result="success"}} 2' in lines
+    assert f'{polls}{{kind="heartbeat",result="failure"}} 3' in lines
+    assert f'{polls}{{kind="refresh",result="failure"}} 1' in lines
+    failures = 'gc_daemon_poll_failures_total{kind="refresh",'
+    assert f'{failures}error="ConnectionTimeoutError"}} 1' in lines
+    latency = "gc_firewall_reply_latency_seconds"
+    assert f'{latency}_count{{firewall="fw2.test:4444"}} 2' in lines
+    assert not any(line.startswith("gc_logins_total") for line in lines)
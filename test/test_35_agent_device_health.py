@@ -0,0 +1,156 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from sfos.agent.actions.device_health import (
+    adaptive_timeout,
+    breaker_backoff,
+    percentile,
+    plan_refresh,
+    select_stale,
+)
+from sfos.base.db.ground_control_db import GroundControlDB as DB
+from sfos.webadmin import Connector
+from sfos.webadmin.methods import make_sfos_request_from_template
+
+NOW = datetime(2025, 6, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def t_db(tmp_path) -> DB:
+    db = DB(filename=str(tmp_path / "test_35_gcdb.sqlite3"))
+    yield db
+    db.close_connection()
+
+
+def firewall(hostname: str) -> Connector:
+    return Connector(hostname=hostname, username="u", password="p", timeout=10)
+
+
+def add_replies(db: DB, address: str, handshake_ms: float, request_ms: float) -> None:
+    rows = [
+        {
+            "address": address,
+            "status_code": 200,
+            "reused": i % 2,
+            "connect_ms": handshake_ms if i % 2 == 0 else None,
+            "request_ms": request_ms,
+        }
+        for i in range(20)
+    ]
+    db.insert_many("request_timings", rows)
+
+
+def add_failing(db: DB, hostname: str, fails: int, hours_ago: float) -> None:
+    add_inventory(db, hostname, hours_ago, consecutive_fails=fails)
+
+
+def add_inventory(db: DB, hostname: str, hours_ago: float, **values) -> None:
+    updated = NOW - timedelta(hours=hours_ago)
+    db.insert_or_update(
+        "inventory",
+        {"address": hostname, "updated": updated.isoformat(), **values},
+        on_conflict=["address"],
+    )
+
+
+def add_license(db: DB, serial_number: str, expires_in_days: float) -> None:
+    expiry = datetime.now() + timedelta(days=expires_in_days)
+    row = {
+        "uid": f"{serial_number}base",
+        "serial_number": serial_number,
+        "name": "base",
+        "type": "base",
+        "start_date": "2020-01-01 00:00:00",
+        "expiry_date": expiry.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    db.insert_many("licenses", [row])
+
+
+def test_percentile_and_timeout() -> None:
+    assert percentile([5, 1, 4, 2, 3], 50) == 3
+    assert percentile([5, 1, 4, 2, 3], 95) == 5
+    assert adaptive_timeout([800.0] * 10, default=10) == pytest.approx(2.4)
+    assert adaptive_timeout([10.0] * 10, default=10) == 2  # GC_ADAPTIVE_TIMEOUT_MIN
+    assert adaptive_timeout([9000.0] * 10, default=10) == 10
+    assert adaptive_timeout([800.0] * 2, default=10) == 10  # too few samples
+
+
+def test_breaker_backoff() -> None:
+    assert breaker_backoff(5) == 3600
+    assert breaker_backoff(7) == 4 * 3600
+    assert breaker_backoff(500) == 604800
+
+
+def test_plan_refresh(t_db: DB) -> None:
+    fast, slow, new, offline, probe = [
+        firewall(name) for name in ("fast", "slow", "new", "offline", "probe")
+    ]
+    add_replies(t_db, "fast:4444", handshake_ms=20, request_ms=100)
+    add_replies(t_db, "slow:4444", handshake_ms=1000, request_ms=3000)
+    add_failing(t_db, "offline", fails=6, hours_ago=1)
+    add_failing(t_db, "probe", fails=5, hours_ago=2)
+
+    plan = plan_refresh([probe, offline, fast, slow, new], t_db, now=NOW)
+
+    assert plan.firewalls == [fast, slow, new, probe]
+    assert plan.skipped == [offline]
+    assert plan.probes == 1
+    assert fast.address.adaptive_timeout == (2, 2)  # type: ignore
+    assert slow.address.adaptive_timeout == (3, 9)  # type: ignore
+    assert new.address.adaptive_timeout is None  # type: ignore
+    assert probe.address.adaptive_timeout == (2, 10)  # type: ignore
+
+
+def test_adaptive_timeout_in_requests(t_db: DB) -> None:
+    fw = firewall("slow")
+    add_replies(t_db, "slow:4444", handshake_ms=1000, request_ms=3000)
+    plan_refresh([fw], t_db, now=NOW)
+
+    assert fw.address is not None
+    (request,) = make_sfos_request_from_template("HEARTBEAT_STATUS", fw.address)
+    assert request.timeout == (3, 9)
+    assert fw.address.timeout == 10
+
+
+def test_select_stale(t_db: DB) -> None:
+    fresh, stale, older, new, error, expiring, recent_error = [
+        firewall(name)
+        for name in (
+            "fresh",
+            "stale",
+            "older",
+            "new",
+            "error",
+            "expiring",
+            "recent_error",
+        )
+    ]
+    add_inventory(t_db, "fresh", hours_ago=0.5, last_result="ONLINE")
+    add_inventory(t_db, "stale", hours_ago=2, last_result="ONLINE")
+    add_inventory(t_db, "older", hours_ago=5, last_result="OFFLINE")
+    add_inventory(t_db, "error", hours_ago=6, last_result="ERROR")
+    add_inventory(t_db, "recent_error", hours_ago=0.1, last_result="ERROR")
+    add_inventory(t_db, "expiring", hours_ago=1.5, serial_number="X1")
+    add_license(t_db, "X1", expires_in_days=10.5)
+    fws = [fresh, stale, older, new, error, expiring, recent_error]
+
+    selected, skipped = select_stale(fws, t_db, 3600, now=NOW)
+    assert selected == [error, expiring, new, older, stale]
+    assert skipped == [fresh, recent_error]
+
+    # urgent firewalls are stale after GC_REFRESH_URGENT_MAX_AGE
+    selected, skipped = select_stale(fws, t_db, 86400, now=NOW)
+    assert selected == [error, new]
+    assert skipped == [fresh, stale, older, expiring, recent_error]
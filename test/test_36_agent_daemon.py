@@ -0,0 +1,208 @@
+""" SFOS Ground Control
+Copyright 2024 Sophos Ltd.  All rights reserved.
+Licensed under the Apache License, Version 2.0 (the "License"); you may not use this
+file except in compliance with the License.You may obtain a copy of the License at
+http://www.apache.org/licenses/LICENSE-2.0 Unless required by applicable law or agreed
+to in writing, software distributed under the License is distributed on an "AS IS"
+BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See
+the License for the specific language governing permissions and limitations under the
+License.
+"""
+
+import random
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import pytest
+from urllib3.exceptions import InsecureRequestWarning
+
+from sfos.agent import metrics
+from sfos.agent.actions.daemon import (
+    HEARTBEAT,
+    LICENSES,
+    REFRESH,
+    Breaker,
+    DaemonStats,
+    ScheduledJob,
+    Scheduler,
+    run_daemon,
+    run_job,
+    save_job_result,
+)
+from sfos.agent.actions.device_health import (
+    BREAKER_THRESHOLD,
+    breaker_backoff,
+    probe_timeouts,
+)
+from sfos.base.db.ground_control_db import GroundControlDB as DB
+from sfos.objects import SfosResponse as _sresp
+from sfos.static import exceptions as _ex
+from sfos.webadmin import Connector
+from test.mock_webadmin import MockWebAdmin
+
+INDEX_PATH = "/webconsole/webpages/index.jsp"
+
+
+@pytest.fixture
+def webadmin():
+    warnings.simplefilter("ignore", InsecureRequestWarning)
+    with MockWebAdmin(ports=2, seed=36) as server:
+        yield server
+
+
+def test_scheduler() -> None:
+    fws = [Connector(hostname=f"fw{i}.test", username="u", password="p") for i in "ab"]
+    intervals = {HEARTBEAT: 10, REFRESH: 100, LICENSES: 0}
+    scheduler = Scheduler(intervals, 0.1, rng=random.Random(1))
+    scheduler.start(fws, now=0)
+
+    assert len(scheduler) == 4  # licenses disabled
+    first = scheduler.pop_due(10)
+    assert len(first) == 4  # spread over the shortest interval
+    assert scheduler.pop_due(1000) == []
+
+    for job in first:
+        scheduler.reschedule(job, now=10)
+    heartbeats = scheduler.pop_due(21)
+    assert sorted(job.kind for job in heartbeats) == [HEARTBEAT, HEARTBEAT]
+    assert all(19 <= job.due <= 21 for job in heartbeats)
+    assert heartbeats[0].due != heartbeats[1].due  # jittered
+    assert len(scheduler.pop_due(121)) == 2
+
+
+def test_breaker() -> None:
+    fw, other = [
+        Connector(hostname=f"fw{i}.test", username="u", password="p") for i in "ab"
+    ]
+    wall = datetime(2026, 1, 1, 12)
+    updated = (wall - timedelta(seconds=100)).isoformat()
+    breaker = Breaker({"fwa.test": (BREAKER_THRESHOLD, updated)}, now=0, wall=wall)
+    backoff = breaker_backoff(BREAKER_THRESHOLD)
+    assert breaker.retry_at(fw, now=0) == backoff - 100
+    assert breaker.retry_at(fw, now=backoff) is None  # due a probe
+
+    breaker.record(fw, False, now=backoff)
+    assert breaker.retry_at(fw, now=backoff) == backoff + 2 * backoff
+    assert fw.address.adaptive_timeout == probe_timeouts(fw.address)  # type: ignore
+    breaker.record(fw, True, now=backoff)
+    assert breaker.retry_at(fw, now=backoff) is None
+    assert fw.address.adaptive_timeout is None  # type: ignore
+
+    for _ in range(BREAKER_THRESHOLD):
+        assert breaker.retry_at(other, now=0) is None
+        breaker.record(other, False, now=0)
+    assert breaker.retry_at(other, now=0) == backoff
+
+
+def test_daemon_backs_off_offline_firewall(tmp_path) -> None:
+    db = DB(filename=str(tmp_path / "test_36_gcdb.sqlite3"))
+    fw = Connector(hostname="offline.invalid", username="u", password="p")
+    stop = threading.Event()
+    stats = DaemonStats()
+    intervals = {HEARTBEAT: 0.05, REFRESH: 0.05, LICENSES: 0}
+    daemon = threading.Thread(
+        target=run_daemon,
+        args=([fw], db),
+        kwargs={"intervals": intervals, "stop": stop, "stats": stats},
+    )
+    daemon.start()
+    _wait_for(lambda: stats.held > 0, timeout=8)
+    stop.set()
+    daemon.join(10)
+    assert not daemon.is_alive()
+    inventory = db.execute("SELECT last_result FROM inventory;")[0]
+    db.close_connection()
+
+    assert stats.jobs.total() == stats.failures.total() == BREAKER_THRESHOLD
+    assert stats.held > 0
+    assert inventory == [("OFFLINE",)]
+
+
+def test_daemon_keeps_sessions(
+    webadmin: MockWebAdmin, tmp_path, monkeypatch
+) -> None:
+    metrics_file = tmp_path / "ground_control.prom"
+    monkeypatch.setattr(metrics, "METRICS_FILE", str(metrics_file))
+    db = DB(filename=str(tmp_path / "test_36_gcdb.sqlite3"))
+    fws = webadmin.connectors(2)
+    stop = threading.Event()
+    stats = DaemonStats()
+    intervals = {HEARTBEAT: 0.1, REFRESH: 0.3, LICENSES: 10}
+    daemon = threading.Thread(
+        target=run_daemon,
+        args=(fws, db),
+        kwargs={"concurrency": 2, "intervals": intervals, "stop": stop, "stats": stats},
+    )
+    virtuals = [webadmin.firewall(fw.address.address) for fw in fws]  # type: ignore
+    daemon.start()
+    # stop once every firewall had its polls, however slow the host
+    _wait_for(
+        lambda: stats.jobs[HEARTBEAT] >= 6
+        and stats.jobs[REFRESH] >= 4
+        and stats.jobs[LICENSES] >= 2
+        and all(virtual.requests[INDEX_PATH] >= 3 for virtual in virtuals),
+        timeout=8,
+    )
+    stop.set()
+    daemon.join(10)
+    assert not daemon.is_alive()
+
+    assert stats.jobs[HEARTBEAT] >= 6
+    assert stats.jobs[REFRESH] >= 4
+    assert stats.jobs[LICENSES] == 2
+    assert sum(stats.failures.values()) == 0
+    for virtual in virtuals:
+        assert virtual.logins == {"success": 1}
+        assert virtual.requests[INDEX_PATH] >= 3
+
+    inventory = db.execute("SELECT last_result FROM inventory;")[0]
+    licenses = db.execute("SELECT COUNT(*) FROM licenses;")[0][0][0]
+    timings = db.execute("SELECT COUNT(*) FROM request_timings;")[0][0][0]
+    db.close_connection()
+    assert set(inventory) == {("ONLINE",)}
+    assert licenses > 0
+    assert timings >= stats.jobs[REFRESH] + stats.jobs[LICENSES]
+    polls = f'gc_daemon_polls_total{{kind="{HEARTBEAT}",result="success"}}'
+    assert f"{polls} {stats.jobs[HEARTBEAT]}" in metrics_file.read_text().splitlines()
+
+
+def test_heartbeat_updates_status(webadmin: MockWebAdmin, tmp_path) -> None:
+    db = DB(filename=str(tmp_path / "test_36_gcdb.sqlite3"))
+    (fw,) = webadmin.connectors(1)
+    stats = DaemonStats()
+    save_job_result(db, ScheduledJob(0, 0, REFRESH, fw), fw.refresh_info(), stats)
+    sql = "SELECT last_result, consecutive_fails, last_seen IS NOT NULL FROM inventory;"
+    assert db.execute(sql)[0] == [("ONLINE", 0, 1)]
+
+    heartbeat = ScheduledJob(0, 1, HEARTBEAT, fw)
+    offline = _sresp(fw=fw, error=_ex.ConnectionTimeoutError("down"), trace="t36")
+    for _ in range(2):
+        save_job_result(db, heartbeat, offline, stats)
+    assert db.execute(sql)[0] == [("OFFLINE", 2, 1)]
+
+    save_job_result(db, heartbeat, run_job(heartbeat), stats)
+    assert db.execute(sql)[0] == [("ONLINE", 0, 1)]
+    timings = db.execute("SELECT COUNT(*) FROM request_timings;")[0][0][0]
+    db.close_connection()
+    assert stats.failures[HEARTBEAT] == 2
+    assert timings == 2  # login and refresh, none for heartbeats
+
+
+def test_refresh_info_logs_in_after_session_expires(webadmin: MockWebAdmin) -> None:
+    (fw,) = webadmin.connectors(1)
+    assert fw.get_info().success
+    virtual = webadmin.firewall(fw.address.address)  # type: ignore
+    virtual.sessions.clear()
+
+    assert fw.refresh_info().success
+    assert fw.refresh_info().success
+    assert virtual.logins == {"success": 2}
+    assert virtual.requests[INDEX_PATH] == 4  # login, expired, login, refresh
+
+
+def _wait_for(condition, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)